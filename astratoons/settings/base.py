@@ -51,6 +51,8 @@ INSTALLED_APPS = [
     'rest_framework',
     'knox',
     'paypal.standard.ipn',
+    'django_tasks',
+    'django_tasks.backends.database',
 
     # Nossas Aplicações
     'core',
@@ -65,6 +67,20 @@ INSTALLED_APPS = [
 ]
 
 
+# --- Tarefas em Segundo Plano (`django-tasks`) ------------------------------
+# O padrão continua executando na hora (usado pelo Wagtail). Os uploads de capítulos vão
+# para o backend 'ingest', gravado no banco e processado por um worker separado, que o
+# docker-entrypoint.sh sobe junto com o gunicorn:
+#   python manage.py db_worker --backend ingest
+# Sem worker (INGEST_TASK_BACKEND=django_tasks.backends.immediate.ImmediateBackend), o upload é processado na requisição.
+TASKS = {
+    'default': {'BACKEND': 'django_tasks.backends.immediate.ImmediateBackend'},
+    'ingest': {'BACKEND': os.environ.get('INGEST_TASK_BACKEND', 'django_tasks.backends.database.DatabaseBackend')},
+}
+# Dias que os arquivos de um upload que falhou ficam no disco para `retry_ingest_jobs` (apagados por `cleanup_ingest_uploads`).
+INGEST_FAILED_UPLOAD_RETENTION_DAYS = 7
+
+
 # --- Middleware ------------------------------------------------------------
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -138,6 +154,36 @@ STATIC_ROOT = BASE_DIR / 'static_collected'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 STORAGES = { "default": { "BACKEND": "django.core.files.storage.FileSystemStorage", }, "staticfiles": { "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage", }, }
+# Entrega das fatias dos capítulos: 'python' (FileResponse), 'accel' (nginx X-Accel-Redirect)
+# ou 'sendfile' (X-Sendfile). No modo 'accel' o nginx precisa de um location `internal`
+# apontando SLICE_ACCEL_REDIRECT_PREFIX para MEDIA_ROOT.
+SLICE_DELIVERY_BACKEND = os.environ.get('SLICE_DELIVERY_BACKEND', 'python')
+SLICE_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+# Diretório para guardar os ZIPs de capítulos já gerados (None desativa o cache em disco).
+CHAPTER_ZIP_CACHE_DIR = os.environ.get('CHAPTER_ZIP_CACHE_DIR') or None
+# Larguras (px) das versões reduzidas de cada fatia, oferecidas ao leitor via srcset.
+SLICE_VARIANT_WIDTHS = (720, 1080)
+# Blobs de fatia sem referências só são apagados depois deste prazo (protege uploads em andamento).
+SLICE_BLOB_PRUNE_GRACE_HOURS = 6
+# Metas do perfil de codificação adaptativo: segundos de encode e bytes por megapixel de fatia.
+SLICE_ADAPTIVE_SECONDS_PER_MP = 0.8
+SLICE_ADAPTIVE_BYTES_PER_MP = 250_000
+# Contadores de views acumulados em memória e gravados em lote (a cada N segundos ou N eventos).
+# Com False, cada leitura faz o UPDATE na hora.
+VIEW_COUNTER_BUFFERED = True
+VIEW_COUNTER_FLUSH_SECONDS = 5
+VIEW_COUNTER_FLUSH_EVENTS = 200
+# Histórico de leitura: leituras repetidas dentro da janela viram um só upsert em lote.
+READING_HISTORY_BUFFERED = True
+READING_HISTORY_FLUSH_SECONDS = 10
+READING_HISTORY_FLUSH_EVENTS = 500
+# Ranking "Mais Vistos": anel de views por hora de cada obra e meia-vida do score de tendência.
+TRENDING_RING_HOURS = 168
+TRENDING_HALF_LIFE_HOURS = 24
+# Leitores anônimos são identificados pelo REMOTE_ADDR. Atrás de um proxy confiável, indique o
+# cabeçalho com o IP do cliente que ele grava (ex.: 'HTTP_CF_CONNECTING_IP', 'HTTP_X_FORWARDED_FOR');
+# sem proxy na frente, deixe None, senão qualquer cliente escolhe o próprio IP.
+READER_KEY_PROXY_HEADER = None
 
 
 # --- Configurações do Wagtail ----------------------------------------------
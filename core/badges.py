@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from wagtail.models import Site
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEW_CHAPTER_DAYS = 2
+
+
+class BadgeSettings:
+    """Valores de GlobalSettings usados pelos badges e thumbnails de capítulo, já resolvidos."""
+    __slots__ = ('days_threshold', 'text', 'image_url', 'logo')
+
+    def __init__(self, days_threshold=DEFAULT_NEW_CHAPTER_DAYS, text=None, image_url=None, logo=None):
+        self.days_threshold = days_threshold
+        self.text = text if text else _("NOVO!")
+        self.image_url = image_url
+        self.logo = logo
+
+
+_process_cache = {}
+_process_cache_lock = threading.Lock()
+
+
+def bump_badge_settings_version(global_settings=None):
+    """
+    Incrementa `GlobalSettings.badge_settings_version` no banco (como `chapters_version` nas obras):
+    cada worker compara a versão gravada com a do seu cache e recarrega quando ela muda.
+    """
+    from core.models import GlobalSettings
+
+    if global_settings is not None and global_settings.pk:
+        GlobalSettings.objects.filter(pk=global_settings.pk).update(badge_settings_version=F('badge_settings_version') + 1)
+    with _process_cache_lock:
+        _process_cache.clear()
+
+
+def _current_version(site):
+    from core.models import GlobalSettings
+
+    try:
+        queryset = GlobalSettings.objects.filter(site=site) if site else GlobalSettings.objects.filter(site__is_default_site=True)
+        return queryset.values_list('badge_settings_version', flat=True).first()
+    except Exception as e:
+        logger.error(f"Erro ao ler a versão das configurações dos badges: {e}")
+        return None
+
+
+def _load_badge_settings(site):
+    from core.models import GlobalSettings
+
+    try:
+        if site is None:
+            site = Site.objects.filter(is_default_site=True).first()
+        gs = GlobalSettings.for_site(site) if site else GlobalSettings.objects.first()
+    except Exception as e:
+        logger.error(f"Erro ao carregar GlobalSettings para os badges: {e}")
+        gs = None
+    if gs is None:
+        return BadgeSettings()
+    image_url = None
+    if gs.new_chapter_badge_image:
+        try:
+            image_url = gs.new_chapter_badge_image.get_rendition('original').url
+        except Exception:
+            image_url = None
+    days_threshold = gs.new_chapter_days_threshold if gs.new_chapter_days_threshold is not None else DEFAULT_NEW_CHAPTER_DAYS
+    return BadgeSettings(days_threshold, gs.new_chapter_badge_text, image_url, gs.logo)
+
+
+def get_badge_settings(request=None, site=None):
+    """
+    Retorna as BadgeSettings do site, resolvidas uma vez por requisição (uma consulta à versão) e
+    mantidas por processo até que GlobalSettings seja salvo (versão no banco) ou o TTL expire.
+    """
+    if request is not None:
+        cached = getattr(request, '_badge_settings', None)
+        if cached is not None:
+            return cached
+        site = Site.find_for_request(request)
+    version = _current_version(site)
+    key = site.pk if site else None
+    now = time.monotonic()
+    with _process_cache_lock:
+        entry = _process_cache.get(key)
+    if entry is not None and entry[0] == version and entry[1] > now:
+        badge_settings = entry[2]
+    else:
+        badge_settings = _load_badge_settings(site)
+        ttl = getattr(settings, 'BADGE_SETTINGS_CACHE_TTL', 300)
+        with _process_cache_lock:
+            _process_cache[key] = (version, now + ttl, badge_settings)
+    if request is not None:
+        request._badge_settings = badge_settings
+    return badge_settings
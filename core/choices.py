@@ -0,0 +1,25 @@
+# core/choices.py
+"""
+Opções usadas pelas configurações globais (core.GlobalSettings) e pelos apps que as leem.
+Ficam aqui para que `core` não dependa de `manga`; a lógica de cada uma continua no app dono.
+"""
+from django.utils.translation import gettext_lazy as _
+
+# Perfis de codificação das fatias (ver manga.encoder_profiles).
+ADAPTIVE_PROFILE = 'adaptativo'
+DEFAULT_ENCODER_PROFILE = 'equilibrado'
+ENCODER_PROFILE_CHOICES = [
+    ('equilibrado', _("Equilibrado (speed 7, qualidade 55)")),
+    ('rapido', _("Rápido (speed 9, qualidade 50)")),
+    ('qualidade', _("Qualidade (speed 5, qualidade 65)")),
+    (ADAPTIVE_PROFILE, _("Adaptativo (ajusta por fatia conforme a complexidade)")),
+]
+
+# Períodos do ranking "Mais Vistos" (ver manga.trending).
+RANKING_CHOICES = [
+    ('trending', _("Em alta (views recentes pesam mais)")),
+    ('dia', _("Mais vistos nas últimas 24 horas")),
+    ('semana', _("Mais vistos nos últimos 7 dias")),
+    ('total', _("Mais vistos de todos os tempos")),
+]
+DEFAULT_RANKING = 'trending'
@@ -0,0 +1,276 @@
+import abc
+import atexit
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .hll import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter(abc.ABC):
+    """
+    Base dos buffers em memória: conta eventos e uma thread por processo chama `flush` a cada
+    <PREFIXO>_FLUSH_SECONDS, ou antes, quando chega a <PREFIXO>_FLUSH_EVENTS eventos. A
+    requisição só acorda a thread; a gravação nunca acontece no caminho da requisição.
+    Com <PREFIXO>_BUFFERED = False a gravação é síncrona. O que não foi gravado se perde se o
+    processo morrer sem passar pelo atexit.
+    """
+    thread_name = 'buffer-flush'
+    setting_prefix = 'VIEW_COUNTER'
+    default_flush_seconds = 5
+    default_flush_events = 200
+
+    def __init__(self):
+        self._events = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._wakeup = threading.Event()
+
+    def _setting(self, name, default):
+        return getattr(settings, f"{self.setting_prefix}_{name}", default)
+
+    @property
+    def enabled(self):
+        return self._setting('BUFFERED', True)
+
+    def _note_event(self):
+        """Chamado com `_lock` em mãos; diz se já passou da hora de gravar."""
+        self._events += 1
+        return (
+            self._events >= self._setting('FLUSH_EVENTS', self.default_flush_events)
+            or time.monotonic() - self._last_flush >= self._setting('FLUSH_SECONDS', self.default_flush_seconds)
+        )
+
+    def _reset_events(self):
+        self._events = 0
+        self._last_flush = time.monotonic()
+
+    def _after_event(self, due):
+        self._ensure_flusher()
+        if due:
+            self._wakeup.set()
+
+    @abc.abstractmethod
+    def flush(self):
+        """Grava o que está pendente; retorna quantos registros foram gravados."""
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name=self.thread_name, daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        # Acorda quando o buffer enche ou, sem isso, a cada FLUSH_SECONDS (tráfego que parou depois de um pico).
+        while True:
+            self._wakeup.wait(self._setting('FLUSH_SECONDS', self.default_flush_seconds))
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"{type(self).__name__}: erro no flush periódico: {e}")
+            finally:
+                connection.close()
+
+
+class ViewCounterBuffer(BufferedWriter):
+    """
+    Acumula incrementos de contadores (views de capítulos e obras) na memória do processo e
+    grava tudo de uma vez, um UPDATE por modelo/campo. Evita que cada leitura pegue o lock de
+    escrita do banco.
+    """
+    thread_name = 'view-counter-flush'
+
+    def __init__(self):
+        super().__init__()
+        self._pending = defaultdict(int)
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """`listener(model, field, {pk: incremento})` é chamado depois de cada gravação bem-sucedida."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _notify(self, model, field, amounts):
+        for listener in self._listeners:
+            try:
+                listener(model, field, amounts)
+            except Exception as e:
+                logger.error(f"Contador de views: erro no listener {listener.__name__}: {e}")
+
+    def increment(self, instance_or_model, field, amount=1, pk=None):
+        model = instance_or_model if pk is not None else type(instance_or_model)
+        pk = pk if pk is not None else instance_or_model.pk
+        if not self.enabled:
+            model.objects.filter(pk=pk).update(**{field: F(field) + amount})
+            self._notify(model, field, {pk: amount})
+            return
+        with self._lock:
+            self._pending[(model, field, pk)] += amount
+            due = self._note_event()
+        self._after_event(due)
+
+    def pending(self, instance_or_model, field, pk=None):
+        """Incremento ainda não gravado deste processo para o objeto."""
+        model = instance_or_model if pk is not None else type(instance_or_model)
+        pk = pk if pk is not None else instance_or_model.pk
+        with self._lock:
+            return self._pending.get((model, field, pk), 0)
+
+    def display_value(self, instance, field):
+        """Valor para exibição: o gravado no banco mais o que ainda está no buffer."""
+        return (getattr(instance, field) or 0) + self.pending(instance, field)
+
+    def flush(self):
+        """Grava os incrementos pendentes; retorna quantos objetos foram atualizados."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(int)
+                self._reset_events()
+            if not pending:
+                return 0
+            grouped = defaultdict(dict)
+            for (model, field, pk), amount in pending.items():
+                grouped[(model, field)][pk] = amount
+            updated = 0
+            for (model, field), amounts in grouped.items():
+                try:
+                    updated += model.objects.filter(pk__in=list(amounts)).update(**{
+                        field: F(field) + Case(*[When(pk=pk, then=Value(amount)) for pk, amount in amounts.items()], default=Value(0), output_field=IntegerField())
+                    })
+                except Exception as e:
+                    logger.error(f"Contador de views: falha ao gravar {len(amounts)} {model.__name__}.{field}: {e}")
+                    with self._lock:
+                        for pk, amount in amounts.items():
+                            self._pending[(model, field, pk)] += amount
+                    continue
+                self._notify(model, field, amounts)
+            return updated
+
+
+def reader_key(request):
+    """Identifica o leitor para o sketch: id do usuário logado ou hash de IP + navegador (nada disso é gravado)."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"u:{user.pk}"
+    meta = request.META
+    address = meta.get('REMOTE_ADDR', '')
+    proxy_header = getattr(settings, 'READER_KEY_PROXY_HEADER', None)
+    if proxy_header and meta.get(proxy_header):
+        # Numa lista (X-Forwarded-For), vale o último endereço: o que o proxy acrescentou.
+        address = meta[proxy_header].split(',')[-1].strip() or address
+    digest = hashlib.blake2b(f"{address}|{meta.get('HTTP_USER_AGENT', '')}".encode(), key=settings.SECRET_KEY.encode()[:64], digest_size=16)
+    return f"a:{digest.hexdigest()}"
+
+
+class UniqueReaderBuffer(BufferedWriter):
+    """
+    Sketches HyperLogLog de leitores únicos por capítulo e dia, montados em memória e juntados aos
+    `core.ReaderSketch` gravados a cada flush (uma linha por capítulo/dia, sem linha por usuário).
+    """
+    thread_name = 'unique-readers-flush'
+
+    def __init__(self):
+        super().__init__()
+        self._pending = {}
+
+    def add(self, page, work, request=None, key=None):
+        key = key if key is not None else reader_key(request)
+        day = timezone.localdate()
+        page_id = getattr(page, 'pk', page)
+        work_id = getattr(work, 'pk', work)
+        if not self.enabled:
+            sketch = HyperLogLog()
+            sketch.add(key)
+            self._write({(page_id, day): (work_id, sketch)})
+            return
+        with self._lock:
+            entry = self._pending.get((page_id, day))
+            if entry is None:
+                entry = self._pending[(page_id, day)] = (work_id, HyperLogLog())
+            entry[1].add(key)
+            due = self._note_event()
+        self._after_event(due)
+
+    def pending(self, page=None, work=None, start=None, end=None):
+        """Cópias dos sketches ainda não gravados deste processo que batem com o filtro."""
+        page_id = getattr(page, 'pk', page)
+        work_id = getattr(work, 'pk', work)
+        with self._lock:
+            return [
+                HyperLogLog(sketch.registers)
+                for (entry_page_id, day), (entry_work_id, sketch) in self._pending.items()
+                if (page_id is None or entry_page_id == page_id)
+                and (work_id is None or entry_work_id == work_id)
+                and (start is None or day >= start)
+                and (end is None or day <= end)
+            ]
+
+    def flush(self):
+        """Junta os sketches pendentes aos gravados; retorna quantas linhas foram gravadas."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._reset_events()
+            if not pending:
+                return 0
+            try:
+                return self._write(pending)
+            except Exception as e:
+                logger.error(f"Leitores únicos: falha ao gravar {len(pending)} sketches: {e}")
+                with self._lock:
+                    for key, (work_id, sketch) in pending.items():
+                        current = self._pending.get(key)
+                        if current is not None:
+                            sketch.merge(current[1])
+                        self._pending[key] = (work_id, sketch)
+                return 0
+
+    def _write(self, pending):
+        from wagtail.models import Page
+
+        from core.models import ReaderSketch
+
+        # Capítulo ou obra apagados enquanto o sketch estava no buffer: descarta, senão o lote inteiro falha.
+        live_ids = set(Page.objects.filter(pk__in={id_ for (page_id, _day), (work_id, _sketch) in pending.items() for id_ in (page_id, work_id)}).values_list('pk', flat=True))
+        pending = {key: entry for key, entry in pending.items() if key[0] in live_ids and entry[0] in live_ids}
+        with transaction.atomic():
+            existing = {
+                (row.page_id, row.day): row
+                for row in ReaderSketch.objects.select_for_update().filter(
+                    page_id__in={page_id for page_id, _day in pending}, day__in={day for _page_id, day in pending}
+                )
+            }
+            to_create, to_update = [], []
+            for (page_id, day), (work_id, sketch) in pending.items():
+                row = existing.get((page_id, day))
+                if row is None:
+                    to_create.append(ReaderSketch(page_id=page_id, work_id=work_id, day=day, registers=sketch.to_bytes()))
+                else:
+                    row.registers = row.sketch.merge(sketch).to_bytes()
+                    row.updated_at = timezone.now()
+                    to_update.append(row)
+            ReaderSketch.objects.bulk_create(to_create)
+            ReaderSketch.objects.bulk_update(to_update, ['registers', 'updated_at'])
+        return len(to_create) + len(to_update)
+
+
+view_counter = ViewCounterBuffer()
+unique_readers = UniqueReaderBuffer()
+atexit.register(view_counter.flush)
+atexit.register(unique_readers.flush)
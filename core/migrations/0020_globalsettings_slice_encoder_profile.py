@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_globalsettings_default_currency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globalsettings',
+            name='slice_encoder_profile',
+            field=models.CharField(choices=[('equilibrado', 'Equilibrado (speed 7, qualidade 55)'), ('rapido', 'Rápido (speed 9, qualidade 50)'), ('qualidade', 'Qualidade (speed 5, qualidade 65)'), ('adaptativo', 'Adaptativo (ajusta por fatia conforme a complexidade)')], default='equilibrado', help_text='Perfil AVIF usado nos uploads de capítulos quando o envio não escolhe outro. O adaptativo ajusta speed/qualidade por fatia.', max_length=20, verbose_name='Perfil de Codificação das Fatias'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_globalsettings_slice_encoder_profile'),
+        ('wagtailcore', '0095_query_searchpromotion_querydailyhits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReaderSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('registers', models.BinaryField(verbose_name='Registradores')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reader_sketches', to='wagtailcore.page', verbose_name='Capítulo')),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailcore.page', verbose_name='Obra')),
+            ],
+            options={
+                'verbose_name': 'Sketch de Leitores Únicos',
+                'verbose_name_plural': 'Sketches de Leitores Únicos',
+                'indexes': [models.Index(fields=['work', 'day'], name='core_reader_work_id_e14d26_idx')],
+                'unique_together': {('page', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_reader_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globalsettings',
+            name='home_ranking_period',
+            field=models.CharField(choices=[('trending', 'Em alta (views recentes pesam mais)'), ('dia', 'Mais vistos nas últimas 24 horas'), ('semana', 'Mais vistos nos últimos 7 dias'), ('total', 'Mais vistos de todos os tempos')], default='trending', help_text="Como a seção 'Ranking' da página inicial ordena as obras. 'Em alta' dá mais peso às views recentes.", max_length=10, verbose_name='Período do Ranking da Home'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_globalsettings_home_ranking_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globalsettings',
+            name='badge_settings_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incrementada a cada gravação; invalida o cache de badges de todos os workers.', verbose_name='Versão das Configurações de Badge'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 # core/models.py
 
 import os
+from datetime import timedelta
+
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from pathlib import Path
 from django.conf import settings
@@ -24,6 +27,9 @@ from wagtail.contrib.settings.models import BaseSiteSetting, BaseGenericSetting,
 from wagtail.fields import RichTextField
 from wagtail.images import get_image_model
 
+from core.choices import DEFAULT_ENCODER_PROFILE, DEFAULT_RANKING, ENCODER_PROFILE_CHOICES, RANKING_CHOICES
+from core.hll import HyperLogLog
+
 Image = get_image_model()
 
 # ================================================================
@@ -67,6 +73,59 @@ class UserReaction(models.Model):
     def __str__(self):
         return f"{self.user.username} reagiu com '{self.reaction_type.name}' em '{self.page.title}'"
 
+class ReaderSketch(models.Model):
+    """Leitores únicos aproximados (HyperLogLog) de um capítulo num dia; alimentado por `core.counters.unique_readers`."""
+    page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name="reader_sketches", verbose_name=_("Capítulo"))
+    work = models.ForeignKey(Page, on_delete=models.CASCADE, related_name="+", verbose_name=_("Obra"))
+    day = models.DateField(_("Dia"))
+    registers = models.BinaryField(_("Registradores"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('page', 'day')
+        indexes = [models.Index(fields=['work', 'day'])]
+        verbose_name = _("Sketch de Leitores Únicos")
+        verbose_name_plural = _("Sketches de Leitores Únicos")
+
+    def __str__(self):
+        return f"{self.page_id} em {self.day}"
+
+    @property
+    def sketch(self):
+        return HyperLogLog.from_bytes(self.registers)
+
+    @classmethod
+    def merged(cls, page=None, work=None, start=None, end=None):
+        """União dos sketches gravados (e dos ainda no buffer deste processo) no filtro dado."""
+        from core.counters import unique_readers
+
+        rows = cls.objects.all()
+        if page is not None:
+            rows = rows.filter(page=page)
+        if work is not None:
+            rows = rows.filter(work=work)
+        if start is not None:
+            rows = rows.filter(day__gte=start)
+        if end is not None:
+            rows = rows.filter(day__lte=end)
+        sketches = [HyperLogLog.from_bytes(data) for data in rows.values_list('registers', flat=True)]
+        sketches += unique_readers.pending(page=page, work=work, start=start, end=end)
+        return HyperLogLog.union(sketches)
+
+    @classmethod
+    def estimate(cls, page=None, work=None, start=None, end=None):
+        return cls.merged(page=page, work=work, start=start, end=end).count()
+
+    @classmethod
+    def weekly(cls, work=None, page=None, weeks=4):
+        """[(segunda-feira da semana, leitores únicos)] das últimas `weeks` semanas, da mais recente à mais antiga."""
+        today = timezone.localdate()
+        monday = today - timedelta(days=today.weekday())
+        return [
+            (start, cls.estimate(page=page, work=work, start=start, end=start + timedelta(days=6)))
+            for start in (monday - timedelta(weeks=offset) for offset in range(weeks))
+        ]
+
 # ================================================================
 # == FIM DOS NOVOS MODELOS
 # ================================================================
@@ -175,6 +234,7 @@ class GlobalSettings(BaseSiteSetting, ClusterableModel):
     new_chapter_days_threshold = models.PositiveIntegerField(default=2, verbose_name=_("Limite de Dias para Badge Automático"))
     new_chapter_badge_text = models.CharField(max_length=20, default="NOVO!", blank=True, verbose_name=_("Texto Padrão do Badge 'Novo Capítulo'"))
     new_chapter_badge_image = models.ForeignKey(Image, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', verbose_name=_("Imagem/GIF Padrão do Badge 'Novo Capítulo' (Opcional)"))
+    badge_settings_version = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Versão das Configurações de Badge"), help_text=_("Incrementada a cada gravação; invalida o cache de badges de todos os workers."))
     livepix_widget_url = models.URLField(blank=True, null=True, verbose_name=_("URL do Widget LivePix (Home)"))
     comment_provider = models.CharField(max_length=50, choices=COMMENT_PROVIDERS, default='disqus', verbose_name=_("Provedor de Comentários"))
     disqus_shortname = models.CharField(max_length=100, blank=True, verbose_name=_("Disqus Shortname"))
@@ -216,6 +276,21 @@ class GlobalSettings(BaseSiteSetting, ClusterableModel):
         help_text=_("Se marcado, as páginas dos capítulos serão exibidas em <canvas> para dificultar o download. Se desmarcado, usará a tag <img> padrão.")
     )
 
+    slice_encoder_profile = models.CharField(
+        max_length=20,
+        choices=ENCODER_PROFILE_CHOICES,
+        default=DEFAULT_ENCODER_PROFILE,
+        verbose_name=_("Perfil de Codificação das Fatias"),
+        help_text=_("Perfil AVIF usado nos uploads de capítulos quando o envio não escolhe outro. O adaptativo ajusta speed/qualidade por fatia.")
+    )
+    home_ranking_period = models.CharField(
+        max_length=10,
+        choices=RANKING_CHOICES,
+        default=DEFAULT_RANKING,
+        verbose_name=_("Período do Ranking da Home"),
+        help_text=_("Como a seção 'Ranking' da página inicial ordena as obras. 'Em alta' dá mais peso às views recentes.")
+    )
+
     activate_premium_banner = models.BooleanField(default=False, verbose_name=_("Ativar Banner Premium na Home?"))
     premium_banner_badge = models.CharField(max_length=100, blank=True, default="Premium", verbose_name=_("Badge do Banner"))
     premium_banner_title = models.CharField(max_length=200, blank=True, default="Desbloqueie funcionalidades exclusivas", verbose_name=_("Título do Banner"))
@@ -298,6 +373,12 @@ class GlobalSettings(BaseSiteSetting, ClusterableModel):
         MultiFieldPanel([
             FieldPanel('use_canvas_reader'),
         ], heading=_("Configurações do Leitor de Capítulos")),
+        MultiFieldPanel([
+            FieldPanel('home_ranking_period'),
+        ], heading=_("Ranking de Obras")),
+        MultiFieldPanel([
+            FieldPanel('slice_encoder_profile'),
+        ], heading=_("Codificação das Fatias")),
     ]
 
     comentarios_panels = [
@@ -0,0 +1,10 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from .badges import bump_badge_settings_version
+from .models import GlobalSettings
+
+@receiver(post_save, sender=GlobalSettings)
+@receiver(post_delete, sender=GlobalSettings)
+def invalidate_badge_settings(sender, instance, **kwargs):
+    bump_badge_settings_version(instance if kwargs.get('signal') is post_save else None)
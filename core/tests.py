@@ -1,3 +1,200 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from wagtail.models import Page
+
+from manga.models import MangaChapterPage, MangaPage
+
+from .counters import BufferedWriter, UniqueReaderBuffer, ViewCounterBuffer, reader_key
+from .hll import HyperLogLog
+from .models import ReaderSketch
+
+# Sem flush automático nem thread gravando no meio do teste: só o flush explícito grava.
+MANUAL_FLUSH = dict(
+    VIEW_COUNTER_BUFFERED=True, VIEW_COUNTER_FLUSH_EVENTS=10_000, VIEW_COUNTER_FLUSH_SECONDS=3600,
+)
+
+
+def make_work(slug='obra', chapters=0):
+    work = Page.get_first_root_node().add_child(instance=MangaPage(title='Obra', slug=slug))
+    chapter_pages = []
+    for number in range(1, chapters + 1):
+        chapter = MangaChapterPage(title='', chapter_number=str(number))
+        work.add_child(instance=chapter)
+        chapter_pages.append(chapter)
+    return work, chapter_pages
+
+
+class HyperLogLogTests(TestCase):
+    def test_error_stays_within_bound(self):
+        # Erro típico de ~1,6% com 4096 registradores; 5% fica acima de 3 desvios-padrão.
+        for size in (1_000, 20_000, 100_000):
+            sketch = HyperLogLog()
+            for index in range(size):
+                sketch.add(f"leitor-{index}")
+            self.assertLess(abs(sketch.count() - size) / size, 0.05, size)
+
+    def test_small_counts_are_nearly_exact(self):
+        sketch = HyperLogLog()
+        for index in range(10):
+            sketch.add(index)
+            sketch.add(index)
+        self.assertAlmostEqual(sketch.count(), 10, delta=1)
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_merge_counts_the_union(self):
+        first, second, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        for index in range(5_000):
+            first.add(index)
+            both.add(index)
+        for index in range(2_500, 7_500):
+            second.add(index)
+            both.add(index)
+        self.assertEqual(HyperLogLog.union([first, second]).registers, both.registers)
+        self.assertEqual(first.merge(second).count(), both.count())
+
+    def test_bytes_round_trip(self):
+        sketch = HyperLogLog()
+        for index in range(300):
+            sketch.add(index)
+        data = sketch.to_bytes()
+        self.assertLess(len(data), sketch.size)
+        self.assertEqual(HyperLogLog.from_bytes(data).registers, sketch.registers)
+        self.assertEqual(HyperLogLog.from_bytes(b'').count(), 0)
+
+    def test_rejects_mismatched_precision(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(bytearray(16))
+        with self.assertRaises(ValueError):
+            HyperLogLog().merge(HyperLogLog(precision=10))
+
+
+@override_settings(**MANUAL_FLUSH)
+class ViewCounterBufferTests(TestCase):
+    def setUp(self):
+        self.work, _chapters = make_work()
+        self.counter = ViewCounterBuffer()
+
+    def test_increments_wait_for_flush(self):
+        self.counter.increment(self.work, 'views_count')
+        self.counter.increment(self.work, 'views_count', amount=2)
+        self.assertEqual(self.counter.pending(self.work, 'views_count'), 3)
+        self.assertEqual(self.counter.display_value(self.work, 'views_count'), 3)
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.views_count, 0)
+
+        self.assertEqual(self.counter.flush(), 1)
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.views_count, 3)
+        self.assertEqual(self.counter.pending(self.work, 'views_count'), 0)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_listeners_receive_written_amounts(self):
+        calls = []
+        self.counter.add_listener(lambda model, field, amounts: calls.append((model, field, amounts)))
+        self.counter.increment(self.work, 'views_count', amount=4)
+        self.counter.flush()
+        self.assertEqual(calls, [(MangaPage, 'views_count', {self.work.pk: 4})])
+
+    def test_failed_write_is_requeued(self):
+        calls = []
+        self.counter.add_listener(lambda model, field, amounts: calls.append(amounts))
+        self.counter.increment(self.work, 'views_count', amount=5)
+        with mock.patch.object(MangaPage.objects, 'filter', side_effect=DatabaseError("banco fora")):
+            self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(calls, [])
+        self.counter.increment(self.work, 'views_count')
+        self.assertEqual(self.counter.pending(self.work, 'views_count'), 6)
+
+        self.assertEqual(self.counter.flush(), 1)
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.views_count, 6)
+        self.assertEqual(calls, [{self.work.pk: 6}])
+
+    def test_due_flush_runs_on_the_flusher_thread(self):
+        flushed_on = []
+        done = threading.Event()
+
+        def fake_flush():
+            flushed_on.append(threading.current_thread().name)
+            done.set()
+            return 0
+
+        with override_settings(VIEW_COUNTER_FLUSH_EVENTS=1), mock.patch.object(self.counter, 'flush', side_effect=fake_flush):
+            self.counter.increment(self.work, 'views_count')
+            self.assertTrue(done.wait(5))
+        self.assertEqual(flushed_on, [ViewCounterBuffer.thread_name])
+
+    def test_base_requires_flush(self):
+        with self.assertRaises(TypeError):
+            BufferedWriter()
+
+    @override_settings(VIEW_COUNTER_BUFFERED=False)
+    def test_unbuffered_writes_immediately(self):
+        self.counter.increment(self.work, 'views_count')
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.views_count, 1)
+        self.assertEqual(self.counter.pending(self.work, 'views_count'), 0)
+
+
+@override_settings(**MANUAL_FLUSH)
+class UniqueReaderBufferTests(TestCase):
+    def setUp(self):
+        self.work, (self.first, self.second) = make_work(chapters=2)
+        self.readers = UniqueReaderBuffer()
+
+    def test_flush_merges_into_stored_sketches(self):
+        for index in range(50):
+            self.readers.add(self.first, self.work, key=f"u:{index}")
+        self.assertEqual(self.readers.flush(), 1)
+        for index in range(25, 75):
+            self.readers.add(self.first, self.work, key=f"u:{index}")
+            self.readers.add(self.second, self.work, key=f"u:{index}")
+        self.assertEqual(self.readers.flush(), 2)
+
+        self.assertEqual(ReaderSketch.objects.count(), 2)
+        with mock.patch('core.counters.unique_readers', self.readers):
+            self.assertAlmostEqual(ReaderSketch.estimate(page=self.first), 75, delta=2)
+            self.assertAlmostEqual(ReaderSketch.estimate(work=self.work), 75, delta=2)
+
+    def test_failed_write_is_requeued(self):
+        for index in range(10):
+            self.readers.add(self.first, self.work, key=f"u:{index}")
+        with mock.patch.object(self.readers, '_write', side_effect=DatabaseError("banco fora")):
+            self.assertEqual(self.readers.flush(), 0)
+        for index in range(10, 20):
+            self.readers.add(self.first, self.work, key=f"u:{index}")
+        pending = self.readers.pending(page=self.first)
+        self.assertEqual(len(pending), 1)
+        self.assertAlmostEqual(pending[0].count(), 20, delta=1)
+
+        self.assertEqual(self.readers.flush(), 1)
+        row = ReaderSketch.objects.get(page=self.first, day=timezone.localdate())
+        self.assertAlmostEqual(row.sketch.count(), 20, delta=1)
+
+    def test_deleted_pages_are_dropped(self):
+        self.readers.add(self.first, self.work, key='u:1')
+        self.readers.add(self.second, self.work, key='u:1')
+        self.second.delete()
+        self.assertEqual(self.readers.flush(), 1)
+        self.assertEqual(list(ReaderSketch.objects.values_list('page_id', flat=True)), [self.first.pk])
+
+
+class ReaderKeyTests(SimpleTestCase):
+    def key(self, **meta):
+        return reader_key(RequestFactory().get('/', HTTP_USER_AGENT='navegador', **meta))
+
+    def test_proxy_headers_are_ignored_by_default(self):
+        direct = self.key(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(self.key(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4', HTTP_CF_CONNECTING_IP='5.6.7.8'), direct)
+        self.assertNotEqual(self.key(REMOTE_ADDR='10.0.0.2'), direct)
+
+    @override_settings(READER_KEY_PROXY_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_trusted_header_uses_the_address_added_by_the_proxy(self):
+        client = self.key(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='9.9.9.9')
+        # O cliente pode mandar o cabeçalho já preenchido; o proxy acrescenta o IP real no fim.
+        self.assertEqual(self.key(REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='1.2.3.4, 9.9.9.9'), client)
+        self.assertEqual(self.key(REMOTE_ADDR='10.0.0.1'), self.key(REMOTE_ADDR='10.0.0.1', HTTP_CF_CONNECTING_IP='9.9.9.9'))
@@ -0,0 +1,46 @@
+#!/bin/sh
+# Processos do container (primeiro argumento):
+#   web (padrão)  gunicorn, o worker das ingestões de capítulos e as tarefas periódicas no mesmo container;
+#   worker        só o worker das ingestões (django-tasks, backend 'ingest'), para rodar em outro container;
+#   periodic      só as tarefas periódicas.
+# No modo web, INGEST_WORKER=0 / PERIODIC_TASKS=0 deixam de fora o worker / as tarefas periódicas
+# (quando eles rodam em containers próprios). Qualquer outro argumento é executado como comando.
+set -e
+
+run_worker() {
+    while true; do
+        python manage.py db_worker --backend ingest || true
+        echo "db_worker terminou; reiniciando em 5s." >&2
+        sleep 5
+    done
+}
+
+run_periodic() {
+    while true; do
+        python manage.py update_trending_scores || echo "update_trending_scores falhou." >&2
+        python manage.py cleanup_ingest_uploads || echo "cleanup_ingest_uploads falhou." >&2
+        python manage.py prune_slice_blobs || echo "prune_slice_blobs falhou." >&2
+        sleep 3600
+    done
+}
+
+case "${1:-web}" in
+    worker)
+        run_worker
+        ;;
+    periodic)
+        run_periodic
+        ;;
+    web)
+        if [ "${INGEST_WORKER:-1}" != "0" ]; then
+            run_worker &
+        fi
+        if [ "${PERIODIC_TASKS:-1}" != "0" ]; then
+            run_periodic &
+        fi
+        exec gunicorn --bind "0.0.0.0:${PORT:-8000}" --workers 3 astratoons.wsgi:application
+        ;;
+    *)
+        exec "$@"
+        ;;
+esac
@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime
+from functools import reduce
+from operator import or_
+
+from django.db.models import Exists, F, OuterRef, Q, Window
+from django.db.models.functions import Length, RowNumber, Substr
+from wagtail.models import Page
+
+from .models import ReleaseEvent
+
+logger = logging.getLogger(__name__)
+
+try:
+    from manga.models import MangaPage, MangaChapterPage
+    MANGA_MODELS_IMPORTED_SUCCESSFULLY = True
+except ImportError: MangaPage, MangaChapterPage, MANGA_MODELS_IMPORTED_SUCCESSFULLY = None, None, False
+try:
+    from novels.models import NovelPage, NovelChapterPage
+    NOVEL_MODELS_IMPORTED_SUCCESSFULLY = True
+except ImportError: NovelPage, NovelChapterPage, NOVEL_MODELS_IMPORTED_SUCCESSFULLY = None, None, False
+from core.badges import get_badge_settings
+
+LATEST_RELEASES_PAGE_SIZE = 12
+RECENT_CHAPTERS_PER_CARD = 3
+
+
+def encode_cursor(released_at, event_id):
+    return f"{released_at.isoformat()}_{event_id}"
+
+
+def decode_cursor(value):
+    """Converte o cursor 'data-iso_pk' de volta para (datetime, pk). Cursores inválidos voltam ao início do feed."""
+    if not value:
+        return None
+    try:
+        timestamp, pk = value.replace(' ', '+').rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def _visible_work_ids(model, user):
+    base_queryset = model.objects.visible_for(user) if hasattr(model.objects, 'visible_for') else model.objects.live().public()
+    return base_queryset.values('pk')
+
+
+def get_latest_releases(user, cursor=None, limit=LATEST_RELEASES_PAGE_SIZE):
+    """
+    Uma página do feed "Últimos Lançamentos" (mangás e novels) lida da tabela ReleaseEvent.
+    Cada obra aparece uma única vez, no evento do seu capítulo no ar mais recente, e a
+    paginação usa o cursor (released_at, id), então o custo não cresce com a página.
+    Retorna (itens, próximo_cursor); próximo_cursor é None na última página.
+    """
+    visible = Q(pk__in=[])
+    for model, item_type, available in (
+        (MangaPage, 'manga', MANGA_MODELS_IMPORTED_SUCCESSFULLY),
+        (NovelPage, 'novel', NOVEL_MODELS_IMPORTED_SUCCESSFULLY),
+    ):
+        if available:
+            visible |= Q(work_type=item_type, work_id__in=_visible_work_ids(model, user))
+
+    newer_release = ReleaseEvent.objects.filter(
+        Q(released_at__gt=OuterRef('released_at')) | Q(released_at=OuterRef('released_at'), pk__gt=OuterRef('pk')),
+        work_id=OuterRef('work_id'),
+        chapter__live=True,
+    )
+    events = ReleaseEvent.objects.filter(visible, chapter__live=True).exclude(Exists(newer_release))
+    if cursor:
+        released_at, event_id = cursor
+        events = events.filter(Q(released_at__lt=released_at) | Q(released_at=released_at, pk__lt=event_id))
+    rows = list(events.order_by('-released_at', '-pk').values_list('pk', 'released_at', 'work_id', 'work_type')[:limit + 1])
+
+    page_rows = rows[:limit]
+    works = {}
+    for model, item_type, cover_field in ((MangaPage, 'manga', 'cover'), (NovelPage, 'novel', 'cover_image')):
+        work_ids = [work_id for _pk, _released_at, work_id, work_type in page_rows if work_type == item_type]
+        if work_ids:
+            works.update(model.objects.select_related(cover_field).prefetch_related(f'{cover_field}__renditions').in_bulk(work_ids))
+
+    page_items = []
+    for event_id, released_at, work_id, work_type in page_rows:
+        item = works.get(work_id)
+        if item is None:
+            continue
+        item.item_type = work_type
+        item.latest_activity_date = released_at
+        page_items.append(item)
+    attach_recent_chapters(page_items)
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_event_id, last_released_at = page_rows[-1][0], page_rows[-1][1]
+        next_cursor = encode_cursor(last_released_at, last_event_id)
+    return page_items, next_cursor
+
+
+def _recent_chapters_by_parent(chapter_model, works, order_by, count, related=()):
+    """Top `count` capítulos no ar de cada obra numa única consulta com ROW_NUMBER particionado pelo caminho da obra pai."""
+    if not works:
+        return {}
+    parent_path = Substr('path', 1, Length('path') - Page.steplen)
+    chapters = (
+        chapter_model.objects.live().public()
+        .filter(reduce(or_, (Q(path__startswith=work.path, depth=work.depth + 1) for work in works)))
+        .select_related(*related)
+        .annotate(
+            parent_path=parent_path,
+            row_number=Window(RowNumber(), partition_by=[parent_path], order_by=order_by),
+        )
+        .filter(row_number__lte=count)
+        .order_by('parent_path', 'row_number')
+    )
+    by_parent = {}
+    for chapter in chapters:
+        by_parent.setdefault(chapter.parent_path, []).append(chapter)
+    return by_parent
+
+
+def attach_recent_chapters(items, count=RECENT_CHAPTERS_PER_CARD):
+    """
+    Anexa a cada obra da lista `recent_chapters` (com `badge` pré-calculado em cada capítulo)
+    e `show_vip_badge`, usando um número constante de consultas para a lista inteira.
+    """
+    mangas = [item for item in items if MangaPage and isinstance(item, MangaPage)]
+    novels = [item for item in items if NovelPage and isinstance(item, NovelPage)]
+    recent = {}
+    locked_paths = set()
+    try:
+        if mangas:
+            recent.update(_recent_chapters_by_parent(
+                MangaChapterPage, mangas, [F('sort_key_main').desc(), F('sort_key_sub').desc(), F('path').desc()], count,
+                related=('manual_badge_image',),
+            ))
+            locked_chapters = MangaChapterPage.objects.live().public().locked().filter(
+                reduce(or_, (Q(path__startswith=manga.path, depth=manga.depth + 1) for manga in mangas))
+            )
+            locked_paths = {path[:-Page.steplen] for path in locked_chapters.values_list('path', flat=True)}
+        if novels:
+            recent.update(_recent_chapters_by_parent(
+                NovelChapterPage, novels, [F('chapter_number_sortable').desc(), F('path').desc()], count,
+            ))
+    except Exception as e:
+        logger.error(f"Feed: Erro ao carregar os capítulos recentes dos cards: {e}", exc_info=True)
+
+    badge_settings = get_badge_settings() if recent else None
+    for item in items:
+        item.recent_chapters = recent.get(item.path, [])
+        for chapter in item.recent_chapters:
+            chapter.badge = chapter.get_badge_info(badge_settings=badge_settings)
+        item.show_vip_badge = bool(getattr(item, 'chapters_are_vip', False) or item.path in locked_paths)
+    return items
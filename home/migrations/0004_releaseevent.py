@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-17 03:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_release_events(apps, schema_editor):
+    ReleaseEvent = apps.get_model('home', 'ReleaseEvent')
+    sources = (
+        ('manga', apps.get_model('manga', 'MangaPage'), apps.get_model('manga', 'MangaChapterPage')),
+        ('novel', apps.get_model('novels', 'NovelPage'), apps.get_model('novels', 'NovelChapterPage')),
+    )
+    steplen = 4
+    for work_type, work_model, chapter_model in sources:
+        work_ids_by_path = dict(work_model.objects.values_list('path', 'pk'))
+        events = []
+        chapters = chapter_model.objects.filter(live=True, first_published_at__isnull=False).values_list('pk', 'path', 'first_published_at')
+        for chapter_id, path, first_published_at in chapters.iterator():
+            work_id = work_ids_by_path.get(path[:-steplen])
+            if work_id is not None:
+                events.append(ReleaseEvent(work_id=work_id, work_type=work_type, chapter_id=chapter_id, released_at=first_published_at))
+        ReleaseEvent.objects.bulk_create(events, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0003_alter_homepage_options'),
+        ('wagtailcore', '0095_query_searchpromotion_querydailyhits'),
+        ('manga', '0043_mangapage_chapters_version'),
+        ('novels', '0010_novelpage_chapters_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleaseEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('work_type', models.CharField(choices=[('manga', 'Mangá'), ('novel', 'Novel')], max_length=10, verbose_name='Tipo de Obra')),
+                ('released_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Lançado em')),
+                ('chapter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailcore.page', verbose_name='Capítulo')),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailcore.page', verbose_name='Obra')),
+            ],
+            options={
+                'verbose_name': 'Evento de Lançamento',
+                'verbose_name_plural': 'Eventos de Lançamento',
+                'indexes': [models.Index(fields=['released_at', 'id'], name='release_event_feed_idx'), models.Index(fields=['work', 'released_at'], name='release_event_work_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_release_events, migrations.RunPython.noop),
+    ]
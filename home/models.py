@@ -1,20 +1,15 @@
 # Arquivo: home/models.py
 from django.db import models
-from django.db.models import OuterRef, Subquery, Value, CharField
+from django.utils import timezone
 from wagtail.models import Page
-import operator
 import logging
 
 logger = logging.getLogger(__name__)
 
 try:
-    from manga.models import MangaPage, MangaChapterPage
+    from manga.models import MangaPage
     MANGA_MODELS_IMPORTED_SUCCESSFULLY = True
-except ImportError: MangaPage, MangaChapterPage, MANGA_MODELS_IMPORTED_SUCCESSFULLY = None, None, False
-try:
-    from novels.models import NovelPage, NovelChapterPage
-    NOVEL_MODELS_IMPORTED_SUCCESSFULLY = True
-except ImportError: NovelPage, NovelChapterPage, NOVEL_MODELS_IMPORTED_SUCCESSFULLY = None, None, False
+except ImportError: MangaPage, MANGA_MODELS_IMPORTED_SUCCESSFULLY = None, False
 
 class HomePage(Page):
     max_count = 1
@@ -23,75 +18,23 @@ class HomePage(Page):
 
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
-        all_latest_items = []
         popular_mangas_list = None
         
-        if MANGA_MODELS_IMPORTED_SUCCESSFULLY:
-            try:
-                latest_chapter_publish_date_subquery = MangaChapterPage.objects.filter(
-                    path__startswith=OuterRef('path'),
-                    depth=OuterRef('depth') + 1,
-                    live=True,
-                    first_published_at__isnull=False
-                ).order_by('-first_published_at').values('first_published_at')[:1]
-
-                latest_mangas = (
-                    MangaPage.objects.visible_for(request.user)
-                    .annotate(
-                        latest_activity_date=Subquery(
-                            latest_chapter_publish_date_subquery,
-                            output_field=models.DateTimeField(null=True)
-                        ),
-                        item_type=Value('manga', output_field=CharField())
-                    )
-                    .filter(latest_activity_date__isnull=False)
-                )
-                all_latest_items.extend(list(latest_mangas))
-            except Exception as e:
-                logger.error(f"HomePage: Erro ao buscar Últimos Lançamentos de MANGÁS: {e}", exc_info=True)
-        
-        if NOVEL_MODELS_IMPORTED_SUCCESSFULLY:
-            try:
-                latest_novel_chapter_date_subquery = NovelChapterPage.objects.filter(
-                    path__startswith=OuterRef('path'),
-                    depth=OuterRef('depth') + 1,
-                    live=True,
-                    first_published_at__isnull=False
-                ).order_by('-first_published_at').values('first_published_at')[:1]
-
-                base_queryset_novels = getattr(NovelPage, 'objects', NovelPage.objects)
-                visible_novels_qs = base_queryset_novels.visible_for(request.user) if hasattr(base_queryset_novels, 'visible_for') else base_queryset_novels.live().public()
-
-                latest_novels = (
-                    visible_novels_qs
-                    .annotate(
-                        latest_activity_date=Subquery(
-                            latest_novel_chapter_date_subquery,
-                            output_field=models.DateTimeField(null=True)
-                        ),
-                        item_type=Value('novel', output_field=CharField())
-                    )
-                    .filter(latest_activity_date__isnull=False)
-                )
-                all_latest_items.extend(list(latest_novels))
-            except Exception as e:
-                logger.error(f"HomePage: Erro ao buscar Últimos Lançamentos de NOVELS: {e}", exc_info=True)
-
-        if all_latest_items:
-            sorted_items = sorted(all_latest_items, key=operator.attrgetter('latest_activity_date'), reverse=True)
-            context['latest_items'] = sorted_items[:12]
-            context['has_more_items'] = len(sorted_items) > 12
-        else:
-            context['latest_items'] = []
-            context['has_more_items'] = False
+        from .feed import get_latest_releases
+        latest_items, next_cursor = get_latest_releases(request.user)
+        context['latest_items'] = latest_items
+        context['has_more_items'] = next_cursor is not None
+        context['next_cursor'] = next_cursor
             
         if MANGA_MODELS_IMPORTED_SUCCESSFULLY:
             try:
+                from core.models import GlobalSettings
+                from manga.trending import DEFAULT_RANKING, order_by_ranking
+
                 base_queryset_mangas = MangaPage.objects.visible_for(request.user)
-                if hasattr(MangaPage, 'views_count'):
-                    popular_mangas_list = base_queryset_mangas.order_by('-views_count')[:6]
-                else:
-                    popular_mangas_list = base_queryset_mangas.order_by('-first_published_at')[:6]
+                global_settings = GlobalSettings.for_request(request)
+                period = getattr(global_settings, 'home_ranking_period', '') or DEFAULT_RANKING
+                popular_mangas_list = order_by_ranking(base_queryset_mangas, period)[:6]
             except Exception as e_popular:
                 logger.error(f"HomePage: Erro ao buscar Mais Vistos: {e_popular}", exc_info=True)
                 popular_mangas_list = None
@@ -100,4 +43,48 @@ class HomePage(Page):
         return context
 
     class Meta:
-        verbose_name = "Página Inicial"
\ No newline at end of file
+        verbose_name = "Página Inicial"
+
+
+class ReleaseEvent(models.Model):
+    """
+    Registro append-only de cada capítulo (mangá ou novel) que entra no ar pela primeira vez.
+    Alimenta o feed "Últimos Lançamentos" com paginação por cursor (released_at, id).
+    """
+    WORK_TYPE_CHOICES = [
+        ('manga', "Mangá"),
+        ('novel', "Novel"),
+    ]
+
+    work = models.ForeignKey(Page, on_delete=models.CASCADE, related_name='+', verbose_name="Obra")
+    work_type = models.CharField("Tipo de Obra", max_length=10, choices=WORK_TYPE_CHOICES)
+    chapter = models.OneToOneField(Page, on_delete=models.CASCADE, related_name='+', verbose_name="Capítulo")
+    released_at = models.DateTimeField("Lançado em", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Evento de Lançamento"
+        verbose_name_plural = "Eventos de Lançamento"
+        indexes = [
+            models.Index(fields=['released_at', 'id'], name='release_event_feed_idx'),
+            models.Index(fields=['work', 'released_at'], name='release_event_work_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.work_type}:{self.work_id} capítulo {self.chapter_id} em {self.released_at}"
+
+    @classmethod
+    def record(cls, chapter, work_type):
+        """Registra o lançamento do capítulo se ainda não existir; republicações não geram novo evento."""
+        work_path = chapter.path[:-Page.steplen]
+        work_id = Page.objects.filter(path=work_path).values_list('pk', flat=True).first()
+        if work_id is None:
+            return None
+        event, _created = cls.objects.get_or_create(
+            chapter_id=chapter.pk,
+            defaults={
+                'work_id': work_id,
+                'work_type': work_type,
+                'released_at': chapter.first_published_at or timezone.now(),
+            },
+        )
+        return event
@@ -4,6 +4,7 @@ import logging
 import os
 import io
 import json
+from datetime import timedelta
 from PIL import Image as PillowImage
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
@@ -14,13 +15,16 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.core.files.base import ContentFile
-from django.db import transaction
 from django.db.models import Count
+from django.core.exceptions import ValidationError
 
-from .models import MangaPage, MangaChapterPage, ChapterImage
+from .models import MangaPage, MangaChapterPage, ChapterImage, ChapterIngestJob, IngestJobKind
+from .encoder_profiles import ENCODER_PROFILE_CHOICES
 from .forms import CombinedUploadForm
-from .utils import process_manga_zip
-from wagtail.models import Locale
+from .tasks import enqueue_ingest_job
+from .slice_cache import decrypted_slice_cache
+from core.models import ReaderSketch
+from wagtail.models import Locale, Page
 from django.conf import settings
 from wagtail.images.models import Image as WagtailImage
 from pathlib import Path
@@ -73,18 +77,9 @@ def combined_upload_zip_view(request):
             owner_user = request.user
 
             try:
-                success, processing_messages = process_manga_zip(
-                    manga_page=selected_manga,
-                    zip_file_obj=zip_file_obj,
-                    owner_user=owner_user
-                )
-                for level, msg in processing_messages:
-                    messages.add_message(request, level, msg)
-
-                if success and not any(level == messages.ERROR for level, msg in processing_messages):
-                    if not any(level == messages.SUCCESS for level, msg in processing_messages):
-                         messages.success(request, _("Processamento concluído. Verifique os detalhes abaixo."))
-                    return redirect(reverse('wagtailadmin_explore', args=[selected_manga.id]))
+                job = enqueue_ingest_job(selected_manga, owner_user, IngestJobKind.ZIP, [zip_file_obj], encoder_profile=form.cleaned_data['encoder_profile'])
+                messages.success(request, _("ZIP recebido. Os capítulos estão sendo processados em segundo plano."))
+                return redirect(f"{reverse('manga:upload_zip')}?manga_id={selected_manga.pk}&job={job.pk}")
 
             except Exception as e:
                 logger.exception(f"Erro fatal em combined_upload_zip_view para manga {selected_manga.pk if 'selected_manga' in locals() else 'N/A'}. Erro: {e}")
@@ -92,12 +87,20 @@ def combined_upload_zip_view(request):
     else:
         form = CombinedUploadForm(initial={'manga_selection': initial_manga} if initial_manga else None)
 
+    ingest_job = None
+    if request.GET.get('job'):
+        try:
+            ingest_job = ChapterIngestJob.objects.filter(pk=request.GET['job']).first()
+        except ValidationError:
+            ingest_job = None
+
     context_data = {
         'form': form,
         'page_title': page_title,
         'header_title': page_title,
         'header_icon': header_icon,
-        'selected_manga_from_url': initial_manga
+        'selected_manga_from_url': initial_manga,
+        'ingest_job': ingest_job,
     }
     return render(request, 'manga/admin/combined_upload_form.html', context_data)
 
@@ -118,6 +121,7 @@ def folder_upload_view(request):
 
     context_data = {
         'all_manga_pages': all_mangas_for_select,
+        'encoder_profile_choices': ENCODER_PROFILE_CHOICES,
         'selected_manga_from_url': initial_manga,
         'page_title': page_title,
         'header_title': page_title,
@@ -129,7 +133,6 @@ def folder_upload_view(request):
 
 @permission_required('wagtailadmin.access_admin', login_url='wagtailadmin_login')
 @require_POST
-@transaction.atomic
 def process_chapter_folder_api(request):
     try:
         manga_id = request.POST.get('manga_id')
@@ -142,109 +145,47 @@ def process_chapter_folder_api(request):
 
         manga_page = MangaPage.objects.get(pk=manga_id)
 
-        existing_chapter = MangaChapterPage.objects.child_of(manga_page).filter(chapter_number=chapter_number).first()
-        if existing_chapter:
-            chapter_page = existing_chapter
-            # Só apaga a thumb se uma NOVA for enviada.
-            if thumbnail_file and chapter_page.thumbnail:
-                chapter_page.thumbnail.delete(save=False)
-
-            for image_instance in chapter_page.chapter_images.all():
-                if hasattr(image_instance, 'encrypted_file') and image_instance.encrypted_file:
-                    try:
-                        os.remove(image_instance.encrypted_file.path)
-                    except (FileNotFoundError, AttributeError):
-                        pass
-            chapter_page.chapter_images.all().delete()
-        else:
-            chapter_page = MangaChapterPage(
-                title=f"{manga_page.title} - Capítulo {chapter_number}",
-                chapter_number=chapter_number,
-                owner=request.user
-            )
-            manga_page.add_child(instance=chapter_page)
-
-        save_params = {'format': 'AVIF', 'quality': 55, 'subsampling': '4:2:0', 'speed': 9}
-        
-        # A lógica para a thumb agora está aqui.
-        if thumbnail_file:
-            try:
-                thumb_img = PillowImage.open(thumbnail_file).convert("RGB")
-                buffer = io.BytesIO()
-                thumb_img.save(buffer, **save_params) 
-
-                original_thumb_name = Path(thumbnail_file.name)
-                new_thumb_filename = original_thumb_name.with_suffix('.avif').name
-                
-                chapter_page.thumbnail.save(
-                    new_thumb_filename,
-                    ContentFile(buffer.getvalue()),
-                    save=False # Salva no final
-                )
-            except Exception as e:
-                logger.error(f"Erro ao converter a thumbnail para AVIF: {e}")
-                chapter_page.thumbnail = thumbnail_file
-        
-        # Salva o capítulo aqui para ter um PK antes de criar as imagens
-        chapter_page.last_published_at = timezone.now()
-        chapter_page.save_revision().publish()
-
-        images_to_create = []
-        slice_height = getattr(settings, 'ALTURA_FATIA', 1600)
-        
-        final_image_index = 0
-        for uploaded_file in sorted(files, key=lambda f: f.name):
-            # ... (Sua lógica original de processar e fatiar imagens continua aqui, sem alterações)
-            try:
-                img = PillowImage.open(uploaded_file)
-                width, height = img.size
-                
-                if height > slice_height:
-                    for y in range(0, height, slice_height):
-                        box = (0, y, width, min(y + slice_height, height))
-                        slice_img = img.crop(box).convert("RGB")
-                        
-                        buffer = io.BytesIO()
-                        slice_img.save(buffer, **save_params)
-                        
-                        avif_filename = f"{final_image_index:03d}.avif"
-                        
-                        images_to_create.append(ChapterImage(
-                            page=chapter_page,
-                            encrypted_file=ContentFile(buffer.getvalue(), name=avif_filename),
-                            original_filename=f"{uploaded_file.name} (slice {final_image_index})",
-                            sort_order=final_image_index
-                        ))
-                        final_image_index += 1
-                else:
-                    buffer = io.BytesIO()
-                    img.convert("RGB").save(buffer, **save_params)
-                    
-                    original_stem = Path(uploaded_file.name).stem
-                    avif_filename = f"{final_image_index:03d}_{original_stem}.avif"
-
-                    images_to_create.append(ChapterImage(
-                        page=chapter_page,
-                        encrypted_file=ContentFile(buffer.getvalue(), name=avif_filename),
-                        original_filename=uploaded_file.name,
-                        sort_order=final_image_index
-                    ))
-                    final_image_index += 1
-
-            except Exception as e:
-                logger.error(f"Erro ao processar a imagem {uploaded_file.name}: {e}")
-                continue
-
-        ChapterImage.objects.bulk_create(images_to_create)
+        # Só guarda os arquivos e enfileira; a codificação roda no worker de ingestão.
+        job = enqueue_ingest_job(
+            manga_page, request.user, IngestJobKind.FOLDER, files, chapter_number=chapter_number,
+            thumbnail=thumbnail_file, encoder_profile=request.POST.get('encoder_profile', ''),
+        )
 
         return JsonResponse({
-            'status': 'success',
-            'message': f'Capítulo {chapter_number} processado com {len(images_to_create)} imagens finais.',
-            'chapter_url': chapter_page.get_url()
-        })
+            'status': 'queued',
+            'message': f'Capítulo {chapter_number} enviado; processando em segundo plano.',
+            'job_id': str(job.pk),
+            'progress_url': reverse('manga:api_ingest_job_progress', args=[job.pk]),
+        }, status=202)
 
     except MangaPage.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Obra não encontrada.'}, status=404)
     except Exception as e:
         logger.exception("Erro inesperado no processamento do capítulo via API.")
-        return JsonResponse({'status': 'error', 'message': f'Erro no servidor: {e}'}, status=500)
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': f'Erro no servidor: {e}'}, status=500)
+@permission_required('wagtailadmin.access_admin', login_url='wagtailadmin_login')
+def slice_cache_stats_api(request):
+    """Contadores do cache de fatias descriptografadas deste worker (cada processo tem o seu)."""
+    stats = decrypted_slice_cache.stats()
+    stats['pid'] = os.getpid()
+    return JsonResponse(stats)
+
+@permission_required('wagtailadmin.access_admin', login_url='wagtailadmin_login')
+def ingest_job_progress_api(request, job_id):
+    job = get_object_or_404(ChapterIngestJob, pk=job_id)
+    return JsonResponse(job.as_progress_dict())
+
+@permission_required('wagtailadmin.access_admin', login_url='wagtailadmin_login')
+def reader_stats_api(request, page_id):
+    """Leitores únicos estimados de uma obra (união dos capítulos) ou de um capítulo: 7 e 30 dias e por semana."""
+    page = get_object_or_404(Page, pk=page_id)
+    scope = {'work': page} if ReaderSketch.objects.filter(work=page).exists() else {'page': page}
+    today = timezone.localdate()
+    return JsonResponse({
+        'page_id': page.pk,
+        'title': page.title,
+        'scope': next(iter(scope)),
+        'unique_readers_7d': ReaderSketch.estimate(start=today - timedelta(days=6), **scope),
+        'unique_readers_30d': ReaderSketch.estimate(start=today - timedelta(days=29), **scope),
+        'weekly': [{'week_start': start.isoformat(), 'unique_readers': readers} for start, readers in ReaderSketch.weekly(**scope)],
+    })
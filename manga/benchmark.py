@@ -0,0 +1,130 @@
+"""
+Benchmark do pipeline de fatiamento/codificação das fatias (o mesmo motor de process_manga_zip).
+
+Gera tiras sintéticas no estilo webtoon dentro de um ZIP e mede, para cada combinação de
+parâmetros, fatias/s, segundos de CPU (processo principal + pool), pico de RSS e bytes de
+saída por página. Usado pelo comando `benchmark_ingest` e pelos benchmarks pytest-benchmark de
+`manga/tests/bench_ingest.py`.
+"""
+import os
+import random
+import resource
+import time
+import zipfile
+from collections import namedtuple
+from multiprocessing import get_context
+
+from PIL import Image as PillowImage
+from PIL import ImageDraw
+
+from .ingest import SourceRef, encode_images
+
+BenchCase = namedtuple('BenchCase', ['slice_height', 'speed', 'quality', 'workers', 'image_format'])
+
+
+def make_strip(width, height, seed=0):
+    """Tira sintética: fundos em degradê, quadros com ruído (arte) e balões brancos com 'texto'."""
+    rng = random.Random(seed)
+    strip = PillowImage.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(strip)
+    y = rng.randint(0, 200)
+    while y < height:
+        panel_height = rng.randint(height // 12 or 1, height // 4 or 1)
+        box = (rng.randint(0, width // 10), y, width - rng.randint(0, width // 10), min(y + panel_height, height))
+        if box[2] > box[0] and box[3] > box[1]:
+            noise = PillowImage.effect_noise((box[2] - box[0], box[3] - box[1]), rng.randint(20, 90)).convert('RGB')
+            tint = PillowImage.new('RGB', noise.size, tuple(rng.randint(0, 255) for _ in range(3)))
+            strip.paste(PillowImage.blend(noise, tint, 0.5), box[:2])
+            for _ in range(rng.randint(0, 2)):
+                bx, by = rng.randint(box[0], max(box[0], box[2] - 200)), rng.randint(box[1], max(box[1], box[3] - 80))
+                draw.ellipse((bx, by, bx + 200, by + 80), fill='white', outline='black', width=3)
+                for line in range(3):
+                    draw.line((bx + 30, by + 22 + line * 15, bx + 170, by + 22 + line * 15), fill='black', width=4)
+        y = box[3] + rng.randint(40, 400)
+    return strip
+
+
+def build_strip_zip(path, pages, width, height, image_format='PNG', seed=0):
+    """Grava `pages` tiras no ZIP `path` (como um envio de capítulo) e retorna os nomes dos membros."""
+    extension = 'jpg' if image_format.upper() == 'JPEG' else image_format.lower()
+    members = []
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as zip_fp:
+        for index in range(pages):
+            name = f"1/{index:03d}.{extension}"
+            with zip_fp.open(name, 'w') as member_fp:
+                make_strip(width, height, seed + index).save(member_fp, format=image_format, quality=90)
+            members.append(name)
+    return members
+
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_mb():
+    # ru_maxrss vem em KiB no Linux; para os filhos é o maior pico entre os processos já encerrados.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / 1024, 1), round(children / 1024, 1)
+
+
+def run_case(zip_path, members, case, variant_widths=()):
+    """Executa um caso no processo atual e retorna as métricas."""
+    save_params = {'format': case.image_format, 'quality': case.quality, 'subsampling': '4:2:0', 'speed': case.speed}
+    totals = {'slice_bytes': 0, 'variant_bytes': 0}
+
+    def count_bytes(image):
+        for part in image.parts:
+            totals['slice_bytes'] += len(part.data)
+            totals['variant_bytes'] += sum(len(variant.data) for variant in part.variants)
+
+    cpu_started = _cpu_seconds()
+    started = time.perf_counter()
+    report = encode_images(
+        (SourceRef(os.path.basename(name), path=zip_path, member=name) for name in members),
+        save_params=save_params, slice_height=case.slice_height, max_workers=case.workers,
+        on_image=count_bytes, variant_widths=variant_widths,
+    )
+    wall = time.perf_counter() - started
+    cpu = _cpu_seconds() - cpu_started
+    peak_main, peak_workers = _peak_rss_mb()
+    pages = report.image_count or 1
+    return {
+        **case._asdict(),
+        'pages': report.image_count,
+        'slices': report.slice_count,
+        'errors': len(report.errors),
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        'slices_per_second': round(report.slice_count / wall, 3) if wall else None,
+        'peak_rss_mb': peak_main,
+        'peak_worker_rss_mb': peak_workers if case.workers > 1 else None,
+        'bytes_per_page': round(totals['slice_bytes'] / pages),
+        'variant_bytes_per_page': round(totals['variant_bytes'] / pages),
+    }
+
+
+def _run_in_child(conn, zip_path, members, case, variant_widths):
+    try:
+        conn.send(run_case(zip_path, members, case, variant_widths))
+    except Exception as e:
+        conn.send({**case._asdict(), 'error': str(e)})
+    finally:
+        conn.close()
+
+
+def run_case_isolated(zip_path, members, case, variant_widths=()):
+    """Executa o caso num processo próprio (fork), para que CPU e pico de RSS não se misturem entre casos."""
+    context = get_context('fork')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_run_in_child, args=(child_conn, zip_path, members, case, variant_widths))
+    process.start()
+    child_conn.close()
+    try:
+        return parent_conn.recv()
+    except EOFError:
+        return {**case._asdict(), 'error': f"processo do benchmark terminou com código {process.exitcode}"}
+    finally:
+        process.join()
@@ -0,0 +1,159 @@
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+
+from .slice_crypto import MAGIC, ChunkedSliceReader, is_chunked
+
+SLICE_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def get_delivery_backend():
+    """'accel' (nginx X-Accel-Redirect), 'sendfile' (X-Sendfile do Apache/lighttpd) ou 'python' (FileResponse)."""
+    return getattr(settings, 'SLICE_DELIVERY_BACKEND', 'python')
+
+
+def slice_etag(content_hash, stat_result):
+    if content_hash:
+        return f'"{content_hash}"'
+    return f'"{stat_result.st_size:x}-{int(stat_result.st_mtime):x}"'
+
+
+def _cache_headers(response, etag, last_modified, public):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = f"{'public' if public else 'private'}, max-age={SLICE_CACHE_MAX_AGE}, immutable"
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def parse_range(header, size):
+    """Intervalo único 'bytes=a-b' como (início, fim) inclusivos; None se ausente/inválido, False se não satisfazível."""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _iter_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_slice_file(request, field_file, content_hash='', content_type='image/avif', public=True):
+    """
+    Entrega uma fatia já autorizada sem copiar os bytes pelo worker sempre que possível:
+    304 para If-None-Match/If-Modified-Since válidos, X-Accel-Redirect/X-Sendfile quando
+    configurados e, no modo python, FileResponse em streaming com suporte a Range.
+    """
+    path = field_file.path
+    stat_result = os.stat(path)
+    etag = slice_etag(content_hash, stat_result)
+    last_modified = int(stat_result.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _cache_headers(not_modified, etag, last_modified, public)
+
+    backend = get_delivery_backend()
+    if backend == 'accel':
+        prefix = getattr(settings, 'SLICE_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name.replace('\\', '/'))
+        return _cache_headers(response, etag, last_modified, public)
+    if backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return _cache_headers(response, etag, last_modified, public)
+
+    return _ranged_response(
+        request, stat_result.st_size, etag, last_modified, public, content_type,
+        lambda start, end: _iter_file_range(path, start, end - start + 1),
+        full_response=lambda: FileResponse(open(path, 'rb'), content_type=content_type),
+    )
+
+
+def _ranged_response(request, size, etag, last_modified, public, content_type, iter_range, full_response=None):
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if request.headers.get('Range') and (not if_range or etag in parse_etags(if_range)):
+        byte_range = parse_range(request.headers['Range'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _cache_headers(response, etag, last_modified, public)
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_range(start, end), status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return _cache_headers(response, etag, last_modified, public)
+
+    if full_response is not None:
+        response = full_response()
+    else:
+        response = StreamingHttpResponse(iter_range(0, size - 1), content_type=content_type)
+        response['Content-Length'] = str(size)
+    return _cache_headers(response, etag, last_modified, public)
+
+
+def _iter_chunked_range(path, start, end):
+    with open(path, 'rb') as f:
+        yield from ChunkedSliceReader(f).iter_range(start, end)
+
+
+def serve_decrypted_slice(request, slice_obj, content_type='image/webp', public=True):
+    """
+    Entrega uma fatia criptografada (.enc) já autorizada. No formato em blocos AES-GCM o
+    conteúdo é decifrado e enviado bloco a bloco (um Range decifra só os blocos necessários);
+    tokens Fernet antigos são decifrados inteiros, passando pelo cache de fatias.
+    """
+    path = slice_obj.encrypted_file.path
+    stat_result = os.stat(path)
+    etag = slice_etag(slice_obj.content_hash, stat_result)
+    last_modified = int(stat_result.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _cache_headers(not_modified, etag, last_modified, public)
+
+    with open(path, 'rb') as f:
+        chunked = is_chunked(f.read(len(MAGIC)))
+        size = ChunkedSliceReader(f).size if chunked else None
+    if chunked:
+        return _ranged_response(
+            request, size, etag, last_modified, public, content_type,
+            lambda start, end: _iter_chunked_range(path, start, end),
+        )
+
+    data = slice_obj.decrypt_and_get_data()
+    if data is None:
+        return None
+    return _ranged_response(
+        request, len(data), etag, last_modified, public, content_type,
+        lambda start, end: [data[start:end + 1]],
+        full_response=lambda: HttpResponse(data, content_type=content_type),
+    )
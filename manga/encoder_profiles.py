@@ -0,0 +1,133 @@
+"""
+Perfis de codificação AVIF das fatias.
+
+Os perfis fixos só definem `speed`/`quality`. O perfil adaptativo mede a complexidade de cada
+fatia com uma passada rápida em numpy (bordas, cor e proporção de fundo liso) e escolhe
+speed/quality para caber na meta de tempo de codificação e de bytes por megapixel. Os processos
+do pool devolvem o tempo e o tamanho reais de cada fatia e o processo principal recalibra o modelo
+de custo; cada nova tarefa leva a calibração atual, que vale para todas as ingestões do processo.
+"""
+import threading
+
+from django.conf import settings
+
+from core.choices import ADAPTIVE_PROFILE, DEFAULT_ENCODER_PROFILE, ENCODER_PROFILE_CHOICES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ENCODER_PROFILES = {
+    'rapido': {'speed': 9, 'quality': 50},
+    'equilibrado': {'speed': 7, 'quality': 55},
+    'qualidade': {'speed': 5, 'quality': 65},
+}
+BASE_SAVE_PARAMS = {'format': 'AVIF', 'subsampling': '4:2:0'}
+# Chaves que descrevem o perfil e não vão para o PIL.
+PROFILE_KEYS = ('profile', 'adaptive')
+
+# Custo relativo (segundos por megapixel numa fatia de complexidade média) de cada speed do libavif.
+SPEED_COST = {4: 2.4, 5: 1.6, 6: 1.1, 7: 0.7, 8: 0.45, 9: 0.3, 10: 0.2}
+QUALITY_STEPS = (40, 45, 50, 55, 60, 65, 70)
+BYTES_PER_MP_AT_Q55 = 260_000
+
+_calibration = {'seconds': 1.0, 'bytes': 1.0}
+_calibration_lock = threading.Lock()
+
+
+def get_profile_names():
+    return [name for name, _label in ENCODER_PROFILE_CHOICES]
+
+
+def get_default_profile():
+    """Perfil definido nas configurações globais do site; o padrão se não houver configuração."""
+    try:
+        from core.models import GlobalSettings
+
+        global_settings = GlobalSettings.objects.first()
+    except Exception:
+        global_settings = None
+    return getattr(global_settings, 'slice_encoder_profile', '') or DEFAULT_ENCODER_PROFILE
+
+
+def get_save_params(profile=None):
+    """Parâmetros de `encode_images` para o perfil `profile` (vazio: o perfil global)."""
+    profile = profile if profile in get_profile_names() else get_default_profile()
+    if profile == ADAPTIVE_PROFILE:
+        return {
+            **BASE_SAVE_PARAMS,
+            'profile': profile,
+            'adaptive': {
+                'seconds_per_mp': getattr(settings, 'SLICE_ADAPTIVE_SECONDS_PER_MP', 0.8),
+                'bytes_per_mp': getattr(settings, 'SLICE_ADAPTIVE_BYTES_PER_MP', 250_000),
+            },
+        }
+    overrides = getattr(settings, 'SLICE_ENCODER_PROFILES', {}).get(profile, {})
+    return {**BASE_SAVE_PARAMS, **ENCODER_PROFILES[profile], **overrides, 'profile': profile}
+
+
+def measure_complexity(image):
+    """Complexidade de 0 (fundo liso, diálogo em branco) a 1 (arte colorida cheia de detalhes)."""
+    if numpy is None:
+        return 0.5
+    sample = image.reduce(2) if min(image.size) >= 64 else image
+    pixels = numpy.asarray(sample.convert('RGB'), dtype=numpy.float32) / 255.0
+    gray = pixels.mean(axis=2)
+    edges = numpy.abs(numpy.diff(gray, axis=0)).mean() + numpy.abs(numpy.diff(gray, axis=1)).mean()
+    chroma = pixels.std(axis=2).mean()
+    flat = ((gray > 0.94) | (gray < 0.06)).mean()
+    score = min(edges * 6.0, 1.0) * 0.6 + min(chroma * 4.0, 1.0) * 0.4
+    return float(max(0.0, min(score * (1.0 - 0.5 * flat), 1.0)))
+
+
+def calibrated(save_params):
+    """Cópia de `save_params` com a calibração atual deste processo, para as tarefas do pool."""
+    adaptive = save_params.get('adaptive')
+    if not adaptive:
+        return save_params
+    with _calibration_lock:
+        factors = dict(_calibration)
+    return {**save_params, 'adaptive': {**adaptive, 'calibration': factors}}
+
+
+def choose_params(save_params, image):
+    """
+    Parâmetros para o PIL codificar `image` e o rótulo do perfil gravado na fatia.
+    Retorna (params, rótulo, complexidade); a complexidade só é medida no perfil adaptativo.
+    """
+    params = {key: value for key, value in save_params.items() if key not in PROFILE_KEYS}
+    adaptive = save_params.get('adaptive')
+    complexity = None
+    if adaptive:
+        complexity = measure_complexity(image)
+        factors = adaptive.get('calibration')
+        if factors is None:
+            with _calibration_lock:
+                factors = dict(_calibration)
+        seconds_factor, bytes_factor = factors['seconds'], factors['bytes']
+        fitting_speeds = [speed for speed in sorted(SPEED_COST) if SPEED_COST[speed] * (0.3 + complexity) * seconds_factor <= adaptive['seconds_per_mp']]
+        params['speed'] = fitting_speeds[0] if fitting_speeds else max(SPEED_COST)
+        fitting_qualities = [quality for quality in QUALITY_STEPS if _predicted_bytes_per_mp(quality, complexity) * bytes_factor <= adaptive['bytes_per_mp']]
+        params['quality'] = fitting_qualities[-1] if fitting_qualities else QUALITY_STEPS[0]
+    label = f"s{params.get('speed', '')}q{params.get('quality', '')}"
+    if save_params.get('profile'):
+        label = f"{save_params['profile']}:{label}"
+    return params, label, complexity
+
+
+def _predicted_bytes_per_mp(quality, complexity):
+    return BYTES_PER_MP_AT_Q55 * (0.1 + complexity) * 2 ** ((quality - 55) / 10)
+
+
+def record_result(params, complexity, megapixels, seconds, byte_size):
+    """Ajusta a calibração do perfil adaptativo com o custo real da fatia (média móvel exponencial); roda no processo principal."""
+    if complexity is None or megapixels <= 0:
+        return
+    predicted_seconds = SPEED_COST.get(params.get('speed'), 1.0) * (0.3 + complexity) * megapixels
+    predicted_bytes = _predicted_bytes_per_mp(params.get('quality', 55), complexity) * megapixels
+    with _calibration_lock:
+        if predicted_seconds > 0 and seconds > 0:
+            _calibration['seconds'] = 0.8 * _calibration['seconds'] + 0.2 * (seconds / predicted_seconds)
+        if predicted_bytes > 0 and byte_size > 0:
+            _calibration['bytes'] = 0.8 * _calibration['bytes'] + 0.2 * (byte_size / predicted_bytes)
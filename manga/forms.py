@@ -6,6 +6,7 @@ import zipfile
 import logging
 
 # Importe os modelos necessários
+from .encoder_profiles import ENCODER_PROFILE_CHOICES
 from .models import MangaPage, MangaComment # Certifique-se que MangaComment está importado
 
 logger = logging.getLogger(__name__)
@@ -27,6 +28,13 @@ class CombinedUploadForm(forms.Form):
         )
     )
 
+    encoder_profile = forms.ChoiceField(
+        label=_("Perfil de Codificação"),
+        choices=[('', _("Padrão das configurações globais"))] + ENCODER_PROFILE_CHOICES,
+        required=False,
+        help_text=_("Rápido para lotes grandes, Qualidade para capítulos especiais, Adaptativo para ajustar por fatia.")
+    )
+
     def clean_zip_file(self):
         zip_file = self.cleaned_data.get('zip_file')
         if not zip_file:
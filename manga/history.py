@@ -0,0 +1,106 @@
+import atexit
+import logging
+
+from django.utils import timezone
+
+from core.counters import BufferedWriter
+
+logger = logging.getLogger(__name__)
+
+
+class ReadingHistoryQueue(BufferedWriter):
+    """
+    Fila em memória das leituras (usuário, capítulo, obra, horário). Leituras repetidas do mesmo
+    capítulo dentro da janela viram uma só, e cada flush grava tudo num único upsert
+    (`bulk_create(update_conflicts=True)`), tirando a escrita do histórico da resposta do leitor.
+    Configurável por READING_HISTORY_BUFFERED / _FLUSH_SECONDS / _FLUSH_EVENTS.
+    """
+    thread_name = 'reading-history-flush'
+    setting_prefix = 'READING_HISTORY'
+    default_flush_seconds = 10
+    default_flush_events = 500
+
+    def __init__(self):
+        super().__init__()
+        self._pending = {}
+
+    def record(self, user, chapter, manga=None, read_at=None):
+        """`manga` (obra do capítulo) é opcional; sem ela, a obra é resolvida no flush pelo caminho da árvore."""
+        entry = (read_at or timezone.now(), getattr(manga, 'pk', manga))
+        key = (getattr(user, 'pk', user), getattr(chapter, 'pk', chapter))
+        if not self.enabled:
+            self._write({key: entry})
+            return
+        with self._lock:
+            self._keep_latest(key, entry)
+            due = self._note_event()
+        self._after_event(due)
+
+    def pending_chapter_ids(self, user):
+        """Capítulos lidos pelo usuário que ainda estão na fila deste processo."""
+        user_id = getattr(user, 'pk', user)
+        with self._lock:
+            return {chapter_id for pending_user_id, chapter_id in self._pending if pending_user_id == user_id}
+
+    def pending_reads(self, user):
+        """[(capítulo, obra, lido em)] do usuário ainda na fila deste processo; a obra pode ser None."""
+        user_id = getattr(user, 'pk', user)
+        with self._lock:
+            return [
+                (chapter_id, manga_id, read_at)
+                for (pending_user_id, chapter_id), (read_at, manga_id) in self._pending.items()
+                if pending_user_id == user_id
+            ]
+
+    def flush(self):
+        """Grava as leituras pendentes; retorna quantas linhas foram enviadas no upsert."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._reset_events()
+            if not pending:
+                return 0
+            try:
+                return self._write(pending)
+            except Exception as e:
+                logger.error(f"Histórico de leitura: falha ao gravar {len(pending)} leituras: {e}")
+                with self._lock:
+                    for key, entry in pending.items():
+                        self._keep_latest(key, entry)
+                return 0
+
+    def _keep_latest(self, key, entry):
+        current = self._pending.get(key)
+        if current is None or current[0] < entry[0]:
+            self._pending[key] = (entry[0], entry[1] or (current[1] if current else None))
+
+    def _write(self, pending):
+        from django.contrib.auth import get_user_model
+
+        from .models import MangaChapterPage, MangaPage, ReadingHistory
+
+        # Capítulo ou usuário apagado enquanto a leitura estava na fila: descarta, senão o lote inteiro falha.
+        chapter_paths = dict(MangaChapterPage.objects.filter(pk__in={chapter_id for _user_id, chapter_id in pending}).values_list('pk', 'path'))
+        user_ids = set(get_user_model().objects.filter(pk__in={user_id for user_id, _chapter_id in pending}).values_list('pk', flat=True))
+        missing_parent_paths = {
+            chapter_paths[chapter_id][:-MangaChapterPage.steplen]
+            for (_user_id, chapter_id), (_read_at, manga_id) in pending.items()
+            if manga_id is None and chapter_id in chapter_paths
+        }
+        manga_by_path = dict(MangaPage.objects.filter(path__in=missing_parent_paths).values_list('path', 'pk')) if missing_parent_paths else {}
+        rows = [
+            ReadingHistory(
+                user_id=user_id, chapter_id=chapter_id, read_at=read_at,
+                manga_id=manga_id or manga_by_path.get(chapter_paths[chapter_id][:-MangaChapterPage.steplen]),
+            )
+            for (user_id, chapter_id), (read_at, manga_id) in pending.items()
+            if user_id in user_ids and chapter_id in chapter_paths
+        ]
+        ReadingHistory.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['user', 'chapter'], update_fields=['read_at', 'manga'],
+        )
+        return len(rows)
+
+
+reading_history = ReadingHistoryQueue()
+atexit.register(reading_history.flush)
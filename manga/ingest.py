@@ -0,0 +1,462 @@
+"""
+Motor de ingestão das fatias dos capítulos.
+
+Cada imagem de origem é decodificada e convertida para RGB uma única vez num processo
+do pool, recortada em fatias de ALTURA_FATIA e cada fatia é codificada em AVIF. O
+resultado volta na ordem de envio, então a numeração das fatias é determinística.
+Cada fatia também ganha versões reduzidas (SLICE_VARIANT_WIDTHS) para o srcset do leitor.
+As fatias são gravadas endereçadas pelo conteúdo (SliceBlob), uma vez só mesmo quando se
+repetem entre capítulos; origens já vistas nem chegam a ser codificadas de novo.
+"""
+import hashlib
+import logging
+import os
+import time
+import zipfile
+import zlib
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image as PillowImage
+
+try:
+    import pillow_avif
+except ImportError:
+    pillow_avif = None
+
+from .encoder_profiles import calibrated, choose_params, record_result
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 256 * 1024
+DEFAULT_SAVE_PARAMS = {'format': 'AVIF', 'quality': 55, 'subsampling': '4:2:0', 'speed': 7}
+
+EncodedVariant = namedtuple('EncodedVariant', ['data', 'width', 'height'])
+# `blob` preenchido quando a fatia já existe no storage (origem repetida); nesse caso `data` é None.
+# `profile` é o rótulo do perfil de codificação usado (ex.: 'adaptativo:s8q60').
+EncodedPart = namedtuple('EncodedPart', ['data', 'width', 'height', 'variants', 'blob', 'profile'], defaults=((), None, ''))
+# `source_key`: hash da origem (ver `source_digest`); `source_size`: tamanho em bytes da origem, usado para
+# só calcular o hash no processo principal quando já existe uma origem gravada com o mesmo tamanho.
+EncodedImage = namedtuple('EncodedImage', ['original_filename', 'parts', 'source_key', 'source_size'], defaults=(None, None))
+# `samples`: (params, complexidade, megapixels, segundos, bytes) de cada fatia do perfil adaptativo,
+# devolvidos ao processo principal para recalibrar o modelo de custo (ver `encoder_profiles.record_result`).
+ImageTiming = namedtuple('ImageTiming', ['original_filename', 'decode_seconds', 'encode_seconds', 'slices', 'samples'], defaults=((),))
+# Referência leve a uma imagem de origem: um arquivo em disco (`path`), um membro de um ZIP
+# em disco (`path` + `member`) ou, em último caso, os próprios bytes (`data`). Os processos
+# do pool abrem a origem sozinhos, então o processo principal não carrega as imagens.
+# `size` (opcional) evita abrir o ZIP de novo só para saber o tamanho do membro.
+SourceRef = namedtuple('SourceRef', ['original_filename', 'path', 'member', 'data', 'size'], defaults=(None, None, None, None))
+
+
+class EncodeReport:
+    def __init__(self):
+        self.images = []
+        self.timings = []
+        self.errors = []
+        self.image_count = 0
+        self.slice_count = 0
+        self.wall_seconds = 0.0
+        self.reused_count = 0
+
+    def summary(self):
+        return {
+            'images': self.image_count,
+            'slices': self.slice_count,
+            'errors': len(self.errors),
+            'reused': self.reused_count,
+            'wall_seconds': round(self.wall_seconds, 3),
+            'cpu_seconds': round(sum(t.decode_seconds + t.encode_seconds for t in self.timings), 3),
+            'per_image': [
+                {'file': t.original_filename, 'decode_seconds': round(t.decode_seconds, 3), 'encode_seconds': round(t.encode_seconds, 3), 'slices': t.slices}
+                for t in self.timings
+            ],
+        }
+
+
+def get_encode_workers():
+    return getattr(settings, 'INGEST_ENCODE_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_max_in_flight(max_workers):
+    """Teto de imagens abertas ao mesmo tempo (decodificando ou aguardando gravação); limita o pico de memória."""
+    return max(getattr(settings, 'INGEST_MAX_IN_FLIGHT', None) or max_workers * 2, 1)
+
+
+def get_variant_widths():
+    return tuple(sorted(set(getattr(settings, 'SLICE_VARIANT_WIDTHS', (720, 1080)) or ())))
+
+
+def encode_variants(image, widths, save_params):
+    """Versões reduzidas de `image` para cada largura menor que a original (nunca amplia)."""
+    width, height = image.size
+    variants = []
+    for target_width in widths:
+        if target_width >= width:
+            continue
+        target_height = max(round(height * target_width / width), 1)
+        resized = image.resize((target_width, target_height), PillowImage.Resampling.LANCZOS, reducing_gap=3.0)
+        buffer = BytesIO()
+        resized.save(buffer, **save_params)
+        variants.append(EncodedVariant(buffer.getvalue(), target_width, target_height))
+    return tuple(variants)
+
+
+def encode_file_variants(paths, widths, save_params):
+    """Executado no processo do pool: versões reduzidas de fatias já gravadas, na ordem de `paths`."""
+    results = []
+    for path in paths:
+        with PillowImage.open(path) as img:
+            rgb = img.convert('RGB')
+            results.append(encode_variants(rgb, widths, choose_params(save_params, rgb)[0]))
+    return results
+
+
+def slice_boxes(width, height, slice_height):
+    if height <= slice_height:
+        return [(0, 0, width, height)]
+    return [(0, y, width, min(y + slice_height, height)) for y in range(0, height, slice_height)]
+
+
+@contextmanager
+def open_source(source):
+    if source.data is not None:
+        yield BytesIO(source.data)
+    elif source.member is not None:
+        with zipfile.ZipFile(source.path) as zip_fp, zip_fp.open(source.member) as member_fp:
+            yield member_fp
+    else:
+        with open(source.path, 'rb') as fp:
+            yield fp
+
+
+def source_size(source):
+    """Tamanho em bytes da origem, sem lê-la (no ZIP, vem do diretório central)."""
+    if source.size is not None:
+        return source.size
+    if source.data is not None:
+        return len(source.data)
+    if source.member is not None:
+        with zipfile.ZipFile(source.path) as zip_fp:
+            return zip_fp.getinfo(source.member).file_size
+    return os.path.getsize(source.path)
+
+
+def source_key_params(slice_height, save_params, variant_widths):
+    """Parte do hash da origem que vem dos parâmetros que mudam o resultado da codificação."""
+    return repr((slice_height, sorted(save_params.items()), tuple(variant_widths))).encode()
+
+
+def encode_source_image(source, slice_height, save_params, variant_widths=(), key_params=None):
+    """
+    Executado no processo do pool: decodifica, converte uma vez e codifica cada fatia e suas versões reduzidas.
+    Com `key_params`, também calcula o hash da origem (`source_key`) sobre os bytes lidos para decodificar.
+    """
+    started = time.perf_counter()
+    source_key = None
+    if key_params is not None:
+        with open_source(source) as fp:
+            data = fp.read()
+        source_key = hashlib.sha256(key_params + data).hexdigest()
+        source = source._replace(path=None, member=None, data=data)
+    with open_source(source) as fp, PillowImage.open(fp) as img:
+        if img.format == 'JPEG':
+            # Decodifica direto em RGB, sem a etapa intermediária em YCbCr/CMYK.
+            img.draft('RGB', img.size)
+        rgb = img.convert('RGB')
+    decoded = time.perf_counter()
+    width, height = rgb.size
+    parts = []
+    samples = []
+    for box in slice_boxes(width, height, slice_height):
+        part = rgb if box == (0, 0, width, height) else rgb.crop(box)
+        params, profile, complexity = choose_params(save_params, part)
+        part_started = time.perf_counter()
+        buffer = BytesIO()
+        part.save(buffer, **params)
+        data = buffer.getvalue()
+        if complexity is not None:
+            samples.append((params, complexity, part.width * part.height / 1_000_000, time.perf_counter() - part_started, len(data)))
+        parts.append(EncodedPart(data, box[2] - box[0], box[3] - box[1], encode_variants(part, variant_widths, params), profile=profile))
+    del rgb
+    finished = time.perf_counter()
+    return EncodedImage(source.original_filename, parts, source_key), ImageTiming(source.original_filename, decoded - started, finished - decoded, len(parts), tuple(samples))
+
+
+def encode_images(sources, save_params=None, slice_height=None, max_workers=None, on_progress=None, on_image=None, max_in_flight=None, variant_widths=None, reuse=None, might_reuse=None):
+    """
+    Codifica as imagens `sources` (SourceRef, já na ordem do capítulo), consumindo o iterável
+    sob demanda: no máximo `max_in_flight` imagens ficam em andamento ao mesmo tempo.
+    Com `on_image`, cada imagem codificada é entregue na ordem e descartada em seguida;
+    sem ele, ficam acumuladas em `report.images`.
+    Imagens que falham são registradas em `report.errors` e puladas, como antes.
+    `on_progress(nome, fatias, erro)` é chamado no processo principal a cada imagem concluída.
+    `variant_widths` (padrão: SLICE_VARIANT_WIDTHS) define as versões reduzidas de cada fatia.
+    Com `reuse(source, source_key)`, a origem é identificada pelo hash dos bytes (e dos parâmetros
+    de codificação); se `reuse` devolver uma EncodedImage, a codificação é pulada. Com `might_reuse(tamanho)`,
+    o processo principal só lê e calcula o hash das origens cujo tamanho pode ter sido visto antes;
+    as demais vão direto para o pool, que calcula o hash junto com a decodificação.
+    """
+    save_params = save_params or DEFAULT_SAVE_PARAMS
+    variant_widths = get_variant_widths() if variant_widths is None else tuple(variant_widths)
+    slice_height = slice_height or getattr(settings, 'ALTURA_FATIA', 1600)
+    max_workers = max_workers or get_encode_workers()
+    max_in_flight = max_in_flight or get_max_in_flight(max_workers)
+    report = EncodeReport()
+    started = time.perf_counter()
+
+    key_params = source_key_params(slice_height, save_params, variant_widths)
+
+    def prepare(source, run):
+        source_key = size = None
+        if reuse:
+            try:
+                size = source_size(source)
+                image = None
+                if might_reuse is None or might_reuse(size):
+                    source_key = source_digest(source, slice_height, save_params, variant_widths)
+                    image = reuse(source, source_key)
+            except Exception as e:
+                logger.warning(f"Ingestão: não foi possível verificar repetição de {source.original_filename}: {e}")
+                image = None
+            if image is not None:
+                report.reused_count += 1
+                timing = ImageTiming(source.original_filename, 0.0, 0.0, len(image.parts))
+                return lambda: (image, timing)
+        # Origem nova: o hash (se ainda não calculado) sai do processo do pool, sobre os bytes que ele já lê.
+        result = run(key_params if reuse and source_key is None else None)
+
+        def outcome():
+            image, timing = result()
+            return image._replace(source_key=source_key or image.source_key, source_size=size), timing
+        return outcome
+
+    def collect(source, outcome):
+        try:
+            image, timing = outcome()
+        except Exception as e:
+            logger.error(f"Erro ao processar a imagem {source.original_filename}: {e}")
+            report.errors.append((source.original_filename, str(e)))
+            if on_progress:
+                on_progress(source.original_filename, 0, str(e))
+            return
+        report.image_count += 1
+        report.slice_count += len(image.parts)
+        report.timings.append(timing)
+        for sample in timing.samples:
+            record_result(*sample)
+        if on_image:
+            on_image(image)
+        else:
+            report.images.append(image)
+        if on_progress:
+            on_progress(source.original_filename, len(image.parts), None)
+
+    if max_workers <= 1:
+        for source in sources:
+            collect(source, prepare(source, lambda key: lambda: encode_source_image(source, slice_height, calibrated(save_params), variant_widths, key)))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()
+            for source in sources:
+                pending.append((source, prepare(source, lambda key: pool.submit(encode_source_image, source, slice_height, calibrated(save_params), variant_widths, key).result)))
+                if len(pending) >= max_in_flight:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+
+    report.wall_seconds = time.perf_counter() - started
+    logger.info(
+        f"Ingestão: {report.image_count} imagem(ns), {report.slice_count} fatia(s), {len(report.errors)} erro(s), "
+        f"{report.reused_count} repetida(s) em {report.wall_seconds:.2f}s com {max_workers} processo(s)"
+    )
+    for timing in report.timings:
+        logger.debug(
+            f"Ingestão: {timing.original_filename} decodificada em {timing.decode_seconds:.3f}s, "
+            f"{timing.slices} fatia(s) codificada(s) em {timing.encode_seconds:.3f}s"
+        )
+    return report
+
+
+def source_digest(source, slice_height, save_params, variant_widths):
+    """Hash da imagem de origem junto com os parâmetros que mudam o resultado da codificação."""
+    digest = hashlib.sha256(source_key_params(slice_height, save_params, variant_widths))
+    with open_source(source) as fp:
+        for chunk in iter(lambda: fp.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ChapterSliceWriter:
+    """
+    Recebe as imagens codificadas na ordem do capítulo e grava cada fatia direto no storage,
+    endereçada pelo conteúdo (SliceBlob): fatias repetidas entre capítulos são gravadas uma vez.
+    Guarda só a linha de ChapterImage (referência ao arquivo e metadados), sem os bytes.
+    """
+
+    def __init__(self, chapter_page, start_index=0):
+        self.chapter_page = chapter_page
+        self.index = start_index
+        self.rows = []
+        # Blobs reaproveitados (com referência já tomada) que ainda não viraram linha.
+        self.reserved = []
+
+    def reuse(self, source, source_key):
+        """Para `encode_images(reuse=...)`: monta a imagem a partir das fatias já gravadas desta origem."""
+        from .models import SliceBlob
+
+        blobs = SliceBlob.for_source(source_key)
+        if blobs is None:
+            return None
+        self.reserved.extend(blob.pk for blob in blobs)
+        parts = tuple(EncodedPart(None, blob.width, blob.height, blob=blob) for blob in blobs)
+        return EncodedImage(source.original_filename, parts, source_key)
+
+    def might_reuse(self, size):
+        """Para `encode_images(might_reuse=...)`: há alguma origem gravada com este tamanho?"""
+        from .models import SliceBlob
+
+        return SliceBlob.objects.filter(source_size=size).exists()
+
+    def __call__(self, image):
+        stem = Path(image.original_filename).stem
+        for part_index, part in enumerate(image.parts):
+            if len(image.parts) > 1:
+                original_filename = f"{image.original_filename} (fatia {self.index})"
+            else:
+                original_filename = image.original_filename
+            if part.blob is not None:
+                self.reserved.remove(part.blob.pk)
+            blob = part.blob or store_slice_blob(
+                part.data, part.width, part.height, part.variants,
+                source_hash=image.source_key or '', source_part=part_index, source_parts=len(image.parts),
+                source_size=image.source_size, encoder_profile=part.profile,
+            )
+            self.rows.append(self.write(blob, original_filename))
+            self.index += 1
+
+    def discard(self):
+        """Devolve as referências das fatias desta ingestão quando ela não chega ao commit."""
+        from .models import SliceBlob
+
+        release_slice_rows(self.rows)
+        for pk in self.reserved:
+            SliceBlob.release(pk)
+        self.rows, self.reserved = [], []
+
+    def write(self, blob, original_filename):
+        from .models import ChapterImage
+
+        return ChapterImage.from_blob(self.chapter_page, blob, original_filename, self.index)
+
+
+def variant_name(slice_name, width):
+    path = Path(slice_name)
+    return str(path.with_name(f"{path.stem}_w{width}{path.suffix}"))
+
+
+def store_slice_variants(slice_name, variants, shared=False):
+    """
+    Grava as versões reduzidas ao lado da fatia e retorna a lista guardada em `variants`.
+    Com `shared`, o nome é fixo (endereçado pelo conteúdo) e um arquivo já existente é reaproveitado.
+    """
+    stored = []
+    for variant in variants:
+        name = variant_name(slice_name, variant.width)
+        if not (shared and default_storage.exists(name)):
+            name = default_storage.save(name, ContentFile(variant.data))
+        stored.append({'width': variant.width, 'height': variant.height, 'name': name, 'byte_size': len(variant.data)})
+    return stored
+
+
+def store_slice_blob(data, width=None, height=None, variants=(), source_hash='', source_part=0, source_parts=0, encoder_profile='', source_size=None):
+    """
+    Grava a fatia codificada no caminho endereçado pelo hash do conteúdo, só se ainda não existir,
+    e retorna o SliceBlob correspondente já com uma referência tomada para a linha que vai apontar
+    para ele. Quem não chegar a gravar a linha devolve a referência (release_slice_rows).
+    """
+    from .models import SliceBlob, read_image_size, slice_blob_path
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    if width is None or height is None:
+        width, height = read_image_size(data)
+    name = slice_blob_path(content_hash)
+    # A linha fica travada enquanto o arquivo é conferido: um prune concorrente espera ou já terminou.
+    with transaction.atomic():
+        blob, created = SliceBlob.objects.select_for_update().get_or_create(content_hash=content_hash, defaults={
+            'file': name, 'width': width, 'height': height, 'byte_size': len(data),
+            'crc32': zlib.crc32(data) & 0xFFFFFFFF, 'ref_count': 1,
+            'source_hash': source_hash, 'source_part': source_part, 'source_parts': source_parts, 'source_size': source_size,
+            'encoder_profile': encoder_profile,
+        })
+        if not default_storage.exists(blob.file.name):
+            default_storage.save(blob.file.name, ContentFile(data))
+        updates = {}
+        if variants and not blob.variants:
+            updates['variants'] = store_slice_variants(blob.file.name, variants, shared=True)
+        if source_hash and not blob.source_hash:
+            updates.update(source_hash=source_hash, source_part=source_part, source_parts=source_parts, source_size=source_size)
+        if not created:
+            SliceBlob.acquire({blob.pk: 1})
+            blob.ref_count += 1
+        if updates:
+            SliceBlob.objects.filter(pk=blob.pk).update(**updates)
+            for field, value in updates.items():
+                setattr(blob, field, value)
+    return blob
+
+
+def release_slice_rows(rows):
+    """Devolve as referências de linhas que não chegaram a ser gravadas (ingestão que falhou)."""
+    from .models import SliceBlob
+
+    for row in rows:
+        if row.blob_id:
+            SliceBlob.release(row.blob_id)
+
+
+def commit_chapter_slices(chapter_page, rows, publish=False, user=None):
+    """
+    Troca as linhas do capítulo numa transação curta (publicando o capítulo na mesma transação,
+    se pedido); os arquivos já foram gravados pelo ChapterSliceWriter. As novas linhas já trazem
+    suas referências aos SliceBlob (tomadas ao criar/reaproveitar o blob), então um arquivo
+    presente nas duas versões nunca chega a zero quando as linhas antigas são apagadas. Arquivos
+    antigos não compartilhados são apagados após o commit.
+    """
+    from .models import ChapterImage
+
+    new_names = {row.encrypted_file.name for row in rows}
+    new_names.update(variant['name'] for row in rows for variant in row.variants)
+    with transaction.atomic():
+        old_names = [
+            name for image in chapter_page.chapter_images.only('encrypted_file', 'variants', 'blob')
+            for name in image.stored_names() if name not in new_names
+        ]
+        chapter_page.chapter_images.all().delete()
+        ChapterImage.objects.bulk_create(rows)
+        if publish:
+            chapter_page.last_published_at = timezone.now()
+            chapter_page.save_revision(user=user).publish()
+        transaction.on_commit(lambda: _delete_files(old_names))
+    return rows
+
+
+def _delete_files(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError as e:
+            logger.warning(f"Ingestão: não foi possível apagar a fatia antiga {name}: {e}")
+
+
+def stage_upload(upload_dir, uploaded_file, subdir=''):
+    """Guarda um arquivo enviado na pasta do job até o worker processá-lo. Retorna o caminho salvo."""
+    name = os.path.basename(uploaded_file.name)
+    return default_storage.save(os.path.join(upload_dir, subdir, name), uploaded_file)
@@ -0,0 +1,54 @@
+# manga/management/commands/backfill_slice_manifest.py
+import hashlib
+import zlib
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from manga.models import ChapterImage, read_image_size
+
+SLICE_MANIFEST_FIELDS = ['width', 'height', 'byte_size', 'content_hash', 'crc32']
+
+
+class Command(BaseCommand):
+    help = 'Preenche largura, altura, tamanho, hash e CRC-32 das fatias de capítulos enviadas antes do manifesto de fatias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Quantidade de fatias gravadas por lote.')
+        parser.add_argument('--all', action='store_true', help='Recalcula também as fatias que já possuem metadados.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = ChapterImage.objects.only('pk', 'encrypted_file').order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(Q(byte_size__isnull=True) | Q(crc32__isnull=True))
+
+        total = queryset.count()
+        self.stdout.write(self.style.SUCCESS(f"Fatias a processar: {total}"))
+
+        updated, missing, pending = 0, 0, []
+        for image in queryset.iterator(chunk_size=batch_size):
+            if not image.encrypted_file.name:
+                missing += 1
+                continue
+            try:
+                with image.encrypted_file.open('rb') as f:
+                    data = f.read()
+            except (FileNotFoundError, OSError):
+                missing += 1
+                self.stderr.write(self.style.WARNING(f"Arquivo não encontrado: {image.encrypted_file.name}"))
+                continue
+
+            image.width, image.height = read_image_size(data)
+            image.byte_size = len(data)
+            image.content_hash = hashlib.sha256(data).hexdigest()
+            image.crc32 = zlib.crc32(data) & 0xFFFFFFFF
+            pending.append(image)
+            if len(pending) >= batch_size:
+                updated += ChapterImage.objects.bulk_update(pending, SLICE_MANIFEST_FIELDS)
+                pending = []
+
+        if pending:
+            updated += ChapterImage.objects.bulk_update(pending, SLICE_MANIFEST_FIELDS)
+
+        self.stdout.write(self.style.SUCCESS(f"Concluído: {updated} fatias atualizadas, {missing} sem arquivo."))
@@ -0,0 +1,86 @@
+# manga/management/commands/backfill_slice_variants.py
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from manga.ingest import DEFAULT_SAVE_PARAMS, encode_file_variants, get_variant_widths, store_slice_variants
+from manga.models import ChapterImage, MangaChapterPage, SliceBlob
+
+
+class Command(BaseCommand):
+    help = 'Gera as versões reduzidas (SLICE_VARIANT_WIDTHS) das fatias AVIF já enviadas, com vários capítulos em paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Quantidade de capítulos processados em paralelo.')
+        parser.add_argument('--all', action='store_true', help='Regera também as fatias que já possuem versões reduzidas.')
+        parser.add_argument('--chapter', type=int, action='append', default=[], help='Processa apenas o capítulo com este ID (pode repetir).')
+
+    def handle(self, *args, **options):
+        widths = get_variant_widths()
+        if not widths:
+            self.stdout.write(self.style.WARNING("SLICE_VARIANT_WIDTHS está vazio; nada a fazer."))
+            return
+
+        # Fatias .enc (formato antigo) ficam de fora: as versões reduzidas são servidas direto como AVIF.
+        queryset = ChapterImage.objects.filter(encrypted_file__iendswith='.avif').filter(Q(width__isnull=True) | Q(width__gt=widths[0]))
+        if not options['all']:
+            queryset = queryset.filter(variants=[])
+        if options['chapter']:
+            queryset = queryset.filter(page_id__in=options['chapter'])
+        chapter_ids = list(MangaChapterPage.objects.filter(pk__in=queryset.values('page_id')).order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(self.style.SUCCESS(f"Capítulos a processar: {len(chapter_ids)}"))
+
+        counts = {'chapters': 0, 'slices': 0, 'variants': 0, 'failed': 0}
+        shared_done = {}
+        workers = max(options['workers'], 1)
+
+        def submit(pool, chapter_id):
+            images = list(queryset.filter(page_id=chapter_id).select_related('blob').only('pk', 'encrypted_file', 'variants', 'blob').order_by('sort_order'))
+            paths = [image.encrypted_file.path for image in images]
+            return chapter_id, images, pool.submit(encode_file_variants, paths, widths, DEFAULT_SAVE_PARAMS)
+
+        def collect(chapter_id, images, future):
+            try:
+                results = future.result()
+            except Exception as e:
+                counts['failed'] += 1
+                self.stderr.write(self.style.ERROR(f"Falha no capítulo {chapter_id}: {e}"))
+                return
+            stale = []
+            for image, variants in zip(images, results):
+                blob = image.blob
+                if blob is not None and (blob.pk in shared_done or (blob.variants and not options['all'])):
+                    # Arquivo compartilhado já tem as versões: só copia para a linha.
+                    image.variants = shared_done.get(blob.pk, blob.variants)
+                    continue
+                owner = blob or image
+                stale.extend(v['name'] for v in owner.variants or () if v.get('name'))
+                image.variants = store_slice_variants(image.encrypted_file.name, variants)
+                counts['variants'] += len(image.variants)
+                if blob is not None:
+                    shared_done[blob.pk] = image.variants
+                    SliceBlob.objects.filter(pk=blob.pk).update(variants=image.variants)
+                    ChapterImage.objects.filter(blob=blob).update(variants=image.variants)
+            ChapterImage.objects.bulk_update(images, ['variants'])
+            for name in stale:
+                default_storage.delete(name)
+            counts['chapters'] += 1
+            counts['slices'] += len(images)
+            self.stdout.write(f"  capítulo {chapter_id}: {len(images)} fatias ({counts['chapters']}/{len(chapter_ids)})")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for chapter_id in chapter_ids:
+                pending.append(submit(pool, chapter_id))
+                if len(pending) >= workers * 2:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Concluído: {counts['chapters']} capítulos, {counts['slices']} fatias, {counts['variants']} versões geradas, {counts['failed']} com erro."
+        ))
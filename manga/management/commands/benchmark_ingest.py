@@ -0,0 +1,96 @@
+# manga/management/commands/benchmark_ingest.py
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime
+
+import PIL
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import features
+
+from manga.benchmark import BenchCase, build_strip_zip, run_case, run_case_isolated
+from manga.ingest import get_encode_workers, get_variant_widths
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Mede o fatiamento/codificação das fatias com tiras sintéticas e grava os resultados em JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=20, help='Quantidade de páginas (tiras) no capítulo sintético.')
+        parser.add_argument('--width', type=int, default=800, help='Largura das tiras em pixels.')
+        parser.add_argument('--height', type=int, default=6000, help='Altura das tiras em pixels.')
+        parser.add_argument('--source-format', default='JPEG', choices=['JPEG', 'PNG', 'WEBP'], help='Formato das imagens dentro do ZIP.')
+        parser.add_argument('--slice-heights', type=_int_list, default=None, help='Alturas de fatia a comparar, separadas por vírgula (padrão: ALTURA_FATIA).')
+        parser.add_argument('--speeds', type=_int_list, default=[7, 9], help='Valores de `speed` do encoder a comparar.')
+        parser.add_argument('--qualities', type=_int_list, default=[55], help='Valores de `quality` a comparar.')
+        parser.add_argument('--workers', type=_int_list, default=None, help='Quantidades de processos a comparar (padrão: 1 e INGEST_ENCODE_WORKERS).')
+        parser.add_argument('--format', dest='image_format', default='AVIF', help='Formato de saída das fatias.')
+        parser.add_argument('--variants', action='store_true', help='Inclui as versões reduzidas (SLICE_VARIANT_WIDTHS) na medição.')
+        parser.add_argument('--repeat', type=int, default=1, help='Execuções de cada caso.')
+        parser.add_argument('--no-isolate', action='store_true', help='Executa os casos no próprio processo (o pico de RSS passa a ser acumulado).')
+        parser.add_argument('--output', default='', help='Arquivo JSON de saída (padrão: stdout).')
+
+    def handle(self, *args, **options):
+        image_format = options['image_format'].upper()
+        if image_format == 'AVIF' and not features.check('avif'):
+            try:
+                import pillow_avif  # noqa: F401
+            except ImportError:
+                raise CommandError("Este Pillow não codifica AVIF; instale pillow-avif-plugin ou use --format WEBP.")
+
+        slice_heights = options['slice_heights'] or [getattr(settings, 'ALTURA_FATIA', 1600)]
+        workers = options['workers'] or sorted({1, get_encode_workers()})
+        variant_widths = get_variant_widths() if options['variants'] else ()
+        cases = [
+            BenchCase(slice_height, speed, quality, worker_count, image_format)
+            for slice_height, speed, quality, worker_count in itertools.product(slice_heights, options['speeds'], options['qualities'], workers)
+        ]
+        runner = run_case if options['no_isolate'] else run_case_isolated
+
+        results = []
+        with tempfile.TemporaryDirectory(prefix='bench-ingest-') as tmp_dir:
+            zip_path = os.path.join(tmp_dir, 'capitulo.zip')
+            members = build_strip_zip(zip_path, options['pages'], options['width'], options['height'], options['source_format'])
+            self.stderr.write(f"ZIP sintético: {options['pages']} páginas {options['width']}x{options['height']} ({os.path.getsize(zip_path)} bytes); {len(cases)} caso(s).")
+            for case in cases:
+                for run in range(options['repeat']):
+                    result = {**runner(zip_path, members, case, variant_widths), 'run': run}
+                    results.append(result)
+                    if 'error' in result:
+                        self.stderr.write(self.style.ERROR(f"  {case}: {result['error']}"))
+                    else:
+                        self.stderr.write(
+                            f"  fatia={case.slice_height} speed={case.speed} q={case.quality} procs={case.workers}: "
+                            f"{result['slices_per_second']} fatias/s, {result['cpu_seconds']}s CPU, {result['bytes_per_page']} B/página"
+                        )
+
+        payload = {
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'pillow': PIL.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'pages': options['pages'],
+                'width': options['width'],
+                'height': options['height'],
+                'source_format': options['source_format'],
+                'variant_widths': list(variant_widths),
+            },
+            'results': results,
+        }
+        output = json.dumps(payload, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Resultados gravados em {options['output']}"))
+        else:
+            self.stdout.write(output)
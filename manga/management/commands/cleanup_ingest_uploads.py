@@ -0,0 +1,45 @@
+# manga/management/commands/cleanup_ingest_uploads.py
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from manga.models import ChapterIngestJob, IngestJobStatus
+from manga.tasks import delete_upload
+
+
+class Command(BaseCommand):
+    help = 'Apaga os arquivos enviados de processamentos concluídos, dos que falharam há mais de N dias e de envios sem job.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed-days', type=float, default=None, help='Dias que os envios de jobs com falha ficam guardados para nova tentativa (padrão: INGEST_FAILED_UPLOAD_RETENTION_DAYS).')
+
+    def handle(self, *args, **options):
+        failed_days = options['failed_days']
+        if failed_days is None:
+            failed_days = getattr(settings, 'INGEST_FAILED_UPLOAD_RETENTION_DAYS', 7)
+        jobs = {str(job.pk): job for job in ChapterIngestJob.objects.only('pk', 'status', 'upload_dir', 'finished_at', 'created_at')}
+        failed_cutoff = timezone.now() - timedelta(days=failed_days)
+        # Envio sem job: o job foi apagado ou a requisição caiu antes de salvá-lo (dá uma hora de folga).
+        orphan_cutoff = timezone.now() - timedelta(hours=1)
+        removed = 0
+        root = 'ingest_uploads'
+        names = default_storage.listdir(root)[0] if default_storage.exists(root) else []
+        for name in names:
+            job = jobs.get(name)
+            if job is None:
+                path = default_storage.path(os.path.join(root, name))
+                if datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc) > orphan_cutoff:
+                    continue
+                job = ChapterIngestJob(upload_dir=os.path.join(root, name))
+            elif job.status == IngestJobStatus.FAILED:
+                if (job.finished_at or job.created_at) > failed_cutoff:
+                    continue
+            elif job.status != IngestJobStatus.DONE:
+                continue
+            delete_upload(job)
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(f"{removed} pasta(s) de envio apagada(s)."))
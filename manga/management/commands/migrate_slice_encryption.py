@@ -0,0 +1,80 @@
+# manga/management/commands/migrate_slice_encryption.py
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manga.models import ChapterImage
+from manga.slice_cache import get_fernet
+from manga.slice_crypto import encrypt_bytes, get_aead, is_chunked
+
+
+def _convert(path, fernet, aead, chunk_size, dry_run):
+    """Regrava um .enc Fernet no formato em blocos. Retorna (status, tamanho, hash) do arquivo final."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if is_chunked(data):
+        return 'skipped', None, None
+    converted = encrypt_bytes(fernet.decrypt(data), chunk_size=chunk_size, aead=aead)
+    if not dry_run:
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(converted)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    return 'converted', len(converted), hashlib.sha256(converted).hexdigest()
+
+
+class Command(BaseCommand):
+    help = 'Converte as fatias criptografadas (.enc) do formato Fernet para o formato em blocos AES-GCM, em paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Quantidade de arquivos convertidos em paralelo.')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Tamanho do bloco em bytes (padrão: SLICE_ENCRYPTION_CHUNK_SIZE).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Quantidade de fatias por lote.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas decifra e recifra em memória, sem gravar nada.')
+
+    def handle(self, *args, **options):
+        fernet, aead = get_fernet(), get_aead()
+        if fernet is None or aead is None:
+            raise CommandError("CHAVE_MESTRA_IMAGENS não está configurada.")
+
+        queryset = ChapterImage.objects.exclude(encrypted_file='').exclude(encrypted_file__iendswith='.avif').only('pk', 'encrypted_file').order_by('pk')
+        total = queryset.count()
+        self.stdout.write(self.style.SUCCESS(f"Fatias criptografadas encontradas: {total}"))
+
+        counts = {'converted': 0, 'skipped': 0, 'failed': 0}
+        batch = []
+
+        def flush(pool):
+            futures = [(image, pool.submit(_convert, image.encrypted_file.path, fernet, aead, options['chunk_size'], options['dry_run'])) for image in batch]
+            to_update = []
+            for image, future in futures:
+                try:
+                    status, byte_size, content_hash = future.result()
+                except Exception as e:
+                    counts['failed'] += 1
+                    self.stderr.write(self.style.ERROR(f"Falha ao converter {image.encrypted_file.name}: {e}"))
+                    continue
+                counts[status] += 1
+                if status == 'converted' and not options['dry_run']:
+                    image.byte_size, image.content_hash = byte_size, content_hash
+                    to_update.append(image)
+            if to_update:
+                ChapterImage.objects.bulk_update(to_update, ['byte_size', 'content_hash'])
+            batch.clear()
+            self.stdout.write(f"  {sum(counts.values())}/{total} processadas")
+
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for image in queryset.iterator(chunk_size=options['batch_size']):
+                batch.append(image)
+                if len(batch) >= options['batch_size']:
+                    flush(pool)
+            if batch:
+                flush(pool)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Concluído: {counts['converted']} convertidas, {counts['skipped']} já no novo formato, {counts['failed']} com erro."
+        ))
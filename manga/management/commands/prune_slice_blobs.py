@@ -0,0 +1,23 @@
+# manga/management/commands/prune_slice_blobs.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from manga.models import SliceBlob
+
+
+class Command(BaseCommand):
+    help = 'Apaga os arquivos de fatia compartilhados (SliceBlob) sem referências, passado o prazo de carência. Rodado de hora em hora pelas tarefas periódicas do container (docker-entrypoint.sh).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=None, help='Idade mínima dos blobs apagados (padrão: SLICE_BLOB_PRUNE_GRACE_HOURS).')
+        parser.add_argument('--recount', action='store_true', help='Antes, recalcula as referências pelas fatias existentes (rode sem ingestões em andamento).')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            fixed = SliceBlob.recount()
+            self.stdout.write(f"Referências corrigidas em {fixed} blob(s).")
+        grace_hours = options['grace_hours']
+        if grace_hours is None:
+            grace_hours = getattr(settings, 'SLICE_BLOB_PRUNE_GRACE_HOURS', 6)
+        pruned = SliceBlob.prune(grace_hours=grace_hours)
+        self.stdout.write(self.style.SUCCESS(f"{pruned} arquivo(s) de fatia sem referências apagado(s)."))
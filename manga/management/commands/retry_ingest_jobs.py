@@ -0,0 +1,24 @@
+# manga/management/commands/retry_ingest_jobs.py
+from django.core.management.base import BaseCommand
+
+from manga.models import ChapterIngestJob, IngestJobStatus
+from manga.tasks import retry_ingest_job
+
+
+class Command(BaseCommand):
+    help = 'Recoloca na fila os processamentos de upload que falharam, usando os arquivos enviados que ficaram no disco.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_ids', nargs='*', help='IDs dos jobs (padrão: todos os que falharam).')
+
+    def handle(self, *args, **options):
+        jobs = ChapterIngestJob.objects.filter(status=IngestJobStatus.FAILED)
+        if options['job_ids']:
+            jobs = jobs.filter(pk__in=options['job_ids'])
+        retried = 0
+        for job in jobs:
+            if retry_ingest_job(job):
+                retried += 1
+            else:
+                self.stderr.write(f"Job {job.pk}: arquivos do envio não estão mais no disco; envie de novo.")
+        self.stdout.write(self.style.SUCCESS(f"{retried} job(s) recolocado(s) na fila."))
@@ -0,0 +1,13 @@
+# manga/management/commands/update_trending_scores.py
+from django.core.management.base import BaseCommand
+
+from manga.trending import update_trending_scores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o ranking "Mais Vistos" (score em alta, views do dia e da semana). Rodado de hora em hora pelas tarefas periódicas do container (docker-entrypoint.sh).'
+
+    def handle(self, *args, **options):
+        # Lê só o que já foi gravado: os buffers de views vivem nos processos web, que alimentam os anéis a cada flush.
+        updated = update_trending_scores()
+        self.stdout.write(self.style.SUCCESS(f"Ranking atualizado: {updated} obra(s) alterada(s)."))
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+
+class ChapterEntry(namedtuple('ChapterEntry', ['pk', 'slug', 'title', 'chapter_number', 'sort_key', 'release_date', 'is_vip', 'unlock_at'])):
+    """Linha leve do manifesto de capítulos de uma obra. Não carrega a página do capítulo."""
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self.pk
+
+    @property
+    def is_effectively_vip(self):
+        return self.unlock_at is not None and self.unlock_at > timezone.now()
+
+
+class ChapterManifestCache:
+    """
+    LRU por processo com o manifesto ordenado (mais novo primeiro) de cada obra.
+    A chave inclui chapters_version da obra, então outros workers percebem a mudança
+    assim que carregam a obra atualizada; o TTL limita qualquer resto de inconsistência.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'CHAPTER_MANIFEST_CACHE_SIZE', 2048)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'CHAPTER_MANIFEST_CACHE_TTL', 300)
+
+    def get(self, work, builder):
+        key = (work._meta.label_lower, work.pk)
+        version = getattr(work, 'chapters_version', 0)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version and cached[1] > now:
+                self._entries.move_to_end(key)
+                return cached[2]
+        manifest = tuple(builder())
+        if self.max_size <= 0:
+            return manifest
+        with self._lock:
+            self._entries[key] = (version, now + self.ttl, manifest)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return manifest
+
+    def invalidate(self, work):
+        with self._lock:
+            self._entries.pop((work._meta.label_lower, work.pk), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+chapter_manifest_cache = ChapterManifestCache()
+
+
+def get_chapter_manifest(work, builder):
+    return chapter_manifest_cache.get(work, builder)
+
+
+def bump_chapters_version(work):
+    """Marca a lista de capítulos da obra como alterada em todos os workers."""
+    type(work).objects.filter(pk=work.pk).update(chapters_version=F('chapters_version') + 1)
+    work.chapters_version = (work.chapters_version or 0) + 1
+    chapter_manifest_cache.invalidate(work)
+
+
+def materialize(model, entries):
+    """Carrega as páginas dos capítulos das entradas informadas numa única consulta, preservando a ordem."""
+    pages = model.objects.in_bulk([entry.pk for entry in entries])
+    return [pages[entry.pk] for entry in entries if entry.pk in pages]
+
+
+def link_chapters(model, previous_id, next_id):
+    """Liga dois capítulos vizinhos (qualquer um pode ser None)."""
+    if previous_id:
+        model.objects.filter(pk=previous_id).update(next_chapter_id=next_id)
+    if next_id:
+        model.objects.filter(pk=next_id).update(prev_chapter_id=previous_id)
+
+
+def unlink_chapter(chapter):
+    """Remove o capítulo da lista encadeada de navegação, ligando os vizinhos antigos entre si."""
+    model = type(chapter)
+    links = model.objects.filter(pk=chapter.pk).values_list('prev_chapter_id', 'next_chapter_id').first()
+    if not links:
+        return
+    link_chapters(model, *links)
+    model.objects.filter(pk=chapter.pk).update(prev_chapter_id=None, next_chapter_id=None)
+    chapter.prev_chapter_id = chapter.next_chapter_id = None
+
+
+def relink_chapter(chapter):
+    """
+    Reposiciona o capítulo na lista encadeada após publicação ou renumeração,
+    alterando apenas os vizinhos antigos e os novos.
+    """
+    model = type(chapter)
+    unlink_chapter(chapter)
+    previous_id, next_id = chapter.find_live_neighbours()
+    model.objects.filter(pk=chapter.pk).update(prev_chapter_id=previous_id, next_chapter_id=next_id)
+    chapter.prev_chapter_id, chapter.next_chapter_id = previous_id, next_id
+    if previous_id:
+        model.objects.filter(pk=previous_id).update(next_chapter_id=chapter.pk)
+    if next_id:
+        model.objects.filter(pk=next_id).update(prev_chapter_id=chapter.pk)
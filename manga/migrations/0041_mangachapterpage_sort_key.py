@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-17 03:42
+
+import re
+
+from django.db import migrations, models
+
+CHAPTER_SORT_PROLOGUE = -1
+CHAPTER_SORT_EPILOGUE = 2147483646
+CHAPTER_SORT_UNKNOWN = 2147483647
+
+
+def parse_chapter_sort_key(chapter_number):
+    """Cópia congelada de manga.models.parse_chapter_sort_key: a migração não deve mudar se o modelo mudar."""
+    num_str = str(chapter_number or '').strip().lower()
+    if not num_str:
+        return (CHAPTER_SORT_UNKNOWN, 0)
+    num_str_cleaned = num_str.replace('capitulo', '').replace('cap.', '').replace('ch.', '').strip()
+    match = re.match(r"(\d+)(?:[\.,](\d+))?(.*)", num_str_cleaned)
+    if match:
+        main_part_val = min(int(match.group(1)), CHAPTER_SORT_EPILOGUE - 1)
+        sub_part_val = min(int(match.group(2)), CHAPTER_SORT_UNKNOWN) if match.group(2) else 0
+        return (main_part_val, sub_part_val)
+    if "prólogo" in num_str or "prologue" in num_str:
+        return (CHAPTER_SORT_PROLOGUE, 0)
+    if "epílogo" in num_str or "epilogue" in num_str:
+        return (CHAPTER_SORT_EPILOGUE, 0)
+    return (CHAPTER_SORT_UNKNOWN, 0)
+
+
+def backfill_sort_keys(apps, schema_editor):
+    MangaChapterPage = apps.get_model('manga', 'MangaChapterPage')
+    chapters = list(MangaChapterPage.objects.only('pk', 'chapter_number'))
+    for chapter in chapters:
+        chapter.sort_key_main, chapter.sort_key_sub = parse_chapter_sort_key(chapter.chapter_number)
+    MangaChapterPage.objects.bulk_update(chapters, ['sort_key_main', 'sort_key_sub'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0040_alter_workrelation_target_work'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mangachapterpage',
+            name='sort_key_main',
+            field=models.IntegerField(default=2147483647, editable=False, verbose_name='Chave de Ordenação (Principal)'),
+        ),
+        migrations.AddField(
+            model_name='mangachapterpage',
+            name='sort_key_sub',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Chave de Ordenação (Subparte)'),
+        ),
+        migrations.AddIndex(
+            model_name='mangachapterpage',
+            index=models.Index(fields=['sort_key_main', 'sort_key_sub'], name='manga_chapter_sort_key_idx'),
+        ),
+        migrations.RunPython(backfill_sort_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-17 03:44
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+
+VIP_LOCKED_INDEFINITELY = datetime(9999, 12, 31, tzinfo=dt_timezone.utc)
+
+
+def compute_vip_unlock_at(manga_page, chapter_index, is_vip, release_date):
+    """Cópia congelada de MangaPage.compute_vip_unlock_at: a migração não deve mudar se a regra mudar."""
+    if manga_page.chapters_are_vip:
+        return VIP_LOCKED_INDEFINITELY
+    if not manga_page.default_chapters_are_vip and not is_vip:
+        return None
+    vip_limit = manga_page.recent_vip_chapters_count
+    if vip_limit <= 0 or chapter_index is None or chapter_index >= vip_limit:
+        return VIP_LOCKED_INDEFINITELY if is_vip else None
+    tier_size = manga_page.vip_tier_size if manga_page.vip_tier_size > 0 else 1
+    tier_index = chapter_index // tier_size
+    wait_days = max(0, manga_page.vip_base_release_days - (tier_index * manga_page.vip_days_decrease_per_tier))
+    if wait_days == 0:
+        return None
+    if not release_date:
+        return VIP_LOCKED_INDEFINITELY
+    return release_date + timedelta(days=wait_days)
+
+
+def backfill_vip_unlock_at(apps, schema_editor):
+    MangaPage = apps.get_model('manga', 'MangaPage')
+    MangaChapterPage = apps.get_model('manga', 'MangaChapterPage')
+    for manga_page in MangaPage.objects.all().iterator():
+        children = MangaChapterPage.objects.filter(
+            path__startswith=manga_page.path, depth=manga_page.depth + 1
+        ).order_by('-sort_key_main', '-sort_key_sub', '-path')
+        to_update = []
+        chapter_index = 0
+        for chapter in children.only('pk', 'live', 'is_vip', 'release_date', 'first_published_at'):
+            if chapter.live:
+                chapter.vip_unlock_at = compute_vip_unlock_at(
+                    manga_page, chapter_index, chapter.is_vip, chapter.release_date or chapter.first_published_at
+                )
+                chapter_index += 1
+            else:
+                chapter.vip_unlock_at = compute_vip_unlock_at(manga_page, None, chapter.is_vip, None)
+            if chapter.vip_unlock_at is not None:
+                to_update.append(chapter)
+        if to_update:
+            MangaChapterPage.objects.bulk_update(to_update, ['vip_unlock_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0041_mangachapterpage_sort_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mangachapterpage',
+            name='vip_unlock_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Calculado a partir das configurações VIP da obra. Vazio significa capítulo livre.', null=True, verbose_name='Liberado para Todos em'),
+        ),
+        migrations.RunPython(backfill_vip_unlock_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0042_mangachapterpage_vip_unlock_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mangapage',
+            name='chapters_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Versão da Lista de Capítulos'),
+        ),
+    ]
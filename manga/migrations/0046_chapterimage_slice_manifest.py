@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0045_mangachapterpage_next_chapter_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapterimage',
+            name='byte_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Tamanho (bytes)'),
+        ),
+        migrations.AddField(
+            model_name='chapterimage',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Hash SHA-256 do Conteúdo'),
+        ),
+        migrations.AddField(
+            model_name='chapterimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Altura (px)'),
+        ),
+        migrations.AddField(
+            model_name='chapterimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Largura (px)'),
+        ),
+    ]
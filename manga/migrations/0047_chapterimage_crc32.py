@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0046_chapterimage_slice_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapterimage',
+            name='crc32',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='CRC-32'),
+        ),
+    ]
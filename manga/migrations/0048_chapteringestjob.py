@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-17 04:06
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0047_chapterimage_crc32'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterIngestJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('zip', 'ZIP com pastas de capítulos'), ('folder', 'Pasta de um capítulo')], max_length=10, verbose_name='Tipo')),
+                ('chapter_number', models.CharField(blank=True, max_length=50, verbose_name='Número do Capítulo')),
+                ('upload_dir', models.CharField(help_text='Caminho relativo ao MEDIA_ROOT com os arquivos enviados aguardando processamento.', max_length=500, verbose_name='Pasta do Upload')),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('running', 'Processando'), ('done', 'Concluído'), ('failed', 'Falhou')], db_index=True, default='pending', max_length=10, verbose_name='Status')),
+                ('images_total', models.PositiveIntegerField(default=0, verbose_name='Imagens no Envio')),
+                ('images_done', models.PositiveIntegerField(default=0, verbose_name='Imagens Processadas')),
+                ('slices_done', models.PositiveIntegerField(default=0, verbose_name='Fatias Geradas')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Erros')),
+                ('log', models.JSONField(blank=True, default=list, verbose_name='Mensagens')),
+                ('result_url', models.CharField(blank=True, max_length=500, verbose_name='URL do Resultado')),
+                ('encode_report', models.JSONField(blank=True, null=True, verbose_name='Relatório de Codificação')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado em')),
+                ('manga', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingest_jobs', to='manga.mangapage', verbose_name='Obra')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Enviado por')),
+            ],
+            options={
+                'verbose_name': 'Processamento de Upload',
+                'verbose_name_plural': 'Processamentos de Upload',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0048_chapteringestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapterimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Versões da fatia em larguras menores (width, height, name, byte_size), usadas no srcset do leitor.', verbose_name='Versões Reduzidas'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-17 04:14
+
+import django.db.models.deletion
+import manga.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0049_chapterimage_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SliceBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True, verbose_name='Hash SHA-256 do Conteúdo')),
+                ('file', models.FileField(max_length=255, upload_to=manga.models.slice_blob_upload_path, verbose_name='Arquivo')),
+                ('width', models.PositiveIntegerField(blank=True, null=True, verbose_name='Largura (px)')),
+                ('height', models.PositiveIntegerField(blank=True, null=True, verbose_name='Altura (px)')),
+                ('byte_size', models.PositiveIntegerField(default=0, verbose_name='Tamanho (bytes)')),
+                ('crc32', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='CRC-32')),
+                ('variants', models.JSONField(blank=True, default=list, verbose_name='Versões Reduzidas')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Referências')),
+                ('source_hash', models.CharField(blank=True, db_index=True, help_text='Permite reaproveitar a codificação quando a mesma imagem de origem é enviada de novo.', max_length=64, verbose_name='Hash da Imagem de Origem')),
+                ('source_part', models.PositiveIntegerField(default=0, verbose_name='Parte da Origem')),
+                ('source_parts', models.PositiveIntegerField(default=0, verbose_name='Total de Partes da Origem')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Arquivo de Fatia Compartilhado',
+                'verbose_name_plural': 'Arquivos de Fatia Compartilhados',
+            },
+        ),
+        migrations.AddField(
+            model_name='chapterimage',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='chapter_images', to='manga.sliceblob', verbose_name='Arquivo Compartilhado'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0050_slice_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapterimage',
+            name='encoder_profile',
+            field=models.CharField(blank=True, editable=False, help_text='Perfil e parâmetros do encoder usados nesta fatia (ex.: adaptativo:s8q60).', max_length=40, verbose_name='Perfil de Codificação'),
+        ),
+        migrations.AddField(
+            model_name='chapteringestjob',
+            name='encoder_profile',
+            field=models.CharField(blank=True, choices=[('equilibrado', 'Equilibrado (speed 7, qualidade 55)'), ('rapido', 'Rápido (speed 9, qualidade 50)'), ('qualidade', 'Qualidade (speed 5, qualidade 65)'), ('adaptativo', 'Adaptativo (ajusta por fatia conforme a complexidade)')], help_text='Vazio usa o perfil definido nas configurações globais.', max_length=20, verbose_name='Perfil de Codificação'),
+        ),
+        migrations.AddField(
+            model_name='sliceblob',
+            name='encoder_profile',
+            field=models.CharField(blank=True, max_length=40, verbose_name='Perfil de Codificação'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 04:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0051_encoder_profiles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='readinghistory',
+            name='read_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Lido em'),
+        ),
+    ]
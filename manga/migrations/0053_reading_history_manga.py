@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 04:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_history_manga(apps, schema_editor):
+    MangaPage = apps.get_model('manga', 'MangaPage')
+    MangaChapterPage = apps.get_model('manga', 'MangaChapterPage')
+    ReadingHistory = apps.get_model('manga', 'ReadingHistory')
+    for work in MangaPage.objects.all().iterator():
+        chapter_ids = MangaChapterPage.objects.filter(path__startswith=work.path, depth=work.depth + 1).values('pk')
+        ReadingHistory.objects.filter(chapter_id__in=chapter_ids, manga__isnull=True).update(manga_id=work.pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0052_reading_history_read_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readinghistory',
+            name='manga',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='manga.mangapage', verbose_name='Obra'),
+        ),
+        migrations.AddIndex(
+            model_name='readinghistory',
+            index=models.Index(fields=['user', 'read_at'], name='manga_history_user_read_idx'),
+        ),
+        migrations.RunPython(backfill_history_manga, migrations.RunPython.noop),
+    ]
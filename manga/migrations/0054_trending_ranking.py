@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-17 04:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0053_reading_history_manga'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkViewRing',
+            fields=[
+                ('work', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_ring', serialize=False, to='manga.mangapage', verbose_name='Obra')),
+                ('counts', models.BinaryField(default=b'', verbose_name='Contadores Horários')),
+                ('head_hour', models.BigIntegerField(help_text='Horas desde a época (UTC) do balde mais recente.', null=True, verbose_name='Hora Mais Recente')),
+            ],
+            options={
+                'verbose_name': 'Anel de Views por Hora',
+                'verbose_name_plural': 'Anéis de Views por Hora',
+            },
+        ),
+        migrations.AddField(
+            model_name='mangapage',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0, editable=False, help_text='Views por hora com decaimento exponencial; recalculado por `update_trending_scores`.', verbose_name='Score de Tendência'),
+        ),
+        migrations.AddField(
+            model_name='mangapage',
+            name='views_day',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Views nas Últimas 24h'),
+        ),
+        migrations.AddField(
+            model_name='mangapage',
+            name='views_week',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Views nos Últimos 7 Dias'),
+        ),
+        migrations.AlterField(
+            model_name='mangapage',
+            name='views_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Contador de Visualizações'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0054_trending_ranking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chapteringestjob',
+            name='kind',
+            field=models.CharField(choices=[('zip', 'ZIP com pastas de capítulos'), ('folder', 'Pasta de um capítulo'), ('avif_zip', 'ZIP de um capítulo com AVIF prontos')], max_length=10, verbose_name='Tipo'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manga', '0055_chapteringestjob_avif_zip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sliceblob',
+            name='source_size',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, help_text='Só origens com um tamanho já visto têm o hash calculado antes da codificação.', null=True, verbose_name='Tamanho da Origem (bytes)'),
+        ),
+    ]
@@ -1,13 +1,17 @@
 import logging
 import os
 import re
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from io import BytesIO
 from pathlib import Path
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import FileExtensionValidator
-from django.db import models
-from django.db.models import F
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
@@ -25,16 +29,30 @@ from wagtail.admin.panels import (
 from wagtail.api import APIField
 from wagtail.fields import RichTextField
 from wagtail.images.models import Image as WagtailImage
-from wagtail.models import Page, PageManager, Orderable
+from wagtail.models import Page, PageManager, PageQuerySet, Orderable
 from wagtail.documents.models import Document
 from wagtail.search import index
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import InvalidToken
+from PIL import Image as PillowImage
+
+try:
+    import pillow_avif
+except ImportError:
+    pillow_avif = None
+from .encoder_profiles import ENCODER_PROFILE_CHOICES
+from .history import reading_history
+from .manifest import ChapterEntry, bump_chapters_version, get_chapter_manifest, materialize
+from .slice_cache import decrypted_slice_cache, get_fernet
+from .slice_crypto import SliceFormatError, decrypt_bytes
 
 try:
     from core.models import GlobalSettings
 except ImportError:
     GlobalSettings = None
+from core.badges import get_badge_settings
+from core.counters import unique_readers, view_counter
 
 logger = logging.getLogger(__name__)
 try:
@@ -117,6 +135,12 @@ class MangaChapterUpload(Orderable):
         verbose_name_plural = _("Uploads de Capítulos (Registros)")
         ordering = ['-upload_date']
 
+VIP_LOCKED_INDEFINITELY = datetime(9999, 12, 31, tzinfo=dt_timezone.utc)
+VIP_SCHEDULE_FIELDS = (
+    'chapters_are_vip', 'default_chapters_are_vip', 'recent_vip_chapters_count',
+    'vip_tier_size', 'vip_base_release_days', 'vip_days_decrease_per_tier',
+)
+
 class MangaPageManager(PageManager):
     def visible_for(self, user):
         is_vip_user = user.is_authenticated and (user.is_staff or (hasattr(user, 'assinatura_vip') and user.assinatura_vip.esta_ativa))
@@ -151,7 +175,11 @@ class MangaPage(Page):
     vip_base_release_days = models.PositiveIntegerField(_("Tempo Máx. de Espera (dias)"), default=7, help_text=_("Tempo de espera, em dias, para os capítulos do degrau mais recente."))
     vip_days_decrease_per_tier = models.PositiveIntegerField(_("Redução de Tempo por Degrau (dias)"), default=2, help_text=_("Quantos dias de espera são removidos a cada degrau mais antigo. Ex: 2."))
     is_up_to_date = models.BooleanField(_("Obra em Dia?"), default=False, help_text=_("Marque se os capítulos postados estão em dia com os lançamentos originais. Isso desativará a caixa de doação."))
-    views_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Contador de Visualizações")
+    views_count = models.PositiveIntegerField(default=0, editable=False, db_index=True, verbose_name="Contador de Visualizações")
+    trending_score = models.FloatField(_("Score de Tendência"), default=0, editable=False, db_index=True, help_text=_("Views por hora com decaimento exponencial; recalculado por `update_trending_scores`."))
+    views_day = models.PositiveIntegerField(_("Views nas Últimas 24h"), default=0, editable=False, db_index=True)
+    views_week = models.PositiveIntegerField(_("Views nos Últimos 7 Dias"), default=0, editable=False, db_index=True)
+    chapters_version = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Versão da Lista de Capítulos"))
     donation_system_active = models.BooleanField(_("Ativar Sistema de Doação?"), default=False, help_text=_("Marque para habilitar a funcionalidade de meta de doação para esta obra."))
     donation_goal = models.PositiveIntegerField(_("Meta de Moedas para Próximo Cap."), default=0, help_text=_("Defina a meta de moedas para o lançamento do próximo capítulo. 0 para desativar."))
     current_donations = models.PositiveIntegerField(_("Moedas Atuais na Meta"), default=0, help_text=_("Quantidade de moedas doadas até agora para o próximo capítulo."))
@@ -254,57 +282,107 @@ class MangaPage(Page):
             return {'text': 'Em Dia', 'color': '#1e6a3a', 'class': 'up-to-date'}
         return None
 
+    @property
+    def display_views_count(self):
+        return view_counter.display_value(self, 'views_count')
+
     @property
     def has_vip_chapters(self):
-        return self.get_children().live().specific().filter(is_vip=True).exists()
+        return any(entry.is_effectively_vip for entry in self.get_chapters())
     
     def save(self, *args, **kwargs):
         if self.reset_donation_goal_on_save:
             self.current_donations = 0
             self.reset_donation_goal_on_save = False
+        update_fields = kwargs.get('update_fields')
+        vip_settings_changed = False
+        if self.pk and (update_fields is None or set(update_fields) & set(VIP_SCHEDULE_FIELDS)):
+            previous = MangaPage.objects.filter(pk=self.pk).values(*VIP_SCHEDULE_FIELDS).first()
+            vip_settings_changed = previous is not None and any(previous[field] != getattr(self, field) for field in VIP_SCHEDULE_FIELDS)
         super().save(*args, **kwargs)
+        if vip_settings_changed:
+            self.refresh_vip_schedule()
 
-    def get_chapters(self):
-        all_chapters_qs = MangaChapterPage.objects.child_of(self).live().public().specific()
-        all_chapters_list = list(all_chapters_qs)
-        chapters_sorted_list = sorted(
-            all_chapters_list,
-            key=lambda chap: (
-                chap._get_numerical_sort_key() if hasattr(chap, '_get_numerical_sort_key') else (float('inf'), float('inf')),
-                -(chap.release_date_or_published or timezone.datetime.min.replace(tzinfo=timezone.utc)).timestamp() if hasattr(chap, 'release_date_or_published') and chap.release_date_or_published else float('-inf'),
-                chap.title.lower()
-            )
+    def with_content_json(self, content):
+        obj = super().with_content_json(content)
+        obj.chapters_version = self.chapters_version
+        return obj
+
+    def compute_vip_unlock_at(self, chapter_index, is_vip, release_date):
+        """
+        Aplica a regra de degraus VIP a um capítulo. Retorna None (livre),
+        VIP_LOCKED_INDEFINITELY (bloqueado sem data) ou a data de liberação.
+        chapter_index é a posição entre os capítulos publicados, do mais novo (0) ao mais antigo.
+        """
+        if self.chapters_are_vip:
+            return VIP_LOCKED_INDEFINITELY
+        if not self.default_chapters_are_vip and not is_vip:
+            return None
+        vip_limit = self.recent_vip_chapters_count
+        if vip_limit <= 0 or chapter_index is None or chapter_index >= vip_limit:
+            return VIP_LOCKED_INDEFINITELY if is_vip else None
+        tier_size = self.vip_tier_size if self.vip_tier_size > 0 else 1
+        tier_index = chapter_index // tier_size
+        wait_days = max(0, self.vip_base_release_days - (tier_index * self.vip_days_decrease_per_tier))
+        if wait_days == 0:
+            return None
+        if not release_date:
+            return VIP_LOCKED_INDEFINITELY
+        return release_date + timezone.timedelta(days=wait_days)
+
+    def refresh_vip_schedule(self):
+        """Recalcula vip_unlock_at de todos os capítulos da obra e grava apenas os que mudaram."""
+        live_ids = set()
+        changed_chapters = []
+        live_rows = self.get_chapters_queryset().values_list('pk', 'is_vip', 'release_date', 'first_published_at', 'vip_unlock_at')
+        for chapter_index, (pk, is_vip, release_date, first_published_at, current_unlock_at) in enumerate(live_rows):
+            live_ids.add(pk)
+            unlock_at = self.compute_vip_unlock_at(chapter_index, is_vip, release_date or first_published_at)
+            if unlock_at != current_unlock_at:
+                changed_chapters.append(MangaChapterPage(pk=pk, vip_unlock_at=unlock_at))
+        other_rows = MangaChapterPage.objects.child_of(self).exclude(pk__in=live_ids).values_list('pk', 'is_vip', 'vip_unlock_at')
+        for pk, is_vip, current_unlock_at in other_rows:
+            unlock_at = self.compute_vip_unlock_at(None, is_vip, None)
+            if unlock_at != current_unlock_at:
+                changed_chapters.append(MangaChapterPage(pk=pk, vip_unlock_at=unlock_at))
+        if changed_chapters:
+            MangaChapterPage.objects.bulk_update(changed_chapters, ['vip_unlock_at'], batch_size=500)
+            bump_chapters_version(self)
+        return len(changed_chapters)
+
+    def get_chapters_queryset(self):
+        """Capítulos publicados, do mais recente para o mais antigo, ordenados no banco pela chave persistida."""
+        return MangaChapterPage.objects.child_of(self).live().public().newest_first()
+
+    def _build_chapter_manifest(self):
+        rows = self.get_chapters_queryset().values_list(
+            'pk', 'slug', 'title', 'chapter_number', 'sort_key_main', 'sort_key_sub',
+            'release_date', 'first_published_at', 'is_vip', 'vip_unlock_at',
         )
-        chapters_sorted_list.reverse()
-        return chapters_sorted_list
+        for pk, slug, title, chapter_number, sort_key_main, sort_key_sub, release_date, first_published_at, is_vip, unlock_at in rows:
+            yield ChapterEntry(pk, slug, title, chapter_number, (sort_key_main, sort_key_sub), release_date or first_published_at, is_vip, unlock_at)
+
+    def get_chapters(self):
+        """Manifesto em cache dos capítulos publicados (tupla de ChapterEntry, do mais recente ao mais antigo)."""
+        return get_chapter_manifest(self, self._build_chapter_manifest)
 
     def get_recent_chapters(self, count=5):
-        all_sorted_chapters = self.get_chapters()
-        return all_sorted_chapters[:count]
+        return materialize(MangaChapterPage, self.get_chapters()[:count])
 
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
-        all_chapters_list = self.get_chapters()
+        manifest = self.get_chapters()
+        chapter_entries = list(manifest)
         search_query_val = request.GET.get('q_chapter', '').strip()
         context['search_query'] = search_query_val
         if search_query_val:
-            filtered_list = []
-            for chapter_obj in all_chapters_list:
-                match_title = False
-                if hasattr(chapter_obj, 'title') and chapter_obj.title:
-                    match_title = search_query_val.lower() in chapter_obj.title.lower()
-                match_number = False
-                if hasattr(chapter_obj, 'chapter_number') and chapter_obj.chapter_number:
-                    match_number = search_query_val.lower() in str(chapter_obj.chapter_number).lower()
-                if match_title or match_number:
-                    filtered_list.append(chapter_obj)
-            all_chapters_list = filtered_list
+            needle = search_query_val.lower()
+            chapter_entries = [entry for entry in chapter_entries if needle in entry.title.lower() or needle in entry.chapter_number.lower()]
         sort_param = request.GET.get('sort', 'desc')
         context['current_sort'] = sort_param
-        chapters_to_paginate = all_chapters_list
         if sort_param == 'asc':
-            chapters_to_paginate.reverse()
-        paginator = Paginator(chapters_to_paginate, 25)
+            chapter_entries.reverse()
+        paginator = Paginator(chapter_entries, 25)
         page_number = request.GET.get('page')
         try:
             chapters_paginated = paginator.page(page_number)
@@ -312,6 +390,9 @@ class MangaPage(Page):
             chapters_paginated = paginator.page(1)
         except EmptyPage:
             chapters_paginated = paginator.page(paginator.num_pages)
+        chapters_paginated.object_list = MangaChapterPage.attach_listing_context(
+            materialize(MangaChapterPage, chapters_paginated.object_list), self, get_badge_settings(request),
+        )
         context['chapters'] = chapters_paginated
         is_following_this_manga = False
         current_followers_count = 0
@@ -321,10 +402,6 @@ class MangaPage(Page):
             if Favorite.objects.filter(user=request.user, manga=self).exists():
                 is_following_this_manga = True
         
-        first_chapter_in_current_sort = None
-        if chapters_to_paginate:
-            first_chapter_in_current_sort = chapters_to_paginate[0]
-        
         query_params_desc = request.GET.copy()
         query_params_desc['sort'] = 'desc'; query_params_desc.pop('page', None)
         if search_query_val: query_params_desc['q_chapter'] = search_query_val
@@ -338,14 +415,91 @@ class MangaPage(Page):
         context['sort_url_asc'] = '?' + query_params_asc.urlencode() if query_params_asc else '?sort=asc'
         
         context.update({
-            'chapter_count': len(all_chapters_list) if not search_query_val else len(filtered_list),
-            'last_chapter': self.get_chapters()[0] if self.get_chapters() else None,
+            'chapter_count': paginator.count,
+            'last_chapter': manifest[0] if manifest else None,
             'is_following': is_following_this_manga,
             'followers_count': current_followers_count,
             'related_works': MangaPage.objects.live().public().exclude(pk=self.pk).order_by('?')[:5]
         })
         return context
 
+class WorkViewRing(models.Model):
+    """Anel de contadores horários de views de uma obra (ver `manga.trending`)."""
+    work = models.OneToOneField(MangaPage, on_delete=models.CASCADE, primary_key=True, related_name='view_ring', verbose_name=_("Obra"))
+    counts = models.BinaryField(_("Contadores Horários"), default=b'')
+    head_hour = models.BigIntegerField(_("Hora Mais Recente"), null=True, help_text=_("Horas desde a época (UTC) do balde mais recente."))
+
+    class Meta:
+        verbose_name = _("Anel de Views por Hora")
+        verbose_name_plural = _("Anéis de Views por Hora")
+
+    def __str__(self):
+        return f"Views por hora da obra {self.work_id}"
+
+CHAPTER_SORT_PROLOGUE = -1
+CHAPTER_SORT_EPILOGUE = 2147483646
+CHAPTER_SORT_UNKNOWN = 2147483647
+
+def parse_chapter_sort_key(chapter_number):
+    """
+    Converte o número do capítulo em (parte principal, subparte) inteiros.
+    Prólogos vêm antes de tudo, epílogos depois dos numerados e valores
+    irreconhecíveis ficam no fim.
+    """
+    num_str = str(chapter_number or '').strip().lower()
+    if not num_str:
+        return (CHAPTER_SORT_UNKNOWN, 0)
+    num_str_cleaned = num_str.replace('capitulo', '').replace('cap.', '').replace('ch.', '').strip()
+    match = re.match(r"(\d+)(?:[\.,](\d+))?(.*)", num_str_cleaned)
+    if match:
+        main_part_val = min(int(match.group(1)), CHAPTER_SORT_EPILOGUE - 1)
+        sub_part_val = min(int(match.group(2)), CHAPTER_SORT_UNKNOWN) if match.group(2) else 0
+        return (main_part_val, sub_part_val)
+    if "prólogo" in num_str or "prologue" in num_str:
+        return (CHAPTER_SORT_PROLOGUE, 0)
+    if "epílogo" in num_str or "epilogue" in num_str:
+        return (CHAPTER_SORT_EPILOGUE, 0)
+    return (CHAPTER_SORT_UNKNOWN, 0)
+
+class MangaChapterPageQuerySet(PageQuerySet):
+    def newest_first(self):
+        return self.order_by('-sort_key_main', '-sort_key_sub', '-path')
+
+    def oldest_first(self):
+        return self.order_by('sort_key_main', 'sort_key_sub', 'path')
+
+    def newer_than(self, chapter):
+        main, sub = chapter.sort_key_main, chapter.sort_key_sub
+        return self.filter(
+            Q(sort_key_main__gt=main)
+            | Q(sort_key_main=main, sort_key_sub__gt=sub)
+            | Q(sort_key_main=main, sort_key_sub=sub, path__gt=chapter.path)
+        )
+
+    def locked(self, now=None):
+        return self.filter(vip_unlock_at__gt=now or timezone.now())
+
+    def unlocked(self, now=None):
+        return self.filter(Q(vip_unlock_at__isnull=True) | Q(vip_unlock_at__lte=now or timezone.now()))
+
+    def older_than(self, chapter):
+        main, sub = chapter.sort_key_main, chapter.sort_key_sub
+        return self.filter(
+            Q(sort_key_main__lt=main)
+            | Q(sort_key_main=main, sort_key_sub__lt=sub)
+            | Q(sort_key_main=main, sort_key_sub=sub, path__lt=chapter.path)
+        )
+
+MangaChapterPageManager = PageManager.from_queryset(MangaChapterPageQuerySet)
+
+def read_image_size(data):
+    """Lê largura e altura do cabeçalho da imagem sem decodificar os pixels; (None, None) se não for possível."""
+    try:
+        with PillowImage.open(BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None, None
+
 def chapter_image_upload_path(instance, filename):
     manga_page = instance.page.get_parent().specific
     chapter_page = instance.page.specific
@@ -356,28 +510,185 @@ def chapter_image_upload_path(instance, filename):
         safe_chapter_folder_name = 'cap_extra'
     return f'encrypted_manga_slices/{manga_slug}/{safe_chapter_folder_name}/{filename}'
 
+def slice_blob_path(content_hash, extension='.avif'):
+    """Caminho endereçado pelo conteúdo: a mesma fatia, em qualquer capítulo, vai para o mesmo arquivo."""
+    return f'slice_blobs/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}'
+
+def slice_blob_upload_path(instance, filename):
+    return slice_blob_path(instance.content_hash, Path(filename).suffix or '.avif')
+
+class SliceBlob(models.Model):
+    """
+    Arquivo de fatia compartilhado entre capítulos (créditos, banners, separadores repetidos).
+    `ref_count` conta as referências: cada ChapterImage que aponta para ele, mais as linhas de
+    ingestões em andamento (a referência é tomada quando o blob é criado ou reaproveitado).
+    Sem referências, o arquivo é apagado por `prune`, respeitando SLICE_BLOB_PRUNE_GRACE_HOURS.
+    """
+    content_hash = models.CharField(_("Hash SHA-256 do Conteúdo"), max_length=64, unique=True)
+    file = models.FileField(_("Arquivo"), upload_to=slice_blob_upload_path, max_length=255)
+    width = models.PositiveIntegerField(_("Largura (px)"), null=True, blank=True)
+    height = models.PositiveIntegerField(_("Altura (px)"), null=True, blank=True)
+    byte_size = models.PositiveIntegerField(_("Tamanho (bytes)"), default=0)
+    crc32 = models.PositiveBigIntegerField(_("CRC-32"), null=True, blank=True)
+    variants = models.JSONField(_("Versões Reduzidas"), default=list, blank=True)
+    ref_count = models.PositiveIntegerField(_("Referências"), default=0)
+    source_hash = models.CharField(_("Hash da Imagem de Origem"), max_length=64, blank=True, db_index=True, help_text=_("Permite reaproveitar a codificação quando a mesma imagem de origem é enviada de novo."))
+    source_part = models.PositiveIntegerField(_("Parte da Origem"), default=0)
+    source_parts = models.PositiveIntegerField(_("Total de Partes da Origem"), default=0)
+    source_size = models.PositiveBigIntegerField(_("Tamanho da Origem (bytes)"), null=True, blank=True, db_index=True, help_text=_("Só origens com um tamanho já visto têm o hash calculado antes da codificação."))
+    encoder_profile = models.CharField(_("Perfil de Codificação"), max_length=40, blank=True)
+    created_at = models.DateTimeField(_("Criado em"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Arquivo de Fatia Compartilhado")
+        verbose_name_plural = _("Arquivos de Fatia Compartilhados")
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.ref_count} ref.)"
+
+    def stored_names(self):
+        return [self.file.name] + [v['name'] for v in self.variants or () if v.get('name')]
+
+    @classmethod
+    def for_source(cls, source_hash):
+        """
+        Fatias já codificadas a partir desta origem, na ordem, já com uma referência tomada para
+        cada uma; None (sem tomar nada) se o conjunto estiver incompleto.
+        """
+        with transaction.atomic():
+            blobs = list(cls.objects.select_for_update().filter(source_hash=source_hash).order_by('source_part'))
+            if not blobs or [blob.source_part for blob in blobs] != list(range(blobs[0].source_parts)):
+                return None
+            cls.acquire({blob.pk: 1 for blob in blobs})
+        return blobs
+
+    @classmethod
+    def acquire(cls, counts):
+        """Soma `counts` ({pk: n}) às referências dos arquivos."""
+        for pk, count in counts.items():
+            cls.objects.filter(pk=pk).update(ref_count=F('ref_count') + count)
+
+    @classmethod
+    def release(cls, pk):
+        """Tira uma referência; o arquivo sem referências é apagado depois do commit (passado o prazo de carência)."""
+        cls.objects.filter(pk=pk, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        transaction.on_commit(lambda: cls.prune([pk]))
+
+    @classmethod
+    def prune(cls, pks=None, grace_hours=None):
+        """
+        Apaga os blobs sem referências criados há mais de `grace_hours` (SLICE_BLOB_PRUNE_GRACE_HOURS).
+        Cada blob é apagado com a linha travada, então um upload que o reaproveita ao mesmo tempo
+        espera e, encontrando-o apagado, grava o arquivo de novo.
+        """
+        if grace_hours is None:
+            grace_hours = getattr(settings, 'SLICE_BLOB_PRUNE_GRACE_HOURS', 6)
+        queryset = cls.objects.filter(ref_count=0, created_at__lt=timezone.now() - timezone.timedelta(hours=grace_hours))
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        pruned = 0
+        for pk in list(queryset.values_list('pk', flat=True)):
+            try:
+                with transaction.atomic():
+                    blob = cls.objects.select_for_update().filter(pk=pk, ref_count=0).first()
+                    if blob is None:
+                        continue
+                    for name in blob.stored_names():
+                        try:
+                            blob.file.storage.delete(name)
+                        except OSError as e:
+                            logger.error(f"Erro ao apagar arquivo de fatia compartilhado {name}: {e}")
+                    blob.delete()
+            except models.ProtectedError:
+                logger.error(f"SliceBlob {pk} está sem referências mas ainda tem fatias apontando para ele; rode `prune_slice_blobs --recount`.")
+                continue
+            pruned += 1
+        return pruned
+
+    @classmethod
+    def recount(cls):
+        """
+        Recalcula `ref_count` pelas ChapterImage existentes (corrige referências de ingestões que
+        morreram no meio). Referências de ingestões em andamento somem: rode sem uploads na fila.
+        """
+        from django.db.models import Count
+
+        actual = dict(ChapterImage.objects.filter(blob__isnull=False).values_list('blob').annotate(total=Count('pk')))
+        fixed = 0
+        for pk, ref_count in cls.objects.values_list('pk', 'ref_count'):
+            if actual.get(pk, 0) != ref_count:
+                cls.objects.filter(pk=pk).update(ref_count=actual.get(pk, 0))
+                fixed += 1
+        return fixed
+
 class ChapterImage(Orderable):
     page = ParentalKey('manga.MangaChapterPage', on_delete=models.CASCADE, related_name='chapter_images')
     encrypted_file = models.FileField(upload_to=chapter_image_upload_path, max_length=255, null=True, blank=False, verbose_name=_("Arquivo de Fatia Criptografada (.enc)"), help_text=_("Armazena a fatia da imagem no formato .enc criptografado."))
     original_filename = models.CharField(_("Nome Original do Arquivo"), max_length=255, blank=True)
     caption = models.CharField(_("Legenda (Opcional)"), max_length=255, blank=True)
+    width = models.PositiveIntegerField(_("Largura (px)"), null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(_("Altura (px)"), null=True, blank=True, editable=False)
+    byte_size = models.PositiveIntegerField(_("Tamanho (bytes)"), null=True, blank=True, editable=False)
+    content_hash = models.CharField(_("Hash SHA-256 do Conteúdo"), max_length=64, blank=True, editable=False)
+    crc32 = models.PositiveBigIntegerField(_("CRC-32"), null=True, blank=True, editable=False)
+    variants = models.JSONField(_("Versões Reduzidas"), default=list, blank=True, editable=False, help_text=_("Versões da fatia em larguras menores (width, height, name, byte_size), usadas no srcset do leitor."))
+    encoder_profile = models.CharField(_("Perfil de Codificação"), max_length=40, blank=True, editable=False, help_text=_("Perfil e parâmetros do encoder usados nesta fatia (ex.: adaptativo:s8q60)."))
+    blob = models.ForeignKey(SliceBlob, null=True, blank=True, editable=False, on_delete=models.PROTECT, related_name='chapter_images', verbose_name=_("Arquivo Compartilhado"))
     panels = [FieldPanel('encrypted_file'), FieldPanel('original_filename', read_only=True), FieldPanel('caption')]
+    @classmethod
+    def from_blob(cls, page, blob, original_filename, sort_order):
+        """Monta a fatia apontando para o arquivo compartilhado, copiando os metadados do manifesto."""
+        return cls(
+            page=page,
+            blob=blob,
+            encrypted_file=blob.file.name,
+            original_filename=original_filename,
+            sort_order=sort_order,
+            width=blob.width,
+            height=blob.height,
+            byte_size=blob.byte_size,
+            content_hash=blob.content_hash,
+            crc32=blob.crc32,
+            variants=blob.variants,
+            encoder_profile=blob.encoder_profile,
+        )
+    @property
+    def manifest_entry(self):
+        entry = {'url': self.encrypted_file.url, 'width': self.width, 'height': self.height, 'srcset': ''}
+        if self.variants and self.width:
+            storage = self.encrypted_file.storage
+            candidates = [f"{storage.url(v['name'])} {v['width']}w" for v in sorted(self.variants, key=lambda v: v['width'])]
+            entry['srcset'] = ', '.join(candidates + [f"{entry['url']} {self.width}w"])
+        return entry
+    def stored_names(self):
+        """Nomes no storage dos arquivos exclusivos desta fatia (original e versões reduzidas); vazio se compartilhados."""
+        if self.blob_id:
+            return []
+        names = [self.encrypted_file.name] if self.encrypted_file else []
+        return names + [v['name'] for v in self.variants or () if v.get('name')]
     def decrypt_and_get_data(self) -> bytes | None:
-        if not hasattr(settings, 'CHAVE_MESTRA_IMAGENS') or not settings.CHAVE_MESTRA_IMAGENS:
+        fernet = get_fernet()
+        if fernet is None:
             return None
         if not self.encrypted_file:
             return None
         try:
-            fernet = Fernet(settings.CHAVE_MESTRA_IMAGENS)
-            if hasattr(self.encrypted_file, 'seek') and callable(self.encrypted_file.seek):
-                 self.encrypted_file.seek(0)
             if hasattr(self.encrypted_file, 'is_open') and self.encrypted_file.is_open:
-                encrypted_data = self.encrypted_file.read()
-            else:
-                with self.encrypted_file.open('rb') as f:
-                    encrypted_data = f.read()
-            return fernet.decrypt(encrypted_data)
-        except (InvalidToken, FileNotFoundError, Exception):
+                if hasattr(self.encrypted_file, 'seek') and callable(self.encrypted_file.seek):
+                     self.encrypted_file.seek(0)
+                return decrypt_bytes(self.encrypted_file.read(), fernet=fernet)
+            key = (self.pk, os.path.getmtime(self.encrypted_file.path))
+            return decrypted_slice_cache.get(key, lambda: self._read_and_decrypt(fernet))
+        except (InvalidToken, InvalidTag, SliceFormatError, FileNotFoundError):
+            return None
+        except Exception:
+            logger.exception(f"Erro inesperado ao descriptografar a fatia {self.pk} ({self.encrypted_file.name}).")
+            return None
+    def _read_and_decrypt(self, fernet):
+        try:
+            with self.encrypted_file.open('rb') as f:
+                return decrypt_bytes(f.read(), fernet=fernet)
+        except (InvalidToken, InvalidTag, SliceFormatError, FileNotFoundError):
             return None
     def __str__(self):
         return self.original_filename or f"Fatia Criptografada {self.sort_order if hasattr(self, 'sort_order') else 'N/A'} de {self.page.title if self.page else 'Página Desconhecida'}"
@@ -398,93 +709,51 @@ class MangaChapterPage(Page):
     manual_badge_text = models.CharField(max_length=20, blank=True, verbose_name=_("Texto Manual do Badge (Opcional)"), help_text=_("Texto específico para o badge deste capítulo. Se vazio e 'Forçar Exibição' estiver marcado, usará o texto global."))
     manual_badge_image = models.ForeignKey('wagtailimages.Image', null=True, blank=True, on_delete=models.SET_NULL, related_name='+', verbose_name=_("Imagem/GIF Manual do Badge (Opcional)"), help_text=_("Imagem específica para o badge deste capítulo. Substitui o texto manual e a imagem global se definida."))
     views = models.PositiveIntegerField(_("Visualizações"), default=0, editable=False, help_text=_("Número de vezes que este capítulo foi visualizado."))
+    sort_key_main = models.IntegerField(_("Chave de Ordenação (Principal)"), default=CHAPTER_SORT_UNKNOWN, editable=False)
+    sort_key_sub = models.IntegerField(_("Chave de Ordenação (Subparte)"), default=0, editable=False)
+    vip_unlock_at = models.DateTimeField(_("Liberado para Todos em"), null=True, blank=True, editable=False, db_index=True, help_text=_("Calculado a partir das configurações VIP da obra. Vazio significa capítulo livre."))
+    prev_chapter = models.ForeignKey('self', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+', verbose_name=_("Capítulo Anterior"))
+    next_chapter = models.ForeignKey('self', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+', verbose_name=_("Próximo Capítulo"))
+
+    objects = MangaChapterPageManager()
+
     search_fields = []
     def get_url(self, *args, **kwargs):
-        manga_page = self.get_parent().specific
+        manga_page = getattr(self, 'parent_work', None) or self.get_parent().specific
         return reverse('manga:chapter_reader', kwargs={'manga_slug': manga_page.slug, 'chapter_slug': self.slug})
     @property
     def is_effectively_vip(self):
-        return self.get_vip_status().get('is_blocked', False)
+        return self.vip_unlock_at is not None and self.vip_unlock_at > timezone.now()
     def get_vip_status(self):
         status = {'is_blocked': False, 'unlock_date': None, 'time_remaining': None}
-        parent_manga = self.get_parent().specific
-        if not isinstance(parent_manga, MangaPage):
-            return status
-        if parent_manga.chapters_are_vip:
-            status['is_blocked'] = True
-            return status
-        if not parent_manga.default_chapters_are_vip and not self.is_vip:
-            return status
-        vip_limit = parent_manga.recent_vip_chapters_count
-        if vip_limit <= 0:
-            if self.is_vip: status['is_blocked'] = True
-            return status
-        try:
-            all_chapters = parent_manga.get_chapters()
-            current_chapter_index = -1
-            for i, chap in enumerate(all_chapters):
-                if chap.pk == self.pk:
-                    current_chapter_index = i
-                    break
-            if current_chapter_index == -1 or current_chapter_index >= vip_limit:
-                if self.is_vip: status['is_blocked'] = True
-                return status
-            tier_size = parent_manga.vip_tier_size if parent_manga.vip_tier_size > 0 else 1
-            base_days = parent_manga.vip_base_release_days
-            decrease_days = parent_manga.vip_days_decrease_per_tier
-            tier_index = current_chapter_index // tier_size
-            wait_days = base_days - (tier_index * decrease_days)
-            wait_days = max(0, wait_days)
-            if wait_days == 0:
-                return status
-            release_date = self.release_date_or_published
-            if not release_date:
-                status['is_blocked'] = True
-                return status
-            unlock_date = release_date + timezone.timedelta(days=wait_days)
-            now = timezone.now()
-            if now < unlock_date:
-                status['is_blocked'] = True
-                status['unlock_date'] = unlock_date
-                status['time_remaining'] = unlock_date - now
-            return status
-        except Exception:
-            if self.is_vip or parent_manga.default_chapters_are_vip: status['is_blocked'] = True
+        unlock_at = self.vip_unlock_at
+        now = timezone.now()
+        if unlock_at is None or unlock_at <= now:
             return status
+        status['is_blocked'] = True
+        if unlock_at < VIP_LOCKED_INDEFINITELY:
+            status['unlock_date'] = unlock_at
+            status['time_remaining'] = unlock_at - now
+        return status
     @property
     def display_views(self):
-        return self.views
+        return view_counter.display_value(self, 'views')
     def _get_numerical_sort_key(self):
-        num_str = str(self.chapter_number).strip().lower()
-        if not num_str: return (float('inf'), float('inf'))
-        num_str_cleaned = num_str.replace('capitulo', '').replace('cap.', '').replace('ch.', '').strip()
-        match = re.match(r"(\d+)(?:[\.,](\d+))?(.*)", num_str_cleaned)
-        if match:
-            try:
-                main_part_val = int(match.group(1))
-                sub_part_val = int(match.group(2)) if match.group(2) else 0
-                return (main_part_val, sub_part_val)
-            except (ValueError, TypeError):
-                return (float('inf'), self.chapter_number.lower())
-        else:
-            if "prólogo" in num_str or "prologue" in num_str: return (float('-inf'), 0)
-            if "epílogo" in num_str or "epilogue" in num_str: return (float('inf'), float('inf')-1)
-            return (float('inf'), self.chapter_number.lower())
-    @property
+        return (self.sort_key_main, self.sort_key_sub)
+    @cached_property
     def get_thumbnail(self):
         if self.thumbnail and hasattr(self.thumbnail, 'url'):
             return self.thumbnail
-        parent_page = self.get_parent().specific if self.get_parent() else None
+        # Listas de capítulos anexam a obra e as configurações já resolvidas (attach_listing_context).
+        parent_page = getattr(self, 'parent_work', None)
+        if parent_page is None:
+            parent_page = self.get_parent().specific if self.get_parent() else None
         if isinstance(parent_page, MangaPage) and parent_page.cover:
             return parent_page.cover
-        if GlobalSettings:
-            try:
-                site_settings = GlobalSettings.for_site(self.get_site()) if hasattr(GlobalSettings, 'for_site') and self.get_site() else GlobalSettings.objects.first()
-                if site_settings and hasattr(site_settings, 'logo') and site_settings.logo:
-                    return site_settings.logo
-            except Exception:
-                pass
-        return None
+        try:
+            return (getattr(self, 'badge_settings', None) or get_badge_settings()).logo
+        except Exception:
+            return None
     @property
     def is_wagtail_thumbnail(self):
         thumb = self.get_thumbnail
@@ -493,15 +762,17 @@ class MangaChapterPage(Page):
     def is_standard_thumbnail(self):
         thumb = self.get_thumbnail
         return thumb and hasattr(thumb, 'url') and not isinstance(thumb, WagtailImage)
-    def get_badge_info(self):
+    @staticmethod
+    def attach_listing_context(chapters, parent_work, badge_settings):
+        """Anexa a obra e as BadgeSettings da requisição a cada capítulo de uma lista (sem consulta por capítulo)."""
+        for chapter in chapters:
+            chapter.parent_work = parent_work
+            chapter.badge_settings = badge_settings
+        return chapters
+    def get_badge_info(self, badge_settings=None):
         badge_info = {'show': False, 'text': '', 'image_url': None}
-        gs = None
-        if GlobalSettings:
-            try:
-                current_site = self.get_site()
-                gs = GlobalSettings.for_site(current_site) if current_site and hasattr(GlobalSettings, 'for_site') else GlobalSettings.objects.first()
-            except Exception:
-                gs = GlobalSettings.objects.first() if GlobalSettings.objects.exists() else None
+        if badge_settings is None:
+            badge_settings = getattr(self, 'badge_settings', None) or get_badge_settings()
         if self.override_new_badge_settings:
             if self.force_show_new_badge:
                 badge_info['show'] = True
@@ -509,36 +780,20 @@ class MangaChapterPage(Page):
                     badge_info['image_url'] = self.manual_badge_image.get_rendition('original').url
                 elif self.manual_badge_text:
                     badge_info['text'] = self.manual_badge_text
-                elif gs and hasattr(gs, 'new_chapter_badge_image') and gs.new_chapter_badge_image:
-                    badge_info['image_url'] = gs.new_chapter_badge_image.get_rendition('original').url
-                elif gs and hasattr(gs, 'new_chapter_badge_text') and gs.new_chapter_badge_text:
-                    badge_info['text'] = gs.new_chapter_badge_text
-                elif not badge_info['image_url'] and not badge_info['text']:
-                    badge_info['text'] = _("NOVO!") 
+                elif badge_settings.image_url:
+                    badge_info['image_url'] = badge_settings.image_url
+                else:
+                    badge_info['text'] = badge_settings.text
             return badge_info
         if not self.release_date_or_published:
             return badge_info
-        days_limit = 2
-        global_badge_text_to_use = _("NOVO!")
-        global_badge_image_url_to_use = None
-        if gs:
-            if hasattr(gs, 'new_chapter_days_threshold') and gs.new_chapter_days_threshold is not None:
-                days_limit = gs.new_chapter_days_threshold
-            if hasattr(gs, 'new_chapter_badge_text') and gs.new_chapter_badge_text:
-                global_badge_text_to_use = gs.new_chapter_badge_text
-            if hasattr(gs, 'new_chapter_badge_image') and gs.new_chapter_badge_image:
-                try:
-                    global_badge_image_url_to_use = gs.new_chapter_badge_image.get_rendition('original').url
-                except Exception:
-                    global_badge_image_url_to_use = None
-        time_threshold = timezone.now() - timezone.timedelta(days=days_limit)
+        time_threshold = timezone.now() - timezone.timedelta(days=badge_settings.days_threshold)
         if self.release_date_or_published > time_threshold:
-            if global_badge_image_url_to_use or global_badge_text_to_use:
-                badge_info['show'] = True
-                if global_badge_image_url_to_use:
-                    badge_info['image_url'] = global_badge_image_url_to_use
-                elif global_badge_text_to_use: 
-                    badge_info['text'] = global_badge_text_to_use
+            badge_info['show'] = True
+            if badge_settings.image_url:
+                badge_info['image_url'] = badge_settings.image_url
+            else:
+                badge_info['text'] = badge_settings.text
         return badge_info
     content_panels = Page.content_panels + [
         FieldRowPanel([FieldPanel('chapter_number', classname="col8"), FieldPanel('is_vip', classname="col4")]),
@@ -565,6 +820,9 @@ class MangaChapterPage(Page):
         verbose_name = _("Página de Capítulo")
         verbose_name_plural = _("Páginas de Capítulo")
         ordering = ['-release_date', '-path']
+        indexes = [
+            models.Index(fields=['sort_key_main', 'sort_key_sub'], name='manga_chapter_sort_key_idx'),
+        ]
     def save(self, *args, **kwargs):
         parent_page = self.get_parent().specific
         if self.pk is None and parent_page and hasattr(parent_page, 'default_chapters_are_vip'):
@@ -583,49 +841,39 @@ class MangaChapterPage(Page):
                 self.slug = new_slug if new_slug else f"cap-{timezone.now().strftime('%Y%m%d%H%M%S%f')}"
         elif not self.slug:
             self.slug = f"capitulo-sem-numero-{timezone.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.sort_key_main, self.sort_key_sub = parse_chapter_sort_key(self.chapter_number)
         super().save(*args, **kwargs)
     @property
     def release_date_or_published(self):
         return self.release_date or self.first_published_at
+    def with_content_json(self, content):
+        obj = super().with_content_json(content)
+        obj.vip_unlock_at = self.vip_unlock_at
+        obj.prev_chapter_id = self.prev_chapter_id
+        obj.next_chapter_id = self.next_chapter_id
+        return obj
+    def find_live_neighbours(self):
+        """(anterior, próximo) entre os capítulos irmãos no ar, pela chave de ordenação; usado para regravar os links."""
+        siblings = MangaChapterPage.objects.sibling_of(self, inclusive=False).live().public()
+        previous_id = siblings.older_than(self).newest_first().values_list('pk', flat=True).first()
+        next_id = siblings.newer_than(self).oldest_first().values_list('pk', flat=True).first()
+        return previous_id, next_id
     def get_context(self, request, *args, **kwargs):
+        parent_page = self.get_parent().specific if self.get_parent() else None
         if request.user.is_authenticated:
-            ReadingHistory.objects.update_or_create(user=request.user, chapter=self)
+            reading_history.record(request.user, self, manga=parent_page)
         if request.user and not request.user.is_superuser and not request.user.is_staff:
-            MangaChapterPage.objects.filter(pk=self.pk).update(views=F('views') + 1)
-            self.refresh_from_db(fields=['views'])
+            view_counter.increment(self, 'views')
+            if parent_page:
+                unique_readers.add(self, parent_page, request)
         context = super().get_context(request, *args, **kwargs)
-        context['current_chapter_views'] = self.views 
-        parent_page = self.get_parent().specific if self.get_parent() else None
-        next_chapter_direct = None
-        prev_chapter_direct = None
-        if isinstance(parent_page, MangaPage):
-            all_siblings_qs = MangaChapterPage.objects.live().public().child_of(parent_page).specific()
-            ordered_siblings_for_nav = sorted(
-                list(all_siblings_qs),
-                 key=lambda chap: (
-                    chap._get_numerical_sort_key(),
-                    -(chap.release_date_or_published or timezone.datetime.min.replace(tzinfo=timezone.utc)).timestamp() if chap.release_date_or_published else float('-inf'),
-                    chap.title.lower()
-                )
-            )
-            current_idx_direct = -1
-            for i, s_chap in enumerate(ordered_siblings_for_nav):
-                if s_chap.pk == self.pk:
-                    current_idx_direct = i
-                    break
-            if current_idx_direct != -1:
-                if current_idx_direct < len(ordered_siblings_for_nav) - 1:
-                    next_chapter_direct = ordered_siblings_for_nav[current_idx_direct + 1]
-                if current_idx_direct > 0:
-                    prev_chapter_direct = ordered_siblings_for_nav[current_idx_direct - 1]
-        else:
-            pass
+        context['current_chapter_views'] = self.display_views
         context.update({
             'manga': parent_page,
             'chapter': self,
             'chapter_image_ids': list(self.chapter_images.values_list('id', flat=True).order_by('sort_order')),
-            'next_chapter': next_chapter_direct,
-            'prev_chapter': prev_chapter_direct,
+            'next_chapter': self.next_chapter,
+            'prev_chapter': self.prev_chapter,
             'release_date_display': self.release_date_or_published,
         })
         return context
@@ -669,13 +917,87 @@ class Favorite(models.Model):
 class ReadingHistory(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reading_history', verbose_name=_("Usuário"))
     chapter = models.ForeignKey('manga.MangaChapterPage', on_delete=models.CASCADE, related_name='read_by_users', verbose_name=_("Capítulo Lido"))
-    read_at = models.DateTimeField(_("Lido em"), auto_now=True, db_index=True)
+    manga = models.ForeignKey('manga.MangaPage', on_delete=models.CASCADE, null=True, editable=False, related_name='+', verbose_name=_("Obra"))
+    read_at = models.DateTimeField(_("Lido em"), default=timezone.now, db_index=True)
     class Meta:
         unique_together = ('user', 'chapter')
+        indexes = [models.Index(fields=['user', 'read_at'], name='manga_history_user_read_idx')]
         ordering = ['-read_at']
         verbose_name = _("Registro de Histórico")
         verbose_name_plural = _("Registros de Histórico")
     def __str__(self):
         user_name = self.user.get_username() if self.user else "Usuário Desconhecido"
         chapter_title = self.chapter.title if self.chapter else "Capítulo Desconhecido"
-        return f"{user_name} leu '{chapter_title}'"
\ No newline at end of file
+        return f"{user_name} leu '{chapter_title}'"
+class IngestJobStatus(models.TextChoices):
+    PENDING = 'pending', _('Na fila')
+    RUNNING = 'running', _('Processando')
+    DONE = 'done', _('Concluído')
+    FAILED = 'failed', _('Falhou')
+
+class IngestJobKind(models.TextChoices):
+    ZIP = 'zip', _('ZIP com pastas de capítulos')
+    FOLDER = 'folder', _('Pasta de um capítulo')
+    AVIF_ZIP = 'avif_zip', _('ZIP de um capítulo com AVIF prontos')
+
+class ChapterIngestJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    manga = models.ForeignKey('manga.MangaPage', on_delete=models.CASCADE, related_name='ingest_jobs', verbose_name=_("Obra"))
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name=_("Enviado por"))
+    kind = models.CharField(_("Tipo"), max_length=10, choices=IngestJobKind.choices)
+    encoder_profile = models.CharField(_("Perfil de Codificação"), max_length=20, blank=True, choices=ENCODER_PROFILE_CHOICES, help_text=_("Vazio usa o perfil definido nas configurações globais."))
+    chapter_number = models.CharField(_("Número do Capítulo"), max_length=50, blank=True)
+    upload_dir = models.CharField(_("Pasta do Upload"), max_length=500, help_text=_("Caminho relativo ao MEDIA_ROOT com os arquivos enviados aguardando processamento."))
+    status = models.CharField(_("Status"), max_length=10, choices=IngestJobStatus.choices, default=IngestJobStatus.PENDING, db_index=True)
+    images_total = models.PositiveIntegerField(_("Imagens no Envio"), default=0)
+    images_done = models.PositiveIntegerField(_("Imagens Processadas"), default=0)
+    slices_done = models.PositiveIntegerField(_("Fatias Geradas"), default=0)
+    errors = models.JSONField(_("Erros"), default=list, blank=True)
+    log = models.JSONField(_("Mensagens"), default=list, blank=True)
+    result_url = models.CharField(_("URL do Resultado"), max_length=500, blank=True)
+    encode_report = models.JSONField(_("Relatório de Codificação"), null=True, blank=True)
+    created_at = models.DateTimeField(_("Criado em"), auto_now_add=True)
+    started_at = models.DateTimeField(_("Iniciado em"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("Finalizado em"), null=True, blank=True)
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _("Processamento de Upload")
+        verbose_name_plural = _("Processamentos de Upload")
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.manga} ({self.get_status_display()})"
+    def record_progress(self, images=0, slices=0, error=None):
+        """Avança os contadores com UPDATE atômico, para o endpoint de progresso ver o andamento durante a codificação."""
+        ChapterIngestJob.objects.filter(pk=self.pk).update(images_done=F('images_done') + images, slices_done=F('slices_done') + slices)
+        self.images_done += images
+        self.slices_done += slices
+        if error:
+            self.errors.append(error)
+            ChapterIngestJob.objects.filter(pk=self.pk).update(errors=self.errors)
+    def set_images_total(self, total):
+        self.images_total = total
+        ChapterIngestJob.objects.filter(pk=self.pk).update(images_total=total)
+    def progress_callback(self):
+        def on_progress(original_filename, slices, error):
+            self.record_progress(images=1, slices=slices, error=f"{original_filename}: {error}" if error else None)
+        return on_progress
+    def add_encode_report(self, label, report):
+        reports = self.encode_report or {}
+        reports[str(label)] = report.summary()
+        self.encode_report = reports
+        ChapterIngestJob.objects.filter(pk=self.pk).update(encode_report=reports)
+    def as_progress_dict(self):
+        return {
+            'job_id': str(self.pk),
+            'status': self.status,
+            'status_display': str(self.get_status_display()),
+            'images_total': self.images_total,
+            'images_done': self.images_done,
+            'slices_done': self.slices_done,
+            'errors': self.errors,
+            'messages': self.log,
+            'result_url': self.result_url,
+            'encode_report': self.encode_report,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
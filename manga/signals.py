@@ -5,27 +5,39 @@ import logging
 import math
 import datetime
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
-from wagtail.signals import page_published
+from wagtail.signals import page_published, page_unpublished, post_page_move
 from wagtail.models import Site
 
 from allauth.socialaccount.models import SocialAccount
 
 from .models import (
-    GlobalSettings, MangaChapterPage, MangaPage, Favorite, ChapterImage
+    GlobalSettings, MangaChapterPage, MangaPage, Favorite, ChapterImage, SliceBlob, ReadingHistory
 )
 
+from core.counters import view_counter
+from home.models import ReleaseEvent
+
 from .bot_utils import send_role_update_to_bot
+from .manifest import bump_chapters_version, link_chapters, relink_chapter, unlink_chapter
+from .trending import record_work_views
 
 logger = logging.getLogger(__name__)
 
+view_counter.add_listener(record_work_views)
+
 @receiver(post_delete, sender=ChapterImage)
 def delete_page_image_on_delete(sender, instance, **kwargs):
     """
     Deleta o arquivo de imagem criptografada de uma ChapterImage
-    quando o objeto é deletado do banco de dados.
+    quando o objeto é deletado do banco de dados. Fatias em arquivo compartilhado
+    (SliceBlob) só liberam a referência; o arquivo sai quando ninguém mais o usa.
     """
+    if instance.blob_id:
+        SliceBlob.release(instance.blob_id)
+        return
     if instance.encrypted_file:
         if hasattr(instance.encrypted_file, 'path') and os.path.isfile(instance.encrypted_file.path):
             try:
@@ -33,6 +45,11 @@ def delete_page_image_on_delete(sender, instance, **kwargs):
                 logger.info(f"Arquivo de página deletado do disco: {instance.encrypted_file.path}")
             except OSError as e:
                 logger.error(f"Erro ao deletar arquivo de página {instance.encrypted_file.path}: {e}")
+    for variant in instance.variants or ():
+        try:
+            default_storage.delete(variant['name'])
+        except (KeyError, OSError) as e:
+            logger.error(f"Erro ao deletar versão reduzida da página {instance.pk}: {e}")
 
 @receiver(post_delete, sender=MangaChapterPage)
 def delete_chapter_assets_on_delete(sender, instance, **kwargs):
@@ -81,6 +98,37 @@ def delete_chapter_assets_on_delete(sender, instance, **kwargs):
         except OSError as e:
             logger.error(f"Erro ao tentar deletar a pasta de thumbnail {thumb_directory}: {e}")
 
+def on_chapter_list_changed(chapter):
+    """Atualiza os dados denormalizados da obra (cronograma VIP, manifesto) quando a lista de capítulos no ar muda."""
+    try:
+        manga_page = MangaPage.objects.filter(path=chapter.path[:-MangaPage.steplen]).first()
+        if manga_page:
+            manga_page.refresh_vip_schedule()
+            bump_chapters_version(manga_page)
+    except Exception as e:
+        logger.error(f"Erro ao atualizar os dados da obra do capítulo {chapter.pk}: {e}")
+
+@receiver(page_unpublished, sender=MangaChapterPage)
+def on_chapter_unpublish(sender, instance, **kwargs):
+    unlink_chapter(instance)
+    on_chapter_list_changed(instance)
+
+@receiver(post_delete, sender=MangaChapterPage)
+def refresh_chapter_list_on_chapter_delete(sender, instance, **kwargs):
+    link_chapters(MangaChapterPage, *instance.find_live_neighbours())
+    on_chapter_list_changed(instance)
+
+@receiver(post_page_move, sender=MangaChapterPage)
+def update_history_on_chapter_move(sender, instance, parent_page_before, parent_page_after, **kwargs):
+    """Capítulo movido para outra obra: o histórico de leitura guarda a obra denormalizada e precisa acompanhar."""
+    if parent_page_before.pk == parent_page_after.pk:
+        return
+    try:
+        updated = ReadingHistory.objects.filter(chapter_id=instance.pk).update(manga_id=parent_page_after.pk)
+        logger.info(f"Capítulo {instance.pk} movido para a obra {parent_page_after.pk}: {updated} registro(s) de histórico atualizados.")
+    except Exception as e:
+        logger.error(f"Erro ao atualizar o histórico de leitura do capítulo movido {instance.pk}: {e}")
+
 @receiver(post_delete, sender=MangaPage)
 def delete_manga_cover_on_delete(sender, instance, **kwargs):
     """
@@ -101,6 +149,12 @@ def on_chapter_publish(sender, instance, **kwargs):
     """
     logger.info(f"Sinal 'page_published' acionado para o capítulo: '{instance.title}' (ID: {instance.id})")
     
+    try:
+        ReleaseEvent.record(instance, 'manga')
+    except Exception as e:
+        logger.error(f"Erro ao registrar o lançamento do capítulo {instance.pk}: {e}")
+    relink_chapter(instance)
+    on_chapter_list_changed(instance)
     purge_cloudflare_cache(instance)
     notify_discord(instance)
 
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+
+
+@lru_cache(maxsize=4)
+def _fernet_for_key(key):
+    return Fernet(key)
+
+
+def get_fernet():
+    """Instância de Fernet reaproveitada por processo para CHAVE_MESTRA_IMAGENS (None se a chave não estiver configurada)."""
+    key = getattr(settings, 'CHAVE_MESTRA_IMAGENS', None)
+    if not key:
+        return None
+    return _fernet_for_key(key)
+
+
+class DecryptedSliceCache:
+    """
+    LRU por processo das fatias já descriptografadas, limitado pelo total de bytes.
+    A chave é (id da fatia, mtime do arquivo), então regravar o .enc invalida a entrada.
+    Fatias maiores que SLICE_DECRYPT_CACHE_MAX_ITEM_BYTES não entram no cache.
+    """
+
+    def __init__(self, max_bytes=None, max_item_bytes=None):
+        self._max_bytes = max_bytes
+        self._max_item_bytes = max_item_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, 'SLICE_DECRYPT_CACHE_BYTES', 64 * 1024 * 1024)
+
+    @property
+    def max_item_bytes(self):
+        if self._max_item_bytes is not None:
+            return self._max_item_bytes
+        return getattr(settings, 'SLICE_DECRYPT_CACHE_MAX_ITEM_BYTES', 4 * 1024 * 1024)
+
+    def get(self, key, loader):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = loader()
+        if data is None:
+            return None
+        size = len(data)
+        if size > self.max_item_bytes or size > self.max_bytes:
+            return data
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+            self._entries[key] = data
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _key, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+decrypted_slice_cache = DecryptedSliceCache()
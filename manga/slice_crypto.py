@@ -0,0 +1,115 @@
+"""
+Formato em blocos (AES-256-GCM) das fatias criptografadas.
+
+    cabeçalho: MAGIC (4) | versão (1) | tamanho do bloco (4) | tamanho do texto claro (8) | prefixo do nonce (8)
+    blocos:    ciphertext + tag (16) de cada bloco de até `tamanho do bloco` bytes
+
+O nonce de cada bloco é o prefixo aleatório seguido do índice do bloco (4 bytes) e o
+cabeçalho + índice entram como dados autenticados, então trocar, truncar ou reordenar
+blocos falha na verificação. Como todos os blocos têm o mesmo tamanho (exceto o último),
+um Range decifra só os blocos que cobrem o intervalo pedido.
+"""
+import base64
+import os
+import struct
+from io import BytesIO
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from django.conf import settings
+
+from .slice_cache import get_fernet
+
+MAGIC = b'ASG1'
+VERSION = 1
+HEADER = struct.Struct('>4sBIQ8s')
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_aead_cache = {}
+
+
+class SliceFormatError(ValueError):
+    pass
+
+
+def get_aead():
+    """AESGCM derivado (HKDF-SHA256) de CHAVE_MESTRA_IMAGENS; None se a chave não estiver configurada."""
+    master_key = getattr(settings, 'CHAVE_MESTRA_IMAGENS', None)
+    if not master_key:
+        return None
+    aead = _aead_cache.get(master_key)
+    if aead is None:
+        raw_key = base64.urlsafe_b64decode(master_key)
+        derived = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'astratoons-slice-aes-gcm-v1').derive(raw_key)
+        aead = _aead_cache[master_key] = AESGCM(derived)
+    return aead
+
+
+def is_chunked(prefix):
+    return prefix[:len(MAGIC)] == MAGIC
+
+
+def _chunk_aad(header, index):
+    return header + struct.pack('>I', index)
+
+
+def _nonce(nonce_prefix, index):
+    return nonce_prefix + struct.pack('>I', index)
+
+
+def encrypt_bytes(data, chunk_size=None, aead=None):
+    aead = aead or get_aead()
+    chunk_size = chunk_size or getattr(settings, 'SLICE_ENCRYPTION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    nonce_prefix = os.urandom(8)
+    header = HEADER.pack(MAGIC, VERSION, chunk_size, len(data), nonce_prefix)
+    parts = [header]
+    for index, offset in enumerate(range(0, len(data), chunk_size)):
+        parts.append(aead.encrypt(_nonce(nonce_prefix, index), data[offset:offset + chunk_size], _chunk_aad(header, index)))
+    return b''.join(parts)
+
+
+class ChunkedSliceReader:
+    """Leitura com acesso aleatório de um arquivo no formato em blocos já aberto em modo binário."""
+
+    def __init__(self, fileobj, aead=None):
+        self.fileobj = fileobj
+        self.aead = aead or get_aead()
+        self.fileobj.seek(0)
+        self.header = self.fileobj.read(HEADER.size)
+        if len(self.header) != HEADER.size:
+            raise SliceFormatError("Cabeçalho incompleto.")
+        magic, version, self.chunk_size, self.size, self.nonce_prefix = HEADER.unpack(self.header)
+        if magic != MAGIC or version != VERSION or not self.chunk_size:
+            raise SliceFormatError("Formato de fatia desconhecido.")
+
+    @property
+    def chunk_count(self):
+        return (self.size + self.chunk_size - 1) // self.chunk_size
+
+    def read_chunk(self, index):
+        plain_length = min(self.chunk_size, self.size - index * self.chunk_size)
+        self.fileobj.seek(HEADER.size + index * (self.chunk_size + TAG_SIZE))
+        sealed = self.fileobj.read(plain_length + TAG_SIZE)
+        return self.aead.decrypt(_nonce(self.nonce_prefix, index), sealed, _chunk_aad(self.header, index))
+
+    def iter_range(self, start=0, end=None):
+        """Texto claro dos bytes [start, end] (inclusivos), decifrando apenas os blocos necessários."""
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        if self.size == 0 or start > end:
+            return
+        for index in range(start // self.chunk_size, end // self.chunk_size + 1):
+            chunk = self.read_chunk(index)
+            chunk_start = index * self.chunk_size
+            yield chunk[max(start - chunk_start, 0):end - chunk_start + 1]
+
+    def read_all(self):
+        return b''.join(self.iter_range())
+
+
+def decrypt_bytes(data, fernet=None, aead=None):
+    """Decifra o conteúdo de um .enc em qualquer um dos dois formatos (blocos AES-GCM ou token Fernet)."""
+    if is_chunked(data):
+        return ChunkedSliceReader(BytesIO(data), aead=aead).read_all()
+    return (fernet or get_fernet()).decrypt(data)
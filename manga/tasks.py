@@ -0,0 +1,220 @@
+import logging
+import os
+import shutil
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from django_tasks import task
+from PIL import Image as PillowImage
+
+from .encoder_profiles import choose_params, get_profile_names, get_save_params
+from .ingest import ChapterSliceWriter, EncodedImage, EncodedPart, SourceRef, commit_chapter_slices, encode_images, stage_upload
+from .models import ChapterIngestJob, IngestJobKind, IngestJobStatus, MangaChapterPage
+from .utils import process_manga_zip
+
+logger = logging.getLogger(__name__)
+
+# Backend dedicado (DatabaseBackend, processado por `manage.py db_worker --backend ingest`);
+# sem ele, cai no backend padrão, que executa a tarefa na hora.
+INGEST_TASK_BACKEND = 'ingest' if 'ingest' in getattr(settings, 'TASKS', {}) else 'default'
+
+
+def enqueue_ingest_job(manga, owner, kind, uploads, chapter_number='', thumbnail=None, encoder_profile=''):
+    """Guarda os arquivos enviados, cria o job e o coloca na fila. A requisição HTTP não codifica nada."""
+    if encoder_profile not in get_profile_names():
+        encoder_profile = ''
+    job = ChapterIngestJob(manga=manga, owner=owner, kind=kind, chapter_number=chapter_number or '', encoder_profile=encoder_profile)
+    job.upload_dir = f"ingest_uploads/{job.pk}"
+    subdir = 'pages' if kind == IngestJobKind.FOLDER else ''
+    for uploaded_file in uploads:
+        stage_upload(job.upload_dir, uploaded_file, subdir)
+    if thumbnail:
+        stage_upload(job.upload_dir, thumbnail, 'thumbnail')
+    job.save()
+    run_chapter_ingest.enqueue(str(job.pk))
+    return job
+
+
+def _list_upload(job, subdir=''):
+    path = os.path.join(job.upload_dir, subdir)
+    if not default_storage.exists(path):
+        return []
+    return [os.path.join(path, name) for name in sorted(default_storage.listdir(path)[1])]
+
+
+def _run_zip_job(job):
+    zip_names = [name for name in _list_upload(job) if name.lower().endswith('.zip')]
+    if not zip_names:
+        raise FileNotFoundError("Arquivo ZIP do envio não encontrado.")
+    with default_storage.open(zip_names[0], 'rb') as zip_file_obj:
+        success, processing_messages = process_manga_zip(job.manga, zip_file_obj, job.owner, job=job)
+    job.log = [[messages.DEFAULT_TAGS.get(level, 'info'), str(msg)] for level, msg in processing_messages]
+    job.result_url = reverse('wagtailadmin_explore', args=[job.manga_id])
+    return success and not any(level == messages.ERROR for level, _msg in processing_messages)
+
+
+def _run_folder_job(job):
+    manga_page = job.manga
+    chapter_number = job.chapter_number
+    page_files = _list_upload(job, 'pages')
+    thumbnail_files = _list_upload(job, 'thumbnail')
+    job.set_images_total(len(page_files))
+    save_params = get_save_params(job.encoder_profile)
+
+    chapter_page = MangaChapterPage.objects.child_of(manga_page).filter(chapter_number=chapter_number).first()
+    if chapter_page:
+        # Só apaga a thumb se uma NOVA for enviada.
+        if thumbnail_files and chapter_page.thumbnail:
+            chapter_page.thumbnail.delete(save=False)
+    else:
+        chapter_page = MangaChapterPage(
+            title=f"{manga_page.title} - Capítulo {chapter_number}",
+            chapter_number=chapter_number,
+            owner=job.owner,
+            live=False,
+        )
+        manga_page.add_child(instance=chapter_page)
+
+    if thumbnail_files:
+        thumb_name = thumbnail_files[0]
+        try:
+            with default_storage.open(thumb_name, 'rb') as f:
+                thumb_img = PillowImage.open(f).convert("RGB")
+            buffer = BytesIO()
+            thumb_img.save(buffer, **choose_params(save_params, thumb_img)[0])
+            chapter_page.thumbnail.save(Path(thumb_name).with_suffix('.avif').name, ContentFile(buffer.getvalue()), save=False)
+        except Exception as e:
+            logger.error(f"Erro ao converter a thumbnail para AVIF: {e}")
+            with default_storage.open(thumb_name, 'rb') as f:
+                chapter_page.thumbnail.save(os.path.basename(thumb_name), File(f), save=False)
+
+    writer = ChapterSliceWriter(chapter_page)
+    try:
+        report = encode_images(
+            (SourceRef(os.path.basename(name), path=default_storage.path(name)) for name in page_files),
+            save_params=save_params, on_progress=job.progress_callback(), on_image=writer, reuse=writer.reuse, might_reuse=writer.might_reuse,
+        )
+        job.add_encode_report(chapter_number, report)
+        rows = writer.rows
+        commit_chapter_slices(chapter_page, rows, publish=True, user=job.owner)
+    except Exception:
+        writer.discard()
+        raise
+
+    job.result_url = chapter_page.get_url() or ''
+    job.log = [['success', f'Capítulo {chapter_number} processado com {len(rows)} imagens finais.']]
+    return True
+
+
+def _run_avif_zip_job(job):
+    """ZIP de um capítulo com as fatias já em AVIF: cada membro é lido do ZIP e gravado sem recodificar."""
+    zip_names = [name for name in _list_upload(job) if name.lower().endswith('.zip')]
+    if not zip_names:
+        raise FileNotFoundError("Arquivo ZIP do envio não encontrado.")
+    manga_page = job.manga
+    chapter_number = job.chapter_number
+    thumbnail_files = _list_upload(job, 'thumbnail')
+
+    chapter_page = MangaChapterPage.objects.child_of(manga_page).filter(chapter_number=chapter_number).first()
+    if chapter_page:
+        if thumbnail_files and chapter_page.thumbnail:
+            chapter_page.thumbnail.delete(save=False)
+    else:
+        chapter_page = MangaChapterPage(
+            title=f"{manga_page.title} - Capítulo {chapter_number}",
+            chapter_number=chapter_number,
+            owner=job.owner,
+            is_vip=manga_page.default_chapters_are_vip,
+            live=False,
+        )
+        manga_page.add_child(instance=chapter_page)
+
+    if thumbnail_files:
+        thumb_name = thumbnail_files[0]
+        with default_storage.open(thumb_name, 'rb') as f:
+            chapter_page.thumbnail.save(os.path.basename(thumb_name), File(f), save=False)
+
+    writer = ChapterSliceWriter(chapter_page)
+    try:
+        with default_storage.open(zip_names[0], 'rb') as zip_file_obj, zipfile.ZipFile(zip_file_obj) as zipf:
+            members = sorted(
+                name for name in zipf.namelist()
+                if not name.startswith('__MACOSX/') and not name.endswith('/') and name.lower().endswith('.avif')
+            )
+            job.set_images_total(len(members))
+            for name in members:
+                # Um membro por vez na memória; o arquivo do envio continua no disco.
+                with zipf.open(name) as member:
+                    data = member.read()
+                writer(EncodedImage(os.path.basename(name), (EncodedPart(data, None, None),)))
+                job.record_progress(images=1, slices=1)
+        rows = writer.rows
+        commit_chapter_slices(chapter_page, rows, publish=True, user=job.owner)
+    except Exception:
+        writer.discard()
+        raise
+
+    job.result_url = chapter_page.get_url() or ''
+    job.log = [['success', f'Capítulo {chapter_number} processado com {len(rows)} imagens AVIF.']]
+    return True
+
+
+_JOB_RUNNERS = {
+    IngestJobKind.ZIP: _run_zip_job,
+    IngestJobKind.FOLDER: _run_folder_job,
+    IngestJobKind.AVIF_ZIP: _run_avif_zip_job,
+}
+
+
+@task(backend=INGEST_TASK_BACKEND)
+def run_chapter_ingest(job_id):
+    try:
+        job = ChapterIngestJob.objects.select_related('manga', 'owner').get(pk=job_id)
+    except ChapterIngestJob.DoesNotExist:
+        logger.warning(f"Ingestão: job {job_id} não existe mais.")
+        return
+    if job.status != IngestJobStatus.PENDING:
+        return
+
+    job.status = IngestJobStatus.RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+    try:
+        runner = _JOB_RUNNERS[job.kind]
+        job.status = IngestJobStatus.DONE if runner(job) else IngestJobStatus.FAILED
+    except Exception as e:
+        logger.exception(f"Ingestão: falha no job {job.pk}: {e}")
+        job.status = IngestJobStatus.FAILED
+        job.errors.append(str(e))
+    finally:
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at', 'errors', 'log', 'result_url'])
+        # Envios de jobs que falharam ficam no disco para `retry_ingest_jobs`; `cleanup_ingest_uploads` os apaga depois.
+        if job.status == IngestJobStatus.DONE:
+            delete_upload(job)
+
+
+def delete_upload(job):
+    shutil.rmtree(default_storage.path(job.upload_dir), ignore_errors=True)
+
+
+def retry_ingest_job(job):
+    """Recoloca na fila um job que falhou, reaproveitando os arquivos enviados; retorna False se não houver o que reprocessar."""
+    if job.status != IngestJobStatus.FAILED or not default_storage.exists(job.upload_dir):
+        return False
+    updated = ChapterIngestJob.objects.filter(pk=job.pk, status=IngestJobStatus.FAILED).update(
+        status=IngestJobStatus.PENDING, images_total=0, images_done=0, slices_done=0, errors=[], log=[],
+        result_url='', encode_report=None, started_at=None, finished_at=None,
+    )
+    if not updated:
+        return False
+    run_chapter_ingest.enqueue(str(job.pk))
+    return True
@@ -0,0 +1,61 @@
+"""
+Benchmarks do fatiamento/codificação das fatias com pytest-benchmark (mesmo motor do comando
+`benchmark_ingest`):
+
+    pytest manga/tests/bench_ingest.py --benchmark-only
+
+O nome foge do padrão test*.py de propósito, para o `manage.py test` não rodar estes casos.
+Pulado inteiro sem pytest-benchmark ou sem um Pillow que codifique AVIF.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'astratoons.settings.dev')
+django.setup()
+
+from django.conf import settings
+from PIL import features
+
+from manga.benchmark import BenchCase, build_strip_zip, run_case
+from manga.ingest import get_encode_workers, get_variant_widths
+
+if not features.check('avif'):
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pytest.skip("Este Pillow não codifica AVIF; instale pillow-avif-plugin.", allow_module_level=True)
+
+PAGES = 6
+WIDTH, HEIGHT = 800, 4000
+
+
+@pytest.fixture(scope='module')
+def strip_zip(tmp_path_factory):
+    """ZIP sintético de um capítulo (tiras JPEG no estilo webtoon), gerado uma vez por módulo."""
+    zip_path = str(tmp_path_factory.mktemp('bench-ingest') / 'capitulo.zip')
+    members = build_strip_zip(zip_path, PAGES, WIDTH, HEIGHT, 'JPEG')
+    return zip_path, members
+
+
+def _bench(benchmark, strip_zip, case, variant_widths=()):
+    zip_path, members = strip_zip
+    result = benchmark.pedantic(run_case, args=(zip_path, members, case, variant_widths), rounds=3, iterations=1)
+    benchmark.extra_info.update({key: result[key] for key in ('slices', 'slices_per_second', 'cpu_seconds', 'bytes_per_page', 'variant_bytes_per_page')})
+    assert result['errors'] == 0
+    assert result['pages'] == PAGES and result['slices'] >= PAGES
+
+
+@pytest.mark.parametrize('speed', [7, 9])
+@pytest.mark.parametrize('workers', sorted({1, get_encode_workers()}))
+def test_encode_chapter(benchmark, strip_zip, speed, workers):
+    _bench(benchmark, strip_zip, BenchCase(getattr(settings, 'ALTURA_FATIA', 1600), speed, 55, workers, 'AVIF'))
+
+
+def test_encode_chapter_with_variants(benchmark, strip_zip):
+    case = BenchCase(getattr(settings, 'ALTURA_FATIA', 1600), 7, 55, get_encode_workers(), 'AVIF')
+    _bench(benchmark, strip_zip, case, get_variant_widths())
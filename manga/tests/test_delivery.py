@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+
+from cryptography.fernet import Fernet
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from wagtail.models import Page
+
+from manga.delivery import parse_range
+from manga.ingest import commit_chapter_slices, store_slice_blob
+from manga.models import ChapterImage, MangaChapterPage, MangaPage
+from manga.slice_crypto import encrypt_bytes
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_unsatisfiable(self):
+        self.assertIs(parse_range('bytes=100-', 100), False)
+        self.assertIs(parse_range('bytes=10-5', 100), False)
+        self.assertIs(parse_range('bytes=-0', 100), False)
+
+    def test_ignored(self):
+        # Ausente, malformado ou com vários intervalos: resposta inteira (200).
+        for header in (None, '', 'bytes=-', 'items=0-9', 'bytes=0-9,20-29', 'bytes=a-b'):
+            self.assertIsNone(parse_range(header, 100), header)
+
+
+class SliceDeliveryTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=media_root, SLICE_DELIVERY_BACKEND='python',
+            CHAVE_MESTRA_IMAGENS=Fernet.generate_key().decode(), SLICE_ENCRYPTION_CHUNK_SIZE=1024,
+        ))
+        work = Page.get_first_root_node().add_child(instance=MangaPage(title='Obra', slug='obra'))
+        self.chapter = MangaChapterPage(title='', chapter_number='1')
+        work.add_child(instance=self.chapter)
+        self.data = os.urandom(5_000)
+        self.slice = commit_chapter_slices(self.chapter, [
+            ChapterImage.from_blob(self.chapter, store_slice_blob(self.data, 10, 10), '1.avif', 0),
+        ])[0]
+        self.url = reverse('manga:serve_encrypted_slice', args=[self.chapter.pk, self.slice.pk])
+        self.etag = f'"{self.slice.content_hash}"'
+
+    def get(self, url=None, **headers):
+        return self.client.get(url or self.url, headers=headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_full_response_has_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_range(self):
+        response = self.get(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(self.body(response), self.data[100:200])
+
+        response = self.get(Range='bytes=-10')
+        self.assertEqual(response['Content-Range'], f'bytes {len(self.data) - 10}-{len(self.data) - 1}/{len(self.data)}')
+        self.assertEqual(self.body(response), self.data[-10:])
+
+    def test_unsatisfiable_range_is_416(self):
+        response = self.get(Range=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_if_range(self):
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range=self.etag).status_code, 206)
+        # Validador diferente: o cliente tem outra versão e recebe o arquivo inteiro.
+        response = self.get(Range='bytes=0-9', If_Range='"outra-versao"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_conditional_requests_are_304(self):
+        response = self.get(If_None_Match=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(self.get(If_None_Match='"outra-versao"').status_code, 200)
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(If_Modified_Since=last_modified).status_code, 304)
+
+    @override_settings(SLICE_DELIVERY_BACKEND='accel', SLICE_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_hands_the_file_to_the_proxy(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.slice.encrypted_file.name}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.get(If_None_Match=self.etag).status_code, 304)
+
+    def test_chunked_encrypted_slice_ranges(self):
+        name = default_storage.save('chapter_images/1.enc', ContentFile(encrypt_bytes(self.data)))
+        image = ChapterImage.objects.create(page=self.chapter, encrypted_file=name, sort_order=1, content_hash='cifrada')
+        url = reverse('manga:serve_encrypted_slice', args=[self.chapter.pk, image.pk])
+
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(self.body(response), self.data)
+
+        # Atravessa a fronteira entre o primeiro e o segundo bloco de 1024 bytes.
+        response = self.get(url, Range='bytes=1000-1099')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1099/{len(self.data)}')
+        self.assertEqual(self.body(response), self.data[1000:1100])
+        self.assertEqual(self.get(url, Range='bytes=6000-').status_code, 416)
+        self.assertEqual(self.get(url, If_None_Match='"cifrada"').status_code, 304)
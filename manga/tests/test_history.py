@@ -0,0 +1,88 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from wagtail.models import Page
+
+from manga.history import ReadingHistoryQueue
+from manga.models import MangaChapterPage, MangaPage, ReadingHistory
+
+
+@override_settings(READING_HISTORY_BUFFERED=True, READING_HISTORY_FLUSH_EVENTS=10_000, READING_HISTORY_FLUSH_SECONDS=3600)
+class ReadingHistoryQueueTests(TestCase):
+    def setUp(self):
+        self.work = Page.get_first_root_node().add_child(instance=MangaPage(title='Obra', slug='obra'))
+        self.chapters = []
+        for number in ('1', '2'):
+            chapter = MangaChapterPage(title='', chapter_number=number)
+            self.work.add_child(instance=chapter)
+            self.chapters.append(chapter)
+        self.user = get_user_model().objects.create_user('leitor', 'leitor@example.com', 'senha')
+        self.queue = ReadingHistoryQueue()
+
+    def test_reads_wait_for_flush(self):
+        first, second = self.chapters
+        self.queue.record(self.user, first, manga=self.work)
+        self.queue.record(self.user, second, manga=self.work)
+        self.assertFalse(ReadingHistory.objects.exists())
+        self.assertEqual(self.queue.pending_chapter_ids(self.user), {first.pk, second.pk})
+        self.assertEqual(self.queue.pending_chapter_ids(self.user.pk + 1), set())
+
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(set(ReadingHistory.objects.values_list('chapter_id', 'manga_id')), {(first.pk, self.work.pk), (second.pk, self.work.pk)})
+        self.assertEqual(self.queue.pending_chapter_ids(self.user), set())
+        self.assertEqual(self.queue.flush(), 0)
+
+    def test_repeated_reads_keep_the_latest(self):
+        chapter = self.chapters[0]
+        later = timezone.now()
+        earlier = later - timedelta(hours=1)
+        self.queue.record(self.user, chapter, manga=self.work, read_at=later)
+        self.queue.record(self.user, chapter, read_at=earlier)
+        self.assertEqual(self.queue.pending_reads(self.user), [(chapter.pk, self.work.pk, later)])
+        self.assertEqual(self.queue.flush(), 1)
+
+        # O upsert atualiza a linha existente em vez de falhar na unicidade (user, chapter).
+        latest = later + timedelta(minutes=5)
+        self.queue.record(self.user, chapter, manga=self.work, read_at=latest)
+        self.queue.flush()
+        self.assertEqual(list(ReadingHistory.objects.values_list('read_at', flat=True)), [latest])
+
+    def test_missing_work_is_resolved_from_the_tree(self):
+        self.queue.record(self.user, self.chapters[0])
+        self.queue.flush()
+        self.assertEqual(ReadingHistory.objects.get().manga_id, self.work.pk)
+
+    def test_failed_write_is_requeued(self):
+        first, second = self.chapters
+        read_at = timezone.now()
+        self.queue.record(self.user, first, manga=self.work, read_at=read_at)
+        with mock.patch.object(self.queue, '_write', side_effect=DatabaseError("banco fora")):
+            self.assertEqual(self.queue.flush(), 0)
+        self.queue.record(self.user, first, manga=self.work, read_at=read_at - timedelta(minutes=1))
+        self.queue.record(self.user, second, manga=self.work)
+        self.assertEqual(self.queue.pending_chapter_ids(self.user), {first.pk, second.pk})
+
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(ReadingHistory.objects.get(chapter=first).read_at, read_at)
+
+    def test_deleted_chapters_and_users_are_dropped(self):
+        first, second = self.chapters
+        other_user = get_user_model().objects.create_user('outro', 'outro@example.com', 'senha')
+        self.queue.record(self.user, first, manga=self.work)
+        self.queue.record(self.user, second, manga=self.work)
+        self.queue.record(other_user, first, manga=self.work)
+        second.delete()
+        other_user.delete()
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(list(ReadingHistory.objects.values_list('user_id', 'chapter_id')), [(self.user.pk, first.pk)])
+
+    @override_settings(READING_HISTORY_BUFFERED=False)
+    def test_unbuffered_writes_immediately(self):
+        self.queue.record(self.user, self.chapters[0])
+        self.assertEqual(self.queue.pending_chapter_ids(self.user), set())
+        row = ReadingHistory.objects.get()
+        self.assertEqual((row.chapter_id, row.manga_id), (self.chapters[0].pk, self.work.pk))
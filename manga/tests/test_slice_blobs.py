@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from hashlib import sha256
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from wagtail.models import Page
+
+import manga.ingest
+from manga.ingest import (
+    ChapterSliceWriter, EncodedImage, EncodedPart, SourceRef, commit_chapter_slices, encode_images, release_slice_rows,
+    source_digest, store_slice_blob,
+)
+from manga.models import ChapterImage, MangaChapterPage, MangaPage, SliceBlob
+
+
+class SliceBlobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, SLICE_BLOB_PRUNE_GRACE_HOURS=6))
+        work = Page.get_first_root_node().add_child(instance=MangaPage(title='Obra', slug='obra'))
+        self.chapters = []
+        for number in ('1', '2'):
+            chapter = MangaChapterPage(title='', chapter_number=number)
+            work.add_child(instance=chapter)
+            self.chapters.append(chapter)
+        self.credits = os.urandom(2_000)
+
+    def commit(self, chapter, *contents):
+        return commit_chapter_slices(chapter, [
+            ChapterImage.from_blob(chapter, store_slice_blob(data, 10, 10), f"{index}.avif", index)
+            for index, data in enumerate(contents)
+        ])
+
+    def blob(self, data=None):
+        return SliceBlob.objects.get(content_hash=sha256(data or self.credits).hexdigest())
+
+    def age(self, blob, hours):
+        SliceBlob.objects.filter(pk=blob.pk).update(created_at=timezone.now() - timedelta(hours=hours))
+
+    def test_repeated_slices_share_one_file(self):
+        first, second = self.chapters
+        self.commit(first, os.urandom(100), self.credits)
+        self.commit(second, self.credits, self.credits)
+        blob = self.blob()
+        self.assertEqual(blob.ref_count, 3)
+        self.assertEqual(SliceBlob.objects.count(), 2)
+        self.assertEqual(set(ChapterImage.objects.filter(blob=blob).values_list('encrypted_file', flat=True)), {blob.file.name})
+
+    def test_replacing_a_chapter_releases_its_old_slices(self):
+        first, second = self.chapters
+        page = os.urandom(100)
+        self.commit(first, page, self.credits)
+        self.commit(second, self.credits)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.commit(first, self.credits)
+        self.assertEqual(self.blob().ref_count, 2)
+        self.assertEqual(self.blob(page).ref_count, 0)
+        # Dentro do prazo de carência o arquivo sem referências continua no disco.
+        self.assertTrue(default_storage.exists(self.blob(page).file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.chapter_images.all().delete()
+        self.assertEqual(self.blob().ref_count, 1)
+
+    def test_prune_respects_grace_period(self):
+        self.commit(self.chapters[0], self.credits)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chapters[0].chapter_images.all().delete()
+        blob = self.blob()
+        self.assertEqual(blob.ref_count, 0)
+        self.assertEqual(SliceBlob.prune(), 0)
+
+        self.age(blob, 7)
+        self.assertEqual(SliceBlob.prune(pks=[blob.pk + 1]), 0)
+        self.assertEqual(SliceBlob.prune(), 1)
+        self.assertFalse(SliceBlob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.file.name))
+
+    def test_prune_keeps_referenced_blobs(self):
+        self.commit(self.chapters[0], self.credits)
+        self.age(self.blob(), 100)
+        self.assertEqual(SliceBlob.prune(grace_hours=0), 0)
+        self.assertTrue(default_storage.exists(self.blob().file.name))
+
+    def test_failed_ingest_returns_its_references(self):
+        self.commit(self.chapters[0], self.credits)
+        rows = [ChapterImage.from_blob(self.chapters[1], store_slice_blob(self.credits, 10, 10), 'x.avif', 0)]
+        self.assertEqual(self.blob().ref_count, 2)
+        release_slice_rows(rows)
+        self.assertEqual(self.blob().ref_count, 1)
+
+    def test_reused_source_takes_references_until_written(self):
+        writer = ChapterSliceWriter(self.chapters[0])
+        parts = (EncodedPart(self.credits, 10, 10), EncodedPart(os.urandom(50), 10, 5))
+        writer(EncodedImage('origem.png', parts, 'origem'))
+        self.assertEqual([blob.ref_count for blob in SliceBlob.objects.order_by('source_part')], [1, 1])
+
+        self.assertIsNone(SliceBlob.for_source('outra-origem'))
+        reused = ChapterSliceWriter(self.chapters[1])
+        image = reused.reuse(SourceRef('origem.png'), 'origem')
+        self.assertEqual([part.blob.source_part for part in image.parts], [0, 1])
+        self.assertEqual([blob.ref_count for blob in SliceBlob.objects.order_by('source_part')], [2, 2])
+
+        # Ingestão abandonada antes de gravar as linhas: as referências reservadas voltam.
+        reused.discard()
+        self.assertEqual([blob.ref_count for blob in SliceBlob.objects.order_by('source_part')], [1, 1])
+
+    def test_incomplete_source_is_not_reused(self):
+        blob = store_slice_blob(self.credits, 10, 10, source_hash='origem', source_part=0, source_parts=2)
+        self.assertIsNone(SliceBlob.for_source('origem'))
+        self.assertEqual(SliceBlob.objects.get(pk=blob.pk).ref_count, 1)
+
+    def test_recount_and_command(self):
+        self.commit(self.chapters[0], self.credits)
+        orphan = store_slice_blob(os.urandom(100), 10, 10)
+        SliceBlob.objects.filter(pk=self.blob().pk).update(ref_count=5)
+        self.age(orphan, 7)
+
+        out = StringIO()
+        call_command('prune_slice_blobs', recount=True, stdout=out)
+        self.assertIn('2 blob(s)', out.getvalue())
+        self.assertEqual(self.blob().ref_count, 1)
+        self.assertFalse(SliceBlob.objects.filter(pk=orphan.pk).exists())
+        self.assertFalse(default_storage.exists(orphan.file.name))
+
+    def test_new_sources_are_hashed_by_the_encoder(self):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, format='PNG')
+        source = SourceRef('1.png', data=buffer.getvalue())
+        options = dict(save_params={'format': 'PNG'}, slice_height=20, max_workers=1, variant_widths=())
+
+        writer = ChapterSliceWriter(self.chapters[0])
+        with mock.patch.object(manga.ingest, 'source_digest', wraps=source_digest) as digest:
+            report = encode_images([source], on_image=writer, reuse=writer.reuse, might_reuse=writer.might_reuse, **options)
+        # Nenhuma origem com esse tamanho ainda: o processo principal nem lê a imagem.
+        digest.assert_not_called()
+        self.assertEqual((report.image_count, report.reused_count), (1, 0))
+        blobs = list(SliceBlob.objects.order_by('source_part'))
+        self.assertEqual([blob.source_size for blob in blobs], [len(source.data)] * 2)
+        self.assertEqual({blob.source_hash for blob in blobs}, {source_digest(source, 20, {'format': 'PNG'}, ())})
+        commit_chapter_slices(self.chapters[0], writer.rows)
+
+        again = ChapterSliceWriter(self.chapters[1])
+        report = encode_images([source], on_image=again, reuse=again.reuse, might_reuse=again.might_reuse, **options)
+        self.assertEqual((report.image_count, report.reused_count), (1, 1))
+        self.assertEqual([row.blob_id for row in again.rows], [blob.pk for blob in blobs])
@@ -0,0 +1,78 @@
+import os
+from io import BytesIO
+from unittest import mock
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from django.test import SimpleTestCase, override_settings
+
+from manga.slice_crypto import HEADER, TAG_SIZE, ChunkedSliceReader, SliceFormatError, decrypt_bytes, encrypt_bytes, is_chunked
+
+CHUNK = 1024
+
+
+@override_settings(CHAVE_MESTRA_IMAGENS=Fernet.generate_key().decode())
+class ChunkedSliceCryptoTests(SimpleTestCase):
+    def setUp(self):
+        self.data = os.urandom(CHUNK * 3 + 100)
+        self.sealed = encrypt_bytes(self.data, chunk_size=CHUNK)
+
+    def test_round_trip(self):
+        self.assertTrue(is_chunked(self.sealed))
+        self.assertEqual(len(self.sealed), HEADER.size + len(self.data) + 4 * TAG_SIZE)
+        self.assertEqual(decrypt_bytes(self.sealed), self.data)
+        for size in (0, 1, CHUNK - 1, CHUNK, CHUNK + 1):
+            data = os.urandom(size)
+            self.assertEqual(decrypt_bytes(encrypt_bytes(data, chunk_size=CHUNK)), data, size)
+        # Dois envios do mesmo conteúdo não geram o mesmo arquivo (nonce aleatório).
+        self.assertNotEqual(encrypt_bytes(self.data, chunk_size=CHUNK), self.sealed)
+
+    def test_ranges_decrypt_only_the_requested_bytes(self):
+        reader = ChunkedSliceReader(BytesIO(self.sealed))
+        self.assertEqual(reader.chunk_count, 4)
+        for start, end in ((0, 0), (10, 20), (CHUNK - 5, CHUNK + 5), (CHUNK, 2 * CHUNK - 1), (3 * CHUNK, 10 ** 9)):
+            self.assertEqual(b''.join(reader.iter_range(start, end)), self.data[start:end + 1], (start, end))
+        self.assertEqual(b''.join(reader.iter_range(5, 4)), b'')
+        with mock.patch.object(reader, 'read_chunk', wraps=reader.read_chunk) as read_chunk:
+            b''.join(reader.iter_range(CHUNK + 1, CHUNK + 2))
+        read_chunk.assert_called_once_with(1)
+
+    def test_tampered_byte_fails(self):
+        for offset in (HEADER.size + 3, HEADER.size + CHUNK + TAG_SIZE + 7, len(self.sealed) - 1):
+            tampered = bytearray(self.sealed)
+            tampered[offset] ^= 0x01
+            with self.assertRaises(InvalidTag, msg=offset):
+                decrypt_bytes(bytes(tampered))
+
+    def test_tampered_header_fails(self):
+        # O cabeçalho é autenticado em todos os blocos: mudar o tamanho declarado invalida a leitura.
+        magic, version, chunk_size, size, nonce_prefix = HEADER.unpack(self.sealed[:HEADER.size])
+        header = HEADER.pack(magic, version, chunk_size, size - 1, nonce_prefix)
+        with self.assertRaises(InvalidTag):
+            decrypt_bytes(header + self.sealed[HEADER.size:])
+
+    def test_reordered_chunks_fail(self):
+        sealed_chunk = CHUNK + TAG_SIZE
+        body = self.sealed[HEADER.size:]
+        swapped = body[sealed_chunk:2 * sealed_chunk] + body[:sealed_chunk] + body[2 * sealed_chunk:]
+        with self.assertRaises(InvalidTag):
+            decrypt_bytes(self.sealed[:HEADER.size] + swapped)
+
+    def test_truncation_fails(self):
+        for length in (len(self.sealed) - 1, len(self.sealed) - 100 - TAG_SIZE, HEADER.size + CHUNK + TAG_SIZE):
+            with self.assertRaises(InvalidTag, msg=length):
+                decrypt_bytes(self.sealed[:length])
+        with self.assertRaises(SliceFormatError):
+            ChunkedSliceReader(BytesIO(self.sealed[:HEADER.size - 1]))
+
+    def test_wrong_key_fails(self):
+        with override_settings(CHAVE_MESTRA_IMAGENS=Fernet.generate_key().decode()):
+            with self.assertRaises(InvalidTag):
+                decrypt_bytes(self.sealed)
+
+    def test_legacy_fernet_tokens_still_decrypt(self):
+        fernet = Fernet(Fernet.generate_key())
+        token = fernet.encrypt(b'fatia antiga')
+        self.assertFalse(is_chunked(token))
+        self.assertEqual(decrypt_bytes(token, fernet=fernet), b'fatia antiga')
+
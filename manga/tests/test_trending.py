@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from wagtail.models import Page
+
+from manga.models import MangaChapterPage, MangaPage, WorkViewRing
+from manga.trending import (
+    advance, current_hour, get_ring_hours, pack_counts, record_work_views, score_ring, unpack_counts,
+    update_trending_scores,
+)
+
+
+class RingTests(SimpleTestCase):
+    def test_pack_round_trip(self):
+        counts = [0, 1, 2, 0xFFFFFFFF]
+        self.assertEqual(unpack_counts(pack_counts(counts), 4), counts)
+        self.assertEqual(unpack_counts(pack_counts([2 ** 40]), 1), [0xFFFFFFFF])
+        # Anel gravado com outro tamanho (TRENDING_RING_HOURS mudou): recomeça zerado.
+        self.assertEqual(unpack_counts(pack_counts([1, 2]), 3), [0, 0, 0])
+        self.assertEqual(unpack_counts(None, 2), [0, 0])
+
+    def test_advance_zeroes_only_skipped_hours(self):
+        counts = [1, 2, 3, 4, 5, 6, 7, 8]
+        counts, head = advance(counts, 10, 12)
+        self.assertEqual(head, 12)
+        # Horas 11 e 12 caem nos baldes 3 e 4.
+        self.assertEqual(counts, [1, 2, 3, 0, 0, 6, 7, 8])
+
+    def test_advance_over_gap_longer_than_ring_resets(self):
+        counts, head = advance([9] * 8, 10, 10 + 8)
+        self.assertEqual((counts, head), ([0] * 8, 18))
+        counts, head = advance([9] * 8, 10, 10 + 500)
+        self.assertEqual((counts, head), ([0] * 8, 510))
+        counts, head = advance([9] * 8, None, 42)
+        self.assertEqual((counts, head), ([0] * 8, 42))
+
+    def test_advance_to_older_hour_keeps_head(self):
+        counts, head = advance([9] * 8, 20, 18)
+        self.assertEqual((counts, head), ([9] * 8, 20))
+
+    def test_score_ring_windows_and_decay(self):
+        size = 168
+        head = 1_000
+        counts = [0] * size
+        counts[head % size] = 10
+        counts[(head - 24) % size] = 100
+        counts[(head - 100) % size] = 1_000
+        score, day, week = score_ring(counts, head, head, half_life_hours=24)
+        self.assertEqual(day, 10)
+        self.assertEqual(week, 1_110)
+        self.assertAlmostEqual(score, 10 + 100 * 0.5 + 1_000 * 0.5 ** (100 / 24), places=6)
+
+    def test_score_ring_over_gap_longer_than_ring_is_zero(self):
+        counts = [5] * 168
+        self.assertEqual(score_ring(counts, 1_000, 1_000 + 168, 24), (0.0, 0, 0))
+        self.assertEqual(score_ring(counts, 1_000, 1_000 + 5_000, 24), (0.0, 0, 0))
+        self.assertEqual(score_ring(counts, None, 1_000, 24), (0.0, 0, 0))
+
+    def test_score_ring_ignores_stale_buckets_after_partial_gap(self):
+        size = 168
+        counts = [1] * size
+        # 30 horas sem views depois do head: só os baldes ainda dentro do anel contam.
+        score, day, week = score_ring(counts, 1_000, 1_030, 24)
+        self.assertEqual(day, 0)
+        self.assertEqual(week, size - 30)
+
+
+class TrendingScoreTests(TestCase):
+    def setUp(self):
+        root = Page.get_first_root_node()
+        self.work = root.add_child(instance=MangaPage(title='Obra', slug='obra'))
+        self.other = root.add_child(instance=MangaPage(title='Outra', slug='outra'))
+
+    def ring_counts(self, work):
+        ring = WorkViewRing.objects.get(pk=work.pk)
+        return unpack_counts(ring.counts, get_ring_hours()), ring.head_hour
+
+    def test_record_work_views_adds_to_current_hour(self):
+        record_work_views(MangaPage, 'views_count', {self.work.pk: 3})
+        record_work_views(MangaPage, 'views_count', {self.work.pk: 4, self.other.pk: 1})
+        counts, head = self.ring_counts(self.work)
+        self.assertEqual(head, current_hour())
+        self.assertEqual(counts[head % len(counts)], 7)
+        self.assertEqual(sum(counts), 7)
+        self.assertEqual(sum(self.ring_counts(self.other)[0]), 1)
+
+    def test_record_work_views_ignores_other_counters_and_deleted_works(self):
+        record_work_views(MangaChapterPage, 'views', {self.work.pk: 3})
+        record_work_views(MangaPage, 'trending_score', {self.work.pk: 3})
+        record_work_views(MangaPage, 'views_count', {self.work.pk + 10_000: 3})
+        self.assertFalse(WorkViewRing.objects.exists())
+
+    def test_update_trending_scores_and_decay_to_zero(self):
+        record_work_views(MangaPage, 'views_count', {self.work.pk: 10})
+        now = timezone.now()
+        self.assertEqual(update_trending_scores(now=now), 1)
+        self.work.refresh_from_db()
+        self.assertEqual((self.work.views_day, self.work.views_week), (10, 10))
+        self.assertAlmostEqual(self.work.trending_score, 10, places=3)
+        self.assertEqual(update_trending_scores(now=now), 0)
+
+        update_trending_scores(now=now + timedelta(hours=48))
+        self.work.refresh_from_db()
+        self.assertEqual((self.work.views_day, self.work.views_week), (0, 10))
+
+        update_trending_scores(now=now + timedelta(hours=get_ring_hours() + 1))
+        self.work.refresh_from_db()
+        self.assertEqual((self.work.trending_score, self.work.views_day, self.work.views_week), (0.0, 0, 0))
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.http import FileResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from wagtail.models import Page
+
+from manga.ingest import commit_chapter_slices, store_slice_blob
+from manga.models import ChapterImage, MangaChapterPage, MangaPage
+from manga.zipstream import ZIP_LIMIT, ZipMember, ZipTooLarge, archive_size, file_crc32, iter_and_store, iter_stored_zip
+
+
+class StoredZipTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.contents = {
+            'Capítulo 1/001.avif': os.urandom(300_000),
+            'Capítulo 1/002.avif': b'',
+            'Capítulo 1/003.avif': os.urandom(17),
+        }
+        self.members = []
+        for index, (arcname, data) in enumerate(self.contents.items()):
+            path = os.path.join(self.tmp, f"{index}.avif")
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.members.append(ZipMember(arcname, path, len(data), file_crc32(path)))
+
+    def test_archive_is_valid_and_matches_precomputed_size(self):
+        data = b''.join(iter_stored_zip(self.members))
+        self.assertEqual(len(data), archive_size(self.members))
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), list(self.contents))
+            for info in archive.infolist():
+                content = self.contents[info.filename]
+                self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(info.file_size, len(content))
+                self.assertEqual(info.CRC, zlib.crc32(content))
+                self.assertEqual(archive.read(info), content)
+
+    def test_empty_archive(self):
+        data = b''.join(iter_stored_zip([]))
+        self.assertEqual(len(data), archive_size([]))
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(), [])
+
+    def test_wrong_crc_is_detected_by_readers(self):
+        member = self.members[0]
+        members = [member._replace(crc32=member.crc32 ^ 1)]
+        with zipfile.ZipFile(BytesIO(b''.join(iter_stored_zip(members)))) as archive:
+            self.assertEqual(archive.testzip(), member.arcname)
+
+    def test_file_changed_during_download_fails(self):
+        member = self.members[0]
+        with self.assertRaises(IOError):
+            b''.join(iter_stored_zip([member._replace(size=member.size + 1)]))
+
+    def test_too_large_for_zip32(self):
+        huge = ZipMember('grande.avif', os.path.join(self.tmp, 'não-existe'), ZIP_LIMIT, 0)
+        with self.assertRaises(ZipTooLarge):
+            next(iter_stored_zip([huge]))
+
+    def test_cache_is_written_only_when_complete(self):
+        cache_path = os.path.join(self.tmp, 'cache', 'capitulo.zip')
+        data = b''.join(iter_and_store(iter_stored_zip(self.members), cache_path))
+        with open(cache_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        os.remove(cache_path)
+        stream = iter_and_store(iter_stored_zip(self.members), cache_path)
+        next(stream)
+        # Cliente desconectou no meio: nem o cache nem o temporário ficam no disco.
+        stream.close()
+        self.assertEqual(os.listdir(os.path.dirname(cache_path)), [])
+
+
+class ChapterZipDownloadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, CHAPTER_ZIP_CACHE_DIR=os.path.join(media_root, 'zips')))
+        work = Page.get_first_root_node().add_child(instance=MangaPage(title='Obra', slug='obra'))
+        chapter = MangaChapterPage(title='', chapter_number='1')
+        work.add_child(instance=chapter)
+        # A mesma fatia duas vezes: um blob só no disco, dois membros no ZIP.
+        self.slices = [os.urandom(5_000), os.urandom(70_000), None]
+        self.slices[2] = self.slices[0]
+        commit_chapter_slices(chapter, [
+            ChapterImage.from_blob(chapter, store_slice_blob(data, 10, 10), f"{index}.avif", index)
+            for index, data in enumerate(self.slices)
+        ])
+        self.url = reverse('manga:download_chapter_zip', args=[work.slug, chapter.chapter_number])
+        self.client.force_login(get_user_model().objects.create_user('staff', 'staff@example.com', 'senha', is_staff=True))
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_streamed_zip_has_exact_length_and_crcs(self):
+        response, body = self.download()
+        self.assertEqual(int(response['Content-Length']), len(body))
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), ['001.avif', '002.avif', '003.avif'])
+            self.assertEqual([archive.read(name) for name in archive.namelist()], self.slices)
+            self.assertEqual([info.CRC for info in archive.infolist()], [zlib.crc32(data) for data in self.slices])
+
+        # A segunda vez sai do cache gravado pela primeira, com os mesmos bytes.
+        cached, cached_body = self.download()
+        self.assertIsInstance(cached, FileResponse)
+        self.assertEqual(cached_body, body)
+        self.assertEqual(int(cached['Content-Length']), len(body))
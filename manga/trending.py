@@ -0,0 +1,146 @@
+"""
+Ranking "Mais Vistos" com decaimento no tempo.
+
+Cada obra tem um anel de TRENDING_RING_HOURS contadores horários (`WorkViewRing`), alimentado
+pelo flush do contador de views. O comando `update_trending_scores` (rodado de hora em hora pelas
+tarefas periódicas do container, ver docker-entrypoint.sh) lê os anéis e grava em colunas
+indexadas de `MangaPage` o score com decaimento exponencial (meia-vida de TRENDING_HALF_LIFE_HOURS)
+e as views das últimas 24 horas e dos últimos 7 dias.
+Home, catálogo e API só fazem `order_by` nessas colunas.
+"""
+import logging
+import math
+import struct
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.choices import DEFAULT_RANKING
+
+logger = logging.getLogger(__name__)
+
+# Período do ranking -> coluna de MangaPage usada na ordenação.
+RANKING_ORDERINGS = {
+    'trending': 'trending_score',
+    'dia': 'views_day',
+    'semana': 'views_week',
+    'total': 'views_count',
+}
+# Tentativas de gravar um anel quando outro processo grava o mesmo anel no meio.
+RING_UPDATE_ATTEMPTS = 5
+
+
+def get_ring_hours():
+    return max(getattr(settings, 'TRENDING_RING_HOURS', 168), 24)
+
+
+def current_hour(now=None):
+    """Hora corrente como número de horas desde a época (UTC); é a chave dos baldes do anel."""
+    return int((now or timezone.now()).timestamp() // 3600)
+
+
+def ranking_field(period):
+    return RANKING_ORDERINGS.get(period, RANKING_ORDERINGS[DEFAULT_RANKING])
+
+
+def order_by_ranking(queryset, period, prefix=''):
+    """Ordena `queryset` pelo período do ranking; `prefix` permite ordenar a partir de `Page` ('mangapage__')."""
+    from django.db.models import F
+
+    field = f"{prefix}{ranking_field(period)}"
+    return queryset.order_by(F(field).desc(nulls_last=True), f"-{prefix}views_count" if period != 'total' else '-first_published_at')
+
+
+def unpack_counts(data, size):
+    data = bytes(data or b'')
+    if len(data) != size * 4:
+        return [0] * size
+    return list(struct.unpack(f'<{size}I', data))
+
+
+def pack_counts(counts):
+    return struct.pack(f'<{len(counts)}I', *(min(count, 0xFFFFFFFF) for count in counts))
+
+
+def advance(counts, head_hour, hour):
+    """Avança o anel até `hour`, zerando os baldes das horas que ficaram para trás."""
+    size = len(counts)
+    if head_hour is None or hour - head_hour >= size:
+        return [0] * size, hour
+    for skipped in range(head_hour + 1, hour + 1):
+        counts[skipped % size] = 0
+    return counts, max(head_hour, hour)
+
+
+def record_work_views(model, field, amounts):
+    """
+    Listener do `view_counter`: soma as views gravadas de cada obra no balde da hora atual.
+    Cada anel é gravado com compare-and-swap (o UPDATE só vale se o anel ainda for o que foi lido),
+    relendo e tentando de novo se outro processo gravou no meio; não depende de `select_for_update`,
+    que não trava nada no SQLite.
+    """
+    from .models import MangaPage, WorkViewRing
+
+    if model is not MangaPage or field != 'views_count' or not amounts:
+        return
+    size = get_ring_hours()
+    hour = current_hour()
+    # Obra apagada enquanto as views estavam no buffer: descarta, senão a criação do anel falha.
+    work_ids = list(MangaPage.objects.filter(pk__in=list(amounts)).values_list('pk', flat=True))
+    WorkViewRing.objects.bulk_create([WorkViewRing(work_id=work_id) for work_id in work_ids], ignore_conflicts=True)
+    for work_id in work_ids:
+        for _attempt in range(RING_UPDATE_ATTEMPTS):
+            data, head_hour = WorkViewRing.objects.filter(pk=work_id).values_list('counts', 'head_hour').get()
+            data = bytes(data or b'')
+            counts, new_head_hour = advance(unpack_counts(data, size), head_hour, hour)
+            if 0 <= new_head_hour - hour < size:
+                counts[hour % size] += amounts[work_id]
+            if WorkViewRing.objects.filter(pk=work_id, counts=data, head_hour=head_hour).update(counts=pack_counts(counts), head_hour=new_head_hour):
+                break
+        else:
+            logger.warning(f"Ranking: anel da obra {work_id} disputado demais; {amounts[work_id]} views fora do balde da hora {hour}.")
+
+
+def score_ring(counts, head_hour, hour, half_life_hours):
+    """(score com decaimento, views nas últimas 24 h, views nos últimos 7 dias) do anel na hora `hour`."""
+    size = len(counts)
+    decay = math.log(2) / half_life_hours
+    score, day, week = 0.0, 0, 0
+    if head_hour is None:
+        return score, day, week
+    for age in range(size):
+        bucket_hour = hour - age
+        if bucket_hour > head_hour or head_hour - bucket_hour >= size:
+            continue
+        count = counts[bucket_hour % size]
+        if not count:
+            continue
+        score += count * math.exp(-decay * age)
+        if age < 24:
+            day += count
+        if age < 168:
+            week += count
+    return score, day, week
+
+
+def update_trending_scores(now=None):
+    """Recalcula as colunas de ranking de todas as obras; retorna quantas obras mudaram."""
+    from .models import MangaPage, WorkViewRing
+
+    size = get_ring_hours()
+    hour = current_hour(now)
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)
+    scores = {}
+    for work_id, data, head_hour in WorkViewRing.objects.values_list('work_id', 'counts', 'head_hour').iterator():
+        score, day, week = score_ring(unpack_counts(data, size), head_hour, hour, half_life)
+        scores[work_id] = (round(score, 3), day, week)
+
+    to_update = []
+    for work in MangaPage.objects.only('trending_score', 'views_day', 'views_week').iterator():
+        values = scores.get(work.pk, (0.0, 0, 0))
+        if (work.trending_score, work.views_day, work.views_week) != values:
+            work.trending_score, work.views_day, work.views_week = values
+            to_update.append(work)
+    MangaPage.objects.bulk_update(to_update, ['trending_score', 'views_day', 'views_week'], batch_size=500)
+    logger.info(f"Ranking: {len(to_update)} obras atualizadas ({len(scores)} com views no anel).")
+    return len(to_update)
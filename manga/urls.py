@@ -29,4 +29,13 @@ urlpatterns = [
 
     # Sua rota antiga de upload por zip
     path('admin/manga-uploader/zip/', admin_views.combined_upload_zip_view, name='upload_zip'),
+
+    # Progresso dos uploads processados em segundo plano
+    path('admin/manga-uploader/api/jobs/<uuid:job_id>/', admin_views.ingest_job_progress_api, name='api_ingest_job_progress'),
+
+    # Contadores do cache de fatias descriptografadas (por worker)
+    path('admin/manga-uploader/api/slice-cache-stats/', admin_views.slice_cache_stats_api, name='api_slice_cache_stats'),
+
+    # Leitores únicos aproximados (sketches HyperLogLog) de uma obra ou capítulo
+    path('admin/manga-uploader/api/reader-stats/<int:page_id>/', admin_views.reader_stats_api, name='api_reader_stats'),
 ]
\ No newline at end of file
@@ -1,35 +1,36 @@
 import zipfile
 import os
 import logging
-from io import BytesIO
 from pathlib import Path
 
-from django.conf import settings
-from django.core.files.base import ContentFile
-from django.db import transaction
 from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
-from PIL import Image as PillowImage
-
-try:
-    import pillow_avif
-except ImportError:
-    pillow_avif = None
 
+from .encoder_profiles import get_save_params
+from .ingest import ChapterSliceWriter, SourceRef, commit_chapter_slices, encode_images
 from .models import MangaPage, MangaChapterPage, ChapterImage
 
 logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.gif']
 
-@transaction.atomic
-def process_manga_zip(manga_page: MangaPage, zip_file_obj, owner_user):
+def zip_member_source(zip_fp, zip_path, image_info):
+    original_filename = os.path.basename(image_info.filename)
+    if zip_path:
+        return SourceRef(original_filename, path=zip_path, member=image_info.filename, size=image_info.file_size)
+    return SourceRef(original_filename, data=zip_fp.read(image_info.filename))
+
+def process_manga_zip(manga_page: MangaPage, zip_file_obj, owner_user, job=None):
     processing_messages_list = []
     chapters_processed_count = 0
     
     zip_file_obj.seek(0)
+    # Com o ZIP em disco, cada processo do pool lê o próprio membro; senão os bytes passam pelo processo principal.
+    zip_path = getattr(zip_file_obj, 'name', None)
+    if not (isinstance(zip_path, str) and os.path.isfile(zip_path)):
+        zip_path = None
 
     try:
         with zipfile.ZipFile(zip_file_obj, 'r') as zip_fp:
@@ -57,6 +58,8 @@ def process_manga_zip(manga_page: MangaPage, zip_file_obj, owner_user):
                 msg_err = _("Nenhuma pasta de capítulo válida ou arquivos de imagem permitidos encontrados no ZIP.")
                 processing_messages_list.append((messages.ERROR, msg_err))
                 return False, processing_messages_list
+            if job:
+                job.set_images_total(sum(len(items) for items in chapter_files_map.values()))
 
             for chapter_folder_name, image_items in chapter_files_map.items():
                 try:
@@ -68,76 +71,48 @@ def process_manga_zip(manga_page: MangaPage, zip_file_obj, owner_user):
                 actual_chapter_page_slug = slugify(str(num_str_for_db).replace('.', '-'))
                 chapter_final_title = f"{manga_page.title} - Capítulo {num_str_for_db}"
 
+                is_new_chapter = False
                 try:
                     chapter_page = MangaChapterPage.objects.child_of(manga_page).get(slug=actual_chapter_page_slug)
-                    chapter_page.chapter_images.all().delete()
-                    processing_messages_list.append((messages.INFO, _("Atualizando capítulo '%(title)s'. Imagens antigas removidas.") % {'title': chapter_page.title}))
+                    processing_messages_list.append((messages.INFO, _("Atualizando capítulo '%(title)s'. As imagens antigas serão substituídas.") % {'title': chapter_page.title}))
                 except MangaChapterPage.DoesNotExist:
+                    # Criado fora do ar; só é publicado junto com as fatias, depois da codificação.
                     chapter_page = MangaChapterPage(
                         title=chapter_final_title,
                         chapter_number=num_str_for_db,
                         owner=owner_user,
-                        live=True,
+                        live=False,
                         release_date=timezone.now(),
                     )
                     manga_page.add_child(instance=chapter_page)
-                    chapter_page.save_revision(user=owner_user).publish()
-                    processing_messages_list.append((messages.SUCCESS, _("Capítulo '%(title)s' criado com sucesso.") % {'title': chapter_page.title}))
-                    chapters_processed_count += 1
-                
-                images_to_create = []
-                final_image_index = 0
-                slice_height = getattr(settings, 'ALTURA_FATIA', 1600)
-                save_params = {'format': 'AVIF', 'quality': 55, 'subsampling': '4:2:0', 'speed': 7}
+                    is_new_chapter = True
                 
+                save_params = get_save_params(job.encoder_profile if job else None)
                 sorted_image_items = sorted(image_items, key=lambda x: x.filename)
-                
-                for image_info in sorted_image_items:
-                    original_filename = os.path.basename(image_info.filename)
-                    
-                    try:
-                        image_data = zip_fp.read(image_info.filename)
-                        img = PillowImage.open(BytesIO(image_data))
-                        width, height = img.size
-                        
-                        if height > slice_height:
-                            for y in range(0, height, slice_height):
-                                box = (0, y, width, min(y + slice_height, height))
-                                slice_img = img.crop(box).convert("RGB")
-                                
-                                buffer = BytesIO()
-                                slice_img.save(buffer, **save_params)
-                                
-                                avif_filename = f"{final_image_index:03d}.avif"
-                                
-                                images_to_create.append(ChapterImage(
-                                    page=chapter_page,
-                                    encrypted_file=ContentFile(buffer.getvalue(), name=avif_filename),
-                                    original_filename=f"{original_filename} (fatia {final_image_index})",
-                                    sort_order=final_image_index
-                                ))
-                                final_image_index += 1
-                        else:
-                            buffer = BytesIO()
-                            img.convert("RGB").save(buffer, **save_params)
-                            
-                            original_stem = Path(original_filename).stem
-                            avif_filename = f"{final_image_index:03d}_{original_stem}.avif"
-
-                            images_to_create.append(ChapterImage(
-                                page=chapter_page,
-                                encrypted_file=ContentFile(buffer.getvalue(), name=avif_filename),
-                                original_filename=original_filename,
-                                sort_order=final_image_index
-                            ))
-                            final_image_index += 1
-
-                    except Exception as e:
-                        logger.error(f"Erro ao processar a imagem {original_filename} do ZIP: {e}")
-                        continue
+                writer = ChapterSliceWriter(chapter_page)
+                try:
+                    report = encode_images(
+                        (zip_member_source(zip_fp, zip_path, image_info) for image_info in sorted_image_items),
+                        save_params=save_params,
+                        on_progress=job.progress_callback() if job else None,
+                        on_image=writer,
+                        reuse=writer.reuse,
+                        might_reuse=writer.might_reuse,
+                    )
+                    images_to_create = writer.rows
+                    if job:
+                        job.add_encode_report(chapter_page.chapter_number, report)
+
+                    if images_to_create or is_new_chapter:
+                        commit_chapter_slices(chapter_page, images_to_create, publish=is_new_chapter, user=owner_user)
+                except Exception:
+                    writer.discard()
+                    raise
+                if is_new_chapter:
+                    processing_messages_list.append((messages.SUCCESS, _("Capítulo '%(title)s' criado com sucesso.") % {'title': chapter_page.title}))
+                    chapters_processed_count += 1
 
                 if images_to_create:
-                    ChapterImage.objects.bulk_create(images_to_create)
                     msg_bulk_ok = _("%(count)d fatias de imagem foram salvas para o capítulo '%(title)s'.") % {'count': len(images_to_create), 'title': chapter_page.title}
                     processing_messages_list.append((messages.INFO, msg_bulk_ok))
 
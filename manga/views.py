@@ -1,4 +1,4 @@
-import os, io, json, logging, zipfile, shutil, requests
+import os, io, json, hashlib, logging, zipfile, shutil, requests
 from PIL import Image as PillowImage
 from django.conf import settings
 from django.contrib import messages
@@ -8,7 +8,7 @@ from django.core.files.base import ContentFile
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
 from django.db.models import F, OuterRef, Subquery, Value, CharField, DateTimeField
-from django.http import Http404, JsonResponse, HttpResponse, HttpResponseForbidden
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -43,10 +43,17 @@ try: from core.models import GlobalSettings
 except ImportError: GlobalSettings = None
 
 from .forms import MangaCommentForm 
-from .models import MangaPage, MangaChapterPage, Favorite, ChapterImage, MangaComment, MangaStatus, ReadingHistory
+from .models import MangaPage, MangaChapterPage, Favorite, ChapterImage, MangaComment, MangaStatus, ReadingHistory, IngestJobKind
+from home.feed import decode_cursor, get_latest_releases
 from .serializers import MangaListSerializer
 from comments.models import Notification
+from core.counters import unique_readers, view_counter
+from .history import reading_history
+from .trending import RANKING_ORDERINGS, order_by_ranking
 from .utils import process_manga_zip
+from .tasks import enqueue_ingest_job
+from .delivery import serve_decrypted_slice, serve_slice_file
+from .zipstream import ZIP_LIMIT, ZipMember, archive_size, file_crc32, iter_and_store, iter_stored_zip
 
 logger = logging.getLogger(__name__)
 
@@ -77,7 +84,12 @@ class MangaListAPIView(generics.ListAPIView):
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        return MangaPage.objects.live().public().order_by('title')
+        # ?ranking=trending|dia|semana|total ordena pelo ranking em vez do título.
+        queryset = MangaPage.objects.live().public()
+        ranking = self.request.query_params.get('ranking')
+        if ranking in RANKING_ORDERINGS:
+            return order_by_ranking(queryset, ranking)
+        return queryset.order_by('title')
 
 
 # ==============================================================================
@@ -168,38 +180,59 @@ def download_chapter_zip_view(request, manga_slug, chapter_number):
         except MangaPage.DoesNotExist:
             return redirect('/')
     
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        first_image_instance = chapter.chapter_images.order_by('sort_order').first()
-        if not first_image_instance:
-            messages.error(request, "Este capítulo não contém imagens para download.")
-            return redirect(chapter.get_url())
-
-        chapter_image_directory = os.path.dirname(first_image_instance.encrypted_file.path)
-        
+    members = []
+    sort_orders = []
+    for image in chapter.chapter_images.only('encrypted_file', 'sort_order', 'byte_size', 'crc32').order_by('sort_order', 'pk'):
+        if not image.encrypted_file.name.lower().endswith('.avif'):
+            continue
+        path = image.encrypted_file.path
         try:
-            avif_files = sorted([f for f in os.listdir(chapter_image_directory) if f.lower().endswith('.avif')])
-            if not avif_files:
-                raise FileNotFoundError
-        except (FileNotFoundError, AttributeError):
-            messages.error(request, "Este capítulo não contém imagens (AVIF) para download.")
-            return redirect(chapter.get_url())
-
-        for avif_filename in avif_files:
-            file_path = os.path.join(chapter_image_directory, avif_filename)
-            zipf.write(file_path, arcname=avif_filename)
-
-    zip_buffer.seek(0)
-    response = HttpResponse(zip_buffer, content_type='application/zip')
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            logger.warning(f"Download: fatia ausente no disco para o capítulo {chapter.id}: {image.encrypted_file.name}")
+            continue
+        crc = image.crc32 if image.crc32 is not None and image.byte_size == size else file_crc32(path)
+        # O arquivo é um blob nomeado pelo hash (e pode se repetir no capítulo); o nome no ZIP segue a ordem das páginas.
+        members.append(ZipMember(f"{len(members) + 1:03d}.avif", path, size, crc))
+        sort_orders.append(image.sort_order)
+    if not members:
+        messages.error(request, "Este capítulo não contém imagens (AVIF) para download.")
+        return redirect(chapter.get_url())
+    total_size = archive_size(members)
+    if total_size > ZIP_LIMIT:
+        messages.error(request, "Este capítulo é grande demais para ser baixado em um único arquivo.")
+        return redirect(chapter.get_url())
+
     safe_manga_title = slugify(manga.title)
     safe_chapter_number = slugify(chapter.chapter_number)
-    response['Content-Disposition'] = f'attachment; filename="{safe_manga_title}-capitulo-{safe_chapter_number}.zip"'
+    download_name = f"{safe_manga_title}-capitulo-{safe_chapter_number}.zip"
+
+    chunks = iter_stored_zip(members)
+    cache_dir = getattr(settings, 'CHAPTER_ZIP_CACHE_DIR', None)
+    if cache_dir:
+        chapter_cache_dir = os.path.join(cache_dir, str(chapter.pk))
+        version = hashlib.sha1(repr([(sort_order, m.arcname, m.size, m.crc32) for sort_order, m in zip(sort_orders, members)]).encode()).hexdigest()
+        cache_path = os.path.join(chapter_cache_dir, f"{version}.zip")
+        if os.path.exists(cache_path):
+            return FileResponse(open(cache_path, 'rb'), as_attachment=True, filename=download_name, content_type='application/zip')
+        if os.path.isdir(chapter_cache_dir):
+            for stale in os.listdir(chapter_cache_dir):
+                if stale.endswith('.zip'):
+                    try:
+                        os.remove(os.path.join(chapter_cache_dir, stale))
+                    except OSError:
+                        pass
+        chunks = iter_and_store(chunks, cache_path)
+
+    response = StreamingHttpResponse(chunks, content_type='application/zip')
+    response['Content-Length'] = str(total_size)
+    response['Content-Disposition'] = f'attachment; filename="{download_name}"'
     return response
 
 def chapter_reader_view(request, manga_slug, chapter_slug):
     try:
         manga = get_object_or_404(MangaPage.objects.live().public(), slug=manga_slug)
-        current_chapter = get_object_or_404(MangaChapterPage.objects.live().public().child_of(manga), slug=chapter_slug)
+        current_chapter = get_object_or_404(MangaChapterPage.objects.live().public().child_of(manga).select_related('prev_chapter', 'next_chapter'), slug=chapter_slug)
     except Http404:
         logger.warning(f"Conteúdo não encontrado para manga_slug='{manga_slug}', chapter_slug='{chapter_slug}'")
         raise
@@ -208,10 +241,7 @@ def chapter_reader_view(request, manga_slug, chapter_slug):
          raise Http404(f"Erro ao carregar dados do mangá ou capítulo: {e}")
 
     if request.user.is_authenticated:
-        ReadingHistory.objects.update_or_create(
-            user=request.user,
-            chapter=current_chapter
-        )
+        reading_history.record(request.user, current_chapter, manga=manga)
 
     user_is_vip = (request.user.is_authenticated and (
         request.user.is_staff or 
@@ -231,42 +261,21 @@ def chapter_reader_view(request, manga_slug, chapter_slug):
 
     if not request.user.is_superuser and not request.user.is_staff:
         try:
-            MangaChapterPage.objects.filter(pk=current_chapter.pk).update(views=F('views') + 1)
-            MangaPage.objects.filter(pk=manga.pk).update(views_count=F('views_count') + 1)
-            current_chapter.refresh_from_db(fields=['views'])
+            view_counter.increment(current_chapter, 'views')
+            view_counter.increment(manga, 'views_count')
+            unique_readers.add(current_chapter, manga, request)
         except Exception as e:
             logger.error(f"DEBUG (VIEW): ERRO ao tentar fazer update das views: {e}")
 
-    first_image_instance = current_chapter.chapter_images.order_by('sort_order').first()
-    
-    chapter_images_urls = []
-    if first_image_instance and first_image_instance.encrypted_file.name:
-        chapter_image_directory = os.path.dirname(first_image_instance.encrypted_file.path)
-        try:
-            image_filenames = sorted([f for f in os.listdir(chapter_image_directory) if f.lower().endswith('.avif')])
-            media_root_path = settings.MEDIA_ROOT
-            media_url = settings.MEDIA_URL
-            relative_chapter_path = os.path.relpath(chapter_image_directory, media_root_path)
-            for filename in image_filenames:
-                image_url = os.path.join(media_url, relative_chapter_path, filename).replace("\\", "/")
-                chapter_images_urls.append(image_url)
-        except FileNotFoundError:
-            logger.warning(f"Diretório de imagens não encontrado para o capítulo: {chapter_image_directory}")
-        except Exception as e:
-            logger.error(f"Erro ao listar arquivos AVIF para o capítulo {current_chapter.id}: {e}")
-    
-    all_chapters_qs = MangaChapterPage.objects.live().public().child_of(manga).specific()
-    all_chapters_for_nav = sorted(list(all_chapters_qs), key=lambda chap: chap._get_numerical_sort_key(), reverse=True)
-    prev_chapter, next_chapter = None, None
-    try:
-        current_index = all_chapters_for_nav.index(current_chapter)
-        if current_index < len(all_chapters_for_nav) - 1:
-            prev_chapter = all_chapters_for_nav[current_index + 1]
-        if current_index > 0:
-            next_chapter = all_chapters_for_nav[current_index - 1]
-    except (ValueError, IndexError):
-        current_index = -1
-        
+    chapter_slices = [
+        image.manifest_entry
+        for image in current_chapter.chapter_images.only('encrypted_file', 'width', 'height', 'variants', 'sort_order').order_by('sort_order')
+        if image.encrypted_file.name.lower().endswith('.avif')
+    ]
+
+    all_chapters_for_nav = manga.get_chapters()
+    prev_chapter, next_chapter = current_chapter.prev_chapter, current_chapter.next_chapter
+
     is_following = request.user.is_authenticated and Favorite.objects.filter(user=request.user, manga=manga).exists()
 
     unread_notifications = []
@@ -279,7 +288,7 @@ def chapter_reader_view(request, manga_slug, chapter_slug):
         'manga': manga, 
         'page': current_chapter, 
         'chapter': current_chapter, 
-        'chapter_images_urls': chapter_images_urls, 
+        'chapter_slices': chapter_slices, 
         'prev_chapter': prev_chapter, 
         'next_chapter': next_chapter, 
         'chapter_list_sidebar': all_chapters_for_nav, 
@@ -295,9 +304,9 @@ def manga_detail_view(request, manga_slug):
 
     current_sort = request.GET.get('sort', 'desc')
     if current_sort == 'asc':
-        chapters_qs = chapters_qs.order_by('first_published_at')
+        chapters_qs = chapters_qs.oldest_first()
     else:
-        chapters_qs = chapters_qs.order_by('-first_published_at')
+        chapters_qs = chapters_qs.newest_first()
 
     search_query = request.GET.get('q_chapter', '')
     if search_query:
@@ -318,7 +327,7 @@ def manga_detail_view(request, manga_slug):
                 user=request.user,
                 chapter_id__in=[chapter.id for chapter in page_obj]
             ).values_list('chapter_id', flat=True)
-        )
+        ) | reading_history.pending_chapter_ids(request.user)
 
     followers_count = Favorite.objects.filter(manga=manga).count()
 
@@ -393,6 +402,8 @@ def manga_list_all_view(request):
     genres = request.GET.getlist('genre')
     if q_title: all_works_qs = all_works_qs.filter(title__icontains=q_title)
     if orderby in ['title', '-title', 'first_published_at', '-first_published_at']: all_works_qs = all_works_qs.order_by(orderby)
+    # O ranking só existe para mangás (novels não têm views por obra): nesse modo o catálogo lista só mangás.
+    elif orderby in RANKING_ORDERINGS: all_works_qs = order_by_ranking(all_works_qs.filter(pk__in=visible_manga_ids), orderby, prefix='mangapage__')
     else: all_works_qs = all_works_qs.order_by('-first_published_at')
     paginator = Paginator(all_works_qs, 24)
     page_number = request.GET.get('page')
@@ -421,16 +432,34 @@ def add_comment_view(request, page_id):
 
 def serve_encrypted_slice(request, chapter_id, slice_id):
     try:
-        slice_obj = get_object_or_404(ChapterImage, pk=slice_id, page__pk=chapter_id)
-        base_name, _ = os.path.splitext(slice_obj.encrypted_file.name)
-        avif_path = f"{base_name}.avif"
-        if os.path.exists(avif_path):
-             with open(avif_path, 'rb') as f:
-                 return HttpResponse(f.read(), content_type='image/avif')
-
-        decrypted_data = slice_obj.decrypt_and_get_data()
-        if decrypted_data:
-            return HttpResponse(decrypted_data, content_type='image/webp')
+        slice_obj = get_object_or_404(
+            ChapterImage.objects.select_related('page').only('encrypted_file', 'content_hash', 'page__live', 'page__vip_unlock_at'),
+            pk=slice_id, page__pk=chapter_id,
+        )
+        chapter = slice_obj.page
+        is_locked = chapter.is_effectively_vip
+        if not chapter.live and not request.user.is_staff:
+            raise Http404()
+        if is_locked:
+            user_is_vip = request.user.is_authenticated and (
+                request.user.is_staff or
+                (hasattr(request.user, 'assinatura_vip') and request.user.assinatura_vip and request.user.assinatura_vip.esta_ativa)
+            )
+            if not user_is_vip:
+                return HttpResponseForbidden("Capítulo exclusivo para assinantes VIP.")
+
+        if slice_obj.encrypted_file.name.lower().endswith('.avif'):
+            try:
+                return serve_slice_file(request, slice_obj.encrypted_file, slice_obj.content_hash, public=not is_locked)
+            except FileNotFoundError:
+                logger.error(f"Arquivo da fatia ausente no disco para ChapterImage PK: {slice_id}"); raise Http404()
+
+        try:
+            response = serve_decrypted_slice(request, slice_obj, public=not is_locked)
+        except FileNotFoundError:
+            response = None
+        if response is not None:
+            return response
         else:
             logger.error(f"Falha na descriptografia para ChapterImage PK: {slice_id}"); raise Http404()
     except Http404:
@@ -451,7 +480,6 @@ def get_manga_list_api(request):
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
-@transaction.atomic
 def process_chapter_zip_api(request):
     logger.info(f"API: process_chapter_zip_api chamada. Usuário: {request.user}")
     manga_id = request.data.get('manga_page_id')
@@ -464,176 +492,101 @@ def process_chapter_zip_api(request):
         return Response({'status': 'error', 'message': 'ID do Mangá, número do capítulo ou arquivo ZIP não fornecido.'}, status=400)
     try:
         manga_page = get_object_or_404(MangaPage, pk=manga_id)
-        existing_chapter = MangaChapterPage.objects.child_of(manga_page).filter(chapter_number=chapter_number_str).first()
-        chapter_page = None
-        if existing_chapter:
-            if replace_mode:
-                logger.info(f"API: MODO SUBSTITUIR para cap '{chapter_number_str}' de '{manga_page.title}'.")
-                for image in existing_chapter.chapter_images.all():
-                    if image.encrypted_file:
-                        try:
-                            image.encrypted_file.delete(save=False)
-                        except Exception as e:
-                            logger.error(f"Não foi possível apagar o arquivo físico {image.encrypted_file.name}: {e}")
-                existing_chapter.chapter_images.all().delete()
-                chapter_page = existing_chapter
-                chapter_page.owner = request.user
-                chapter_page.last_published_at = timezone.now()
-            else:
-                logger.warning(f"API: CONFLITO - Cap '{chapter_number_str}' já existe.")
-                return Response({'status': 'error', 'message': f'O Capítulo {chapter_number_str} já existe. Use o modo "Substituir".'}, status=409)
-        else:
-            chapter_page = MangaChapterPage(title=f"{manga_page.title} - Capítulo {chapter_number_str}", chapter_number=chapter_number_str, owner=request.user, is_vip=manga_page.default_chapters_are_vip)
-            manga_page.add_child(instance=chapter_page)
-            logger.info(f"API: Criando novo cap '{chapter_number_str}'.")
-
-        if chapter_thumbnail_file:
-            try:
-                if chapter_page.cover:
-                    chapter_page.cover.delete(save=False)
-                
-                new_filename = f"{slugify(chapter_page.title)}.avif"
-                chapter_page.cover.save(new_filename, chapter_thumbnail_file, save=False)
-                logger.info(f"API: Thumbnail nova salva em {chapter_page.cover.name}")
-            except Exception as thumb_e:
-                logger.error(f"API: Erro ao processar thumbnail: {thumb_e}", exc_info=True)
-        
-        chapter_page.save()
-        
-        images_to_create = []
-        with zipfile.ZipFile(zip_file_obj, 'r') as zipf:
-            file_list_in_zip = sorted([name for name in zipf.namelist() if not name.startswith('__MACOSX/') and not name.endswith('/') and name.lower().endswith('.avif')])
-            
-            for index, filename_in_zip in enumerate(file_list_in_zip):
-                file_content = zipf.read(filename_in_zip)
-                
-                django_file = ContentFile(file_content, name=os.path.basename(filename_in_zip))
-                
-                images_to_create.append(ChapterImage(
-                    page=chapter_page, 
-                    encrypted_file=django_file, 
-                    original_filename=os.path.basename(filename_in_zip), 
-                    sort_order=index
-                ))
-        
-        ChapterImage.objects.bulk_create(images_to_create)
-        files_processed_count = len(images_to_create)
-        
-        chapter_page.save_revision(user=request.user).publish(user=request.user)
-        logger.info(f"API: Capítulo '{chapter_page.title}' publicado com sucesso.")
-        return Response({'status': 'success', 'message': f'Capítulo {chapter_number_str} processado com {files_processed_count} imagens AVIF.', 'chapter_id': chapter_page.pk, 'chapter_url': chapter_page.get_url() if hasattr(chapter_page, 'get_url') else None})
+        if not replace_mode and MangaChapterPage.objects.child_of(manga_page).filter(chapter_number=chapter_number_str).exists():
+            logger.warning(f"API: CONFLITO - Cap '{chapter_number_str}' já existe.")
+            return Response({'status': 'error', 'message': f'O Capítulo {chapter_number_str} já existe. Use o modo "Substituir".'}, status=409)
+
+        # Só guarda o ZIP e enfileira; o worker de ingestão lê os membros um a um e publica o capítulo.
+        job = enqueue_ingest_job(
+            manga_page, request.user, IngestJobKind.AVIF_ZIP, [zip_file_obj],
+            chapter_number=chapter_number_str, thumbnail=chapter_thumbnail_file,
+        )
+        return Response({
+            'status': 'queued',
+            'message': f'Capítulo {chapter_number_str} enviado; processando em segundo plano.',
+            'job_id': str(job.pk),
+            'progress_url': reverse('manga:api_ingest_job_progress', args=[job.pk]),
+        }, status=202)
+    except Http404:
+        raise
     except Exception as e:
         logger.exception(f"API: Erro INESPERADO em process_chapter_zip_api: {e}")
         return Response({'status': 'error', 'message': f'Erro interno no servidor: {str(e)}'}, status=500)
 
 def load_more_releases(request):
-    page_number = int(request.GET.get('page', 2))
-    items_per_page = 12
-    all_items = []
-    if MangaPage:
-        latest_chapter_publish_date_subquery = MangaChapterPage.objects.filter(
-            path__startswith=OuterRef('path'),
-            depth=OuterRef('depth') + 1,
-            live=True,
-            first_published_at__isnull=False
-        ).order_by('-first_published_at').values('first_published_at')[:1]
-        latest_mangas = MangaPage.objects.visible_for(request.user).annotate(
-            latest_activity_date=Subquery(latest_chapter_publish_date_subquery, output_field=DateTimeField(null=True)),
-            item_type=Value('manga', output_field=CharField())
-        ).filter(latest_activity_date__isnull=False)
-        all_items.extend(list(latest_mangas))
-    if NovelPage:
-        latest_novel_chapter_date_subquery = NovelChapterPage.objects.filter(
-            path__startswith=OuterRef('path'),
-            depth=OuterRef('depth') + 1,
-            live=True,
-            first_published_at__isnull=False
-        ).order_by('-first_published_at').values('first_published_at')[:1]
-        base_queryset_novels = getattr(NovelPage, 'objects', NovelPage.objects)
-        visible_novels_qs = base_queryset_novels.visible_for(request.user) if hasattr(base_queryset_novels, 'visible_for') else base_queryset_novels.live().public()
-        latest_novels = visible_novels_qs.annotate(
-            latest_activity_date=Subquery(latest_novel_chapter_date_subquery, output_field=DateTimeField(null=True)),
-            item_type=Value('novel', output_field=CharField())
-        ).filter(latest_activity_date__isnull=False)
-        all_items.extend(list(latest_novels))
-        
-    sorted_items = sorted(all_items, key=operator.attrgetter('latest_activity_date'), reverse=True)
-    
-    start_index = (page_number - 1) * items_per_page
-    end_index = start_index + items_per_page
-    
-    page_items = sorted_items[start_index:end_index]
-    has_next = len(sorted_items) > end_index
-
+    cursor = decode_cursor(request.GET.get('cursor'))
+    page_items, next_cursor = get_latest_releases(request.user, cursor=cursor)
     html = render_to_string(
         'includes/manga_card_list.html',
         {'mangas_to_load': page_items}
     )
-    
-    return JsonResponse({'html': html, 'has_next': has_next})
+    return JsonResponse({'html': html, 'has_next': next_cursor is not None, 'next_cursor': next_cursor})
 
 @login_required
 def reading_history_view(request):
-    history_entries = list(ReadingHistory.objects.filter(
-        user=request.user
-    ).order_by('-read_at').select_related('chapter')[:200])
+    # (capítulo, obra, lido em) das 200 leituras mais recentes, somando as que ainda estão na fila deste
+    # processo (sem forçar o flush de todos os usuários); capítulos e obras vêm em uma consulta cada.
+    latest_reads = {
+        chapter_id: (manga_id, read_at)
+        for chapter_id, manga_id, read_at in ReadingHistory.objects.filter(
+            user=request.user, manga__isnull=False
+        ).order_by('-read_at').values_list('chapter_id', 'manga_id', 'read_at')[:200]
+    }
+    for chapter_id, manga_id, read_at in reading_history.pending_reads(request.user):
+        current = latest_reads.get(chapter_id)
+        if manga_id is not None and (current is None or current[1] < read_at):
+            latest_reads[chapter_id] = (manga_id, read_at)
+    history_entries = sorted(
+        ((chapter_id, manga_id, read_at) for chapter_id, (manga_id, read_at) in latest_reads.items()),
+        key=lambda entry: entry[2], reverse=True,
+    )[:200]
 
     if not history_entries:
         return render(request, 'manga/reading_history.html', {'history_list': []})
 
-    parent_page_ids = {entry.chapter.get_parent().pk for entry in history_entries}
-    parent_mangas = MangaPage.objects.live().public().filter(pk__in=parent_page_ids).specific()
-    parents_by_id = {manga.pk: manga for manga in parent_mangas}
+    chapters_by_id = MangaChapterPage.objects.in_bulk({chapter_id for chapter_id, _manga_id, _read_at in history_entries})
+    mangas_by_id = MangaPage.objects.live().public().select_related('cover').in_bulk({manga_id for _chapter_id, manga_id, _read_at in history_entries})
 
-    for entry in history_entries:
-        parent_id = entry.chapter.get_parent().pk
-        entry.chapter.manga = parents_by_id.get(parent_id)
+    def chapter_float(chapter):
+        try:
+            return float(chapter.chapter_number)
+        except (ValueError, TypeError):
+            return None
 
-    valid_history_entries = [entry for entry in history_entries if hasattr(entry.chapter, 'manga') and entry.chapter.manga is not None]
+    valid_history_entries = [
+        (chapters_by_id[chapter_id], manga_id, read_at, chapter_float(chapters_by_id[chapter_id]))
+        for chapter_id, manga_id, read_at in history_entries
+        if chapter_id in chapters_by_id and manga_id in mangas_by_id
+    ]
 
     if not valid_history_entries:
         return render(request, 'manga/reading_history.html', {'history_list': []})
 
     grouped_history = []
-    
-    current_group = {
-        'manga': valid_history_entries[0].chapter.manga,
-        'start_chapter': valid_history_entries[0].chapter,
-        'end_chapter': valid_history_entries[0].chapter,
-        'read_at': valid_history_entries[0].read_at
-    }
-
-    for i in range(1, len(valid_history_entries)):
-        current_entry = valid_history_entries[i]
-        prev_entry = valid_history_entries[i-1]
-
-        is_different_manga = current_entry.chapter.manga.id != current_group['manga'].id
-        
-        is_not_consecutive = True
-        try:
-            prev_num = float(prev_entry.chapter.chapter_number)
-            current_num = float(current_entry.chapter.chapter_number)
-            if prev_num - 1 == current_num:
-                is_not_consecutive = False
-        except (ValueError, TypeError):
-            is_not_consecutive = True
-
-        is_large_time_gap = (prev_entry.read_at - current_entry.read_at) > timedelta(hours=6)
-
-        if is_different_manga or is_not_consecutive or is_large_time_gap:
-            grouped_history.append(current_group)
-            current_group = {
-                'manga': current_entry.chapter.manga,
-                'start_chapter': current_entry.chapter,
-                'end_chapter': current_entry.chapter,
-                'read_at': current_entry.read_at
-            }
+    previous = None
+    for entry in valid_history_entries:
+        chapter, manga_id, read_at, number = entry
+        is_continuation = (
+            previous is not None
+            and manga_id == previous[1]
+            and number is not None and previous[3] is not None and previous[3] - 1 == number
+            and (previous[2] - read_at) <= timedelta(hours=6)
+        )
+        if is_continuation:
+            grouped_history[-1]['start_chapter'] = chapter
         else:
-            current_group['start_chapter'] = current_entry.chapter
-    
-    grouped_history.append(current_group)
-    
+            grouped_history.append({
+                'manga': mangas_by_id[manga_id],
+                'start_chapter': chapter,
+                'end_chapter': chapter,
+                'read_at': read_at,
+            })
+        previous = entry
+
     final_history_list = grouped_history[:50]
+    for group in final_history_list:
+        # Mesmo link de MangaChapterPage.get_url, sem buscar a obra de novo para cada grupo.
+        group['url'] = reverse('manga:chapter_reader', kwargs={'manga_slug': group['manga'].slug, 'chapter_slug': group['end_chapter'].slug})
 
     context = {
         'history_list': final_history_list,
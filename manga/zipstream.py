@@ -0,0 +1,86 @@
+"""
+ZIP sem compressão (ZIP_STORED) gerado em streaming.
+
+Como o CRC-32 e o tamanho de cada fatia já estão no manifesto, os cabeçalhos locais
+podem ser escritos antes dos dados e o tamanho final do arquivo é conhecido de antemão,
+permitindo Content-Length exato sem montar o ZIP em memória.
+"""
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+END_RECORD = struct.Struct('<4s4H2LH')
+ZIP_LIMIT = 0xFFFFFFFF
+READ_CHUNK_SIZE = 256 * 1024
+# 1980-01-01 00:00 em formato DOS; a data das fatias não importa para o leitor.
+DOS_TIME, DOS_DATE = 0, (1 << 5) | 1
+FILE_ATTRIBUTES = 0o100644 << 16
+UTF8_FLAG = 0x800
+
+ZipMember = namedtuple('ZipMember', ['arcname', 'path', 'size', 'crc32'])
+
+
+class ZipTooLarge(ValueError):
+    pass
+
+
+def file_crc32(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc & 0xFFFFFFFF
+
+
+def archive_size(members):
+    size = sum(LOCAL_HEADER.size + CENTRAL_HEADER.size + 2 * len(m.arcname.encode('utf-8')) + m.size for m in members)
+    return size + END_RECORD.size
+
+
+def iter_stored_zip(members):
+    """Gera os bytes do ZIP; cada membro precisa de arcname, path, size e crc32 já conferidos."""
+    if archive_size(members) > ZIP_LIMIT or len(members) > 0xFFFF:
+        raise ZipTooLarge("Capítulo grande demais para ZIP sem ZIP64.")
+    central = []
+    offset = 0
+    for member in members:
+        name = member.arcname.encode('utf-8')
+        yield LOCAL_HEADER.pack(
+            b'PK\x03\x04', 20, 0, UTF8_FLAG, 0, DOS_TIME, DOS_DATE,
+            member.crc32, member.size, member.size, len(name), 0,
+        ) + name
+        written = 0
+        with open(member.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                written += len(chunk)
+                yield chunk
+        if written != member.size:
+            raise IOError(f"Tamanho de {member.path} mudou durante o download.")
+        central.append(CENTRAL_HEADER.pack(
+            b'PK\x01\x02', 20, 3, 20, 0, UTF8_FLAG, 0, DOS_TIME, DOS_DATE,
+            member.crc32, member.size, member.size, len(name), 0, 0, 0, 0, FILE_ATTRIBUTES, offset,
+        ) + name)
+        offset += LOCAL_HEADER.size + len(name) + member.size
+    directory = b''.join(central)
+    yield directory
+    yield END_RECORD.pack(b'PK\x05\x06', 0, 0, len(members), len(members), len(directory), offset, 0)
+
+
+def iter_and_store(chunks, cache_path):
+    """Repassa os bytes do ZIP e grava uma cópia em `cache_path` só se o arquivo for gerado por completo."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp-{os.getpid()}-{id(chunks)}"
+    completed = False
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp_path, cache_path)
+        completed = True
+    finally:
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
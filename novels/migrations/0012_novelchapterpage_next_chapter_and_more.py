@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-17 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_chapter_links(apps, schema_editor):
+    NovelPage = apps.get_model('novels', 'NovelPage')
+    NovelChapterPage = apps.get_model('novels', 'NovelChapterPage')
+    for work in NovelPage.objects.all().iterator():
+        chapter_ids = list(NovelChapterPage.objects.filter(
+            path__startswith=work.path, depth=work.depth + 1, live=True
+        ).order_by('chapter_number_sortable', 'path').values_list('pk', flat=True))
+        to_update = []
+        for index, chapter_id in enumerate(chapter_ids):
+            to_update.append(NovelChapterPage(
+                pk=chapter_id,
+                prev_chapter_id=chapter_ids[index - 1] if index > 0 else None,
+                next_chapter_id=chapter_ids[index + 1] if index + 1 < len(chapter_ids) else None,
+            ))
+        NovelChapterPage.objects.bulk_update(to_update, ['prev_chapter', 'next_chapter'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novels', '0010_novelpage_chapters_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novelchapterpage',
+            name='next_chapter',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='novels.novelchapterpage', verbose_name='Próximo Capítulo'),
+        ),
+        migrations.AddField(
+            model_name='novelchapterpage',
+            name='prev_chapter',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='novels.novelchapterpage', verbose_name='Capítulo Anterior'),
+        ),
+        migrations.RunPython(backfill_chapter_links, migrations.RunPython.noop),
+    ]
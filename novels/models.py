@@ -1,7 +1,7 @@
 # novels/models.py
 
 from django.db import models
-from django.db.models import F
+from django.db.models import F, Q
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
@@ -17,6 +17,9 @@ from wagtail.fields import RichTextField
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel, FieldRowPanel
 from wagtail.search import index
 
+from core.counters import unique_readers, view_counter
+from manga.manifest import ChapterEntry, get_chapter_manifest, materialize
+
 def novel_cover_path(instance, filename):
     if instance.slug:
         page_identifier = instance.slug
@@ -81,6 +84,7 @@ class NovelPage(Page):
         default=False,
         help_text=_("Se marcado, novos capítulos criados para esta novel serão marcados como VIP automaticamente.")
     )
+    chapters_version = models.PositiveIntegerField(_("Versão da Lista de Capítulos"), default=0, editable=False)
 
     content_panels = Page.content_panels + [
         MultiFieldPanel([
@@ -112,31 +116,37 @@ class NovelPage(Page):
     def cover(self):
         return self.cover_image
 
-    def get_chapters(self):
+    def with_content_json(self, content):
+        obj = super().with_content_json(content)
+        obj.chapters_version = self.chapters_version
+        return obj
+
+    def _build_chapter_manifest(self):
         # Esta função pode precisar ser ajustada no futuro para lidar com a lógica de acesso VIP
-        all_chapters_qs = NovelChapterPage.objects.child_of(self).live().public().specific()
-        all_chapters_list = list(all_chapters_qs)
-        chapters_sorted_list = sorted(
-            all_chapters_list,
-            key=lambda chap: chap.chapter_number_sortable
+        rows = NovelChapterPage.objects.child_of(self).live().public().order_by('-chapter_number_sortable', '-path').values_list(
+            'pk', 'slug', 'chapter_display_title', 'chapter_number_sortable', 'release_date', 'first_published_at', 'is_vip',
         )
-        chapters_sorted_list.reverse()
-        return chapters_sorted_list
+        for pk, slug, display_title, number_sortable, release_date, first_published_at, is_vip in rows:
+            chapter_number = int(number_sortable) if number_sortable.is_integer() else number_sortable
+            yield ChapterEntry(pk, slug, display_title, chapter_number, (number_sortable,), release_date or first_published_at, is_vip, None)
+
+    def get_chapters(self):
+        """Manifesto em cache dos capítulos publicados (tupla de ChapterEntry, do mais recente ao mais antigo)."""
+        return get_chapter_manifest(self, self._build_chapter_manifest)
 
     def get_recent_chapters(self, limit=3):
-        all_sorted_chapters = self.get_chapters()
-        return all_sorted_chapters[:limit]
+        return materialize(NovelChapterPage, self.get_chapters()[:limit])
 
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
-        all_chapters_list = self.get_chapters()
+        all_chapters_list = list(self.get_chapters())
         
         search_query_val = request.GET.get('q_chapter', '').strip()
         context['search_query'] = search_query_val
         if search_query_val:
             filtered_list = [
                 chap for chap in all_chapters_list 
-                if search_query_val.lower() in chap.chapter_display_title.lower()
+                if search_query_val.lower() in chap.title.lower()
             ]
             all_chapters_list = filtered_list
         
@@ -155,6 +165,7 @@ class NovelPage(Page):
         except EmptyPage:
             chapters_paginated = paginator.page(paginator.num_pages)
         
+        chapters_paginated.object_list = materialize(NovelChapterPage, chapters_paginated.object_list)
         context['chapters'] = chapters_paginated
         
         is_following = False
@@ -205,6 +216,14 @@ class NovelChapterPage(Page):
         default=False,
         help_text=_("Marque se este capítulo for exclusivo para assinantes VIP.")
     )
+    prev_chapter = models.ForeignKey(
+        'self', verbose_name=_("Capítulo Anterior"),
+        null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+'
+    )
+    next_chapter = models.ForeignKey(
+        'self', verbose_name=_("Próximo Capítulo"),
+        null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+'
+    )
 
     @property
     def get_thumbnail(self):
@@ -244,11 +263,15 @@ class NovelChapterPage(Page):
             return int(self.chapter_number_sortable)
         return self.chapter_number_sortable
 
-    def get_badge_info(self):
+    def get_badge_info(self, badge_settings=None):
         if self.first_published_at and (timezone.now() - self.first_published_at).days < 3:
             return {'show': True, 'text': 'NOVO!'}
         return {'show': False}
 
+    @property
+    def display_views(self):
+        return view_counter.display_value(self, 'views')
+
     @property
     def chapter_number_display(self):
         return self.chapter_display_title
@@ -271,20 +294,48 @@ class NovelChapterPage(Page):
                 self.title = self.chapter_display_title
         super().save(*args, **kwargs)
 
+    def with_content_json(self, content):
+        obj = super().with_content_json(content)
+        obj.prev_chapter_id = self.prev_chapter_id
+        obj.next_chapter_id = self.next_chapter_id
+        return obj
+
+    def find_live_neighbours(self):
+        """(anterior, próximo) entre os capítulos irmãos no ar, por chapter_number_sortable; usado para regravar os links."""
+        siblings = NovelChapterPage.objects.sibling_of(self, inclusive=False).live().public()
+        number, path = self.chapter_number_sortable, self.path
+        previous_id = siblings.filter(
+            Q(chapter_number_sortable__lt=number) | Q(chapter_number_sortable=number, path__lt=path)
+        ).order_by('-chapter_number_sortable', '-path').values_list('pk', flat=True).first()
+        next_id = siblings.filter(
+            Q(chapter_number_sortable__gt=number) | Q(chapter_number_sortable=number, path__gt=path)
+        ).order_by('chapter_number_sortable', 'path').values_list('pk', flat=True).first()
+        return previous_id, next_id
+
     def serve(self, request, *args, **kwargs):
         # A lógica de verificação VIP será adicionada aqui no futuro
+        # Views contam acessos brutos; leitores únicos vêm dos sketches (sem gravar nada na sessão).
+        parent = self.get_parent()
+        self.parent_work = parent.specific if parent else None
         if not request.user.is_staff:
-            session_key = f'viewed_novel_chapter_{self.pk}'
-            if not request.session.get(session_key, False):
-                NovelChapterPage.objects.filter(pk=self.pk).update(views=F('views') + 1)
-                request.session[session_key] = True
+            view_counter.increment(self, 'views')
+            if self.parent_work is not None:
+                unique_readers.add(self, self.parent_work, request)
         return super().serve(request, *args, **kwargs)
 
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
-        parent_novel_page = self.get_parent().specific if self.get_parent() else None
+        parent_novel_page = getattr(self, 'parent_work', None)
+        if parent_novel_page is None:
+            parent = self.get_parent()
+            parent_novel_page = parent.specific if parent else None
         context['novel'] = parent_novel_page
         context['chapter'] = self
+        context['prev_chapter'] = self.prev_chapter
+        context['next_chapter'] = self.next_chapter
+        # URLs das próprias páginas ligadas: não dependem do slug do capítulo estar sob a novel atual.
+        context['prev_url'] = self.prev_chapter.get_url(request) if self.prev_chapter else None
+        context['next_url'] = self.next_chapter.get_url(request) if self.next_chapter else None
         return context
 
 
@@ -0,0 +1,39 @@
+import logging
+from django.dispatch import receiver
+from django.db.models.signals import post_delete
+from wagtail.signals import page_published, page_unpublished
+
+from home.models import ReleaseEvent
+from manga.manifest import bump_chapters_version, link_chapters, relink_chapter, unlink_chapter
+
+from .models import NovelChapterPage, NovelPage
+
+logger = logging.getLogger(__name__)
+
+def on_novel_chapter_list_changed(chapter):
+    """Atualiza os dados denormalizados da novel (manifesto) quando a lista de capítulos no ar muda."""
+    try:
+        novel_page = NovelPage.objects.filter(path=chapter.path[:-NovelPage.steplen]).first()
+        if novel_page:
+            bump_chapters_version(novel_page)
+    except Exception as e:
+        logger.error(f"Erro ao atualizar os dados da novel do capítulo {chapter.pk}: {e}")
+
+@receiver(page_published, sender=NovelChapterPage)
+def on_novel_chapter_publish(sender, instance, **kwargs):
+    try:
+        ReleaseEvent.record(instance, 'novel')
+    except Exception as e:
+        logger.error(f"Erro ao registrar o lançamento do capítulo de novel {instance.pk}: {e}")
+    relink_chapter(instance)
+    on_novel_chapter_list_changed(instance)
+
+@receiver(page_unpublished, sender=NovelChapterPage)
+def on_novel_chapter_unpublish(sender, instance, **kwargs):
+    unlink_chapter(instance)
+    on_novel_chapter_list_changed(instance)
+
+@receiver(post_delete, sender=NovelChapterPage)
+def on_novel_chapter_delete(sender, instance, **kwargs):
+    link_chapters(NovelChapterPage, *instance.find_live_neighbours())
+    on_novel_chapter_list_changed(instance)